@@ -1,51 +1,177 @@
 #!/usr/bin/env python3
+"""Codex login helper.
+
+All selected platforms are opened at once in one browser, each in its own isolated
+context. Cookies are saved as soon as any of a platform's key cookies appears (the same
+check as scripts/check_login.py), without waiting for Enter. `--refresh` reloads saved
+state headlessly and re-exports the cookies that are still valid. `--url platform=URL`
+points a platform at another address, e.g. the local HTTP stub in codex/login_stub.py.
+"""
 import argparse
 import json
+import sys
+import time
 from pathlib import Path
+from typing import Dict, List
 
+from playwright.sync_api import Error as PlaywrightError
 from playwright.sync_api import sync_playwright
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 COOKIES_DIR = ROOT_DIR / ".social_publisher" / "cookies"
 
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+from check_login import has_key_cookies  # noqa: E402  (one login predicate for both tools)
+
 PLATFORMS = {
     "twitter": {
         "url": "https://x.com/login",
         "cookie_file": "twitter_cookies.json",
+        "state_file": "twitter_state.json",
     },
     "wechat": {
         "url": "https://mp.weixin.qq.com",
         "cookie_file": "wechat_cookies.json",
+        "state_file": "wechat_state.json",
     },
     "xiaohongshu": {
         "url": "https://creator.xiaohongshu.com",
         "cookie_file": "xiaohongshu_cookies.json",
+        "state_file": "xiaohongshu_state.json",
     },
 }
 
+LOGIN_TIMEOUT = 600.0  # seconds to wait for all logins
+POLL_INTERVAL = 1.0
+REFRESH_SETTLE = 3.0  # seconds a refreshed page may take to rotate cookies
+
+
+def valid_cookies(cookies: List[Dict], now: float = None) -> List[Dict]:
+    """Drop cookies that have already expired (expires == -1 means a session cookie)."""
+    now = time.time() if now is None else now
+    return [c for c in cookies if c.get("expires", -1) in (-1, None) or c["expires"] > now]
 
-def login_platform(platform: str, headless: bool) -> Path:
+
+def save_cookies(platform: str, context) -> Path:
+    """Write the cookie list (read by check_login.py) and the full storage_state for --refresh."""
     config = PLATFORMS[platform]
     COOKIES_DIR.mkdir(parents=True, exist_ok=True)
     cookie_path = COOKIES_DIR / config["cookie_file"]
+    state = context.storage_state()
+    state["cookies"] = valid_cookies(state["cookies"])
+    for path, data in ((COOKIES_DIR / config["state_file"], state), (cookie_path, state["cookies"])):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=True, indent=2)
+        tmp.replace(path)
+    return cookie_path
+
 
+def _saved_state(platform: str):
+    """Saved storage_state path, or the legacy cookie list wrapped as a state dict."""
+    config = PLATFORMS[platform]
+    state_path = COOKIES_DIR / config["state_file"]
+    if state_path.exists():
+        return str(state_path)
+    cookie_path = COOKIES_DIR / config["cookie_file"]
+    if cookie_path.exists():
+        with open(cookie_path, "r", encoding="utf-8") as f:
+            cookies = json.load(f)
+        return {"cookies": valid_cookies(cookies), "origins": []}
+    return None
+
+
+def login_platforms(platforms: List[str], headless: bool = False, urls: Dict[str, str] = None,
+                    timeout: float = LOGIN_TIMEOUT, poll: float = POLL_INTERVAL) -> Dict[str, str]:
+    """Open every login page at once and save each platform when its key cookies appear.
+
+    Returns {platform: "saved" | "timeout" | "closed"}.
+    """
+    urls = urls or {}
+    results = {}
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=headless)
-        context = browser.new_context()
-        page = context.new_page()
-        page.goto(config["url"], wait_until="domcontentloaded")
+        pending = {}
+        for platform in platforms:
+            url = urls.get(platform, PLATFORMS[platform]["url"])
+            context = browser.new_context()
+            page = context.new_page()
+            page.goto(url, wait_until="domcontentloaded")
+            pending[platform] = (context, page)
+            print(f"Login in the browser window: {url}")
 
-        print(f"Login in the browser window: {config['url']}")
-        input("Press Enter after login completes to save cookies...")
+        deadline = time.monotonic() + timeout
+        while pending and time.monotonic() < deadline:
+            for platform, (context, page) in list(pending.items()):
+                if page.is_closed():
+                    results[platform] = "closed"
+                    print(f"{platform}: window closed, cookies not saved")
+                    del pending[platform]
+                    continue
+                if has_key_cookies(platform, context.cookies()):
+                    path = save_cookies(platform, context)
+                    results[platform] = "saved"
+                    print(f"{platform}: saved cookies: {path}")
+                    context.close()
+                    del pending[platform]
+            if pending:
+                # wait_for_timeout keeps the browser event loop running while we wait
+                try:
+                    next(iter(pending.values()))[1].wait_for_timeout(poll * 1000)
+                except PlaywrightError:
+                    pass  # that window was closed meanwhile; picked up on the next pass
 
-        cookies = context.cookies()
-        with open(cookie_path, "w", encoding="utf-8") as f:
-            json.dump(cookies, f, ensure_ascii=True, indent=2)
+        for platform, (context, _) in pending.items():
+            results[platform] = "timeout"
+            print(f"{platform}: login not detected within {timeout:.0f}s")
+            context.close()
+        browser.close()
+    return results
 
-        context.close()
+
+def refresh_platforms(platforms: List[str], urls: Dict[str, str] = None,
+                      settle: float = REFRESH_SETTLE) -> Dict[str, str]:
+    """Reload saved state headlessly and re-export cookies while the key cookies are still valid.
+
+    Returns {platform: "refreshed" | "expired" | "missing"}.
+    """
+    urls = urls or {}
+    results = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for platform in platforms:
+            state = _saved_state(platform)
+            if state is None:
+                results[platform] = "missing"
+                print(f"{platform}: no saved cookies, run login first")
+                continue
+            context = browser.new_context(storage_state=state)
+            try:
+                page = context.new_page()
+                page.goto(urls.get(platform, PLATFORMS[platform]["url"]), wait_until="domcontentloaded")
+                page.wait_for_timeout(settle * 1000)
+            except PlaywrightError as e:
+                print(f"{platform}: page load failed ({e}), checking saved cookies only")
+            if has_key_cookies(platform, context.cookies()):
+                path = save_cookies(platform, context)
+                results[platform] = "refreshed"
+                print(f"{platform}: refreshed cookies: {path}")
+            else:
+                results[platform] = "expired"
+                print(f"{platform}: key cookies gone or expired, login again")
+            context.close()
         browser.close()
+    return results
 
-    return cookie_path
+
+def parse_urls(specs: List[str]) -> Dict[str, str]:
+    urls = {}
+    for spec in specs or []:
+        platform, _, url = spec.partition("=")
+        if platform not in PLATFORMS or not url:
+            raise SystemExit(f"Invalid --url: {spec} (expected platform=URL)")
+        urls[platform] = url
+    return urls
 
 
 def main() -> None:
@@ -62,12 +188,34 @@ def main() -> None:
         action="store_true",
         help="Run browser headless (not recommended for QR logins)",
     )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Reload saved state headlessly and re-export still-valid cookies (no interaction)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=LOGIN_TIMEOUT,
+        help="Seconds to wait for all logins to complete",
+    )
+    parser.add_argument(
+        "--url",
+        action="append",
+        metavar="PLATFORM=URL",
+        help="Override a platform's login URL (repeatable), e.g. a local test stub",
+    )
     args = parser.parse_args()
 
     platforms = list(PLATFORMS.keys()) if args.platform == "all" else [args.platform]
-    for platform in platforms:
-        path = login_platform(platform, headless=args.headless)
-        print(f"Saved cookies: {path}")
+    urls = parse_urls(args.url)
+    if args.refresh:
+        results = refresh_platforms(platforms, urls)
+        ok = all(status == "refreshed" for status in results.values())
+    else:
+        results = login_platforms(platforms, headless=args.headless, urls=urls, timeout=args.timeout)
+        ok = all(status == "saved" for status in results.values())
+    raise SystemExit(0 if ok else 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Local HTTP stub for testing codex/login.py without a real platform.
+
+GET / serves a login page; submitting its form (automatically with `?auto=1`) POSTs
+/login, which sets the configured key cookies. Point login.py at it with
+`--url twitter=http://127.0.0.1:PORT/?auto=1`. `--cookies` chooses which cookies are
+set, e.g. only one of a platform's key cookies, as some platforms do.
+"""
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+LOGIN_PAGE = """<!doctype html>
+<html><body>
+<form method="post" action="/login"><button id="login">Log in</button></form>
+<script>
+if (location.search.indexOf("auto=1") >= 0) { document.forms[0].submit(); }
+</script>
+</body></html>
+"""
+
+
+def make_handler(cookies: List[str], delay: float = 0.0):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: str, headers: List[Tuple[str, str]] = ()):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._send(200, LOGIN_PAGE)
+
+        def do_POST(self):
+            if delay:
+                threading.Event().wait(delay)
+            headers = [("Set-Cookie", f"{name}=stub-{name}; Path=/; Max-Age=3600") for name in cookies]
+            self._send(200, "<html><body>logged in</body></html>", headers)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve_stub(cookies: List[str], port: int = 0, delay: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a background thread; returns (server, auto-login URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(cookies, delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/?auto=1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local login stub for codex/login.py")
+    parser.add_argument("--cookies", default="auth_token,ct0",
+                        help="Comma-separated cookie names set on login")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (127.0.0.1)")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before the login response")
+    args = parser.parse_args()
+    server, url = serve_stub([name for name in args.cookies.split(",") if name], args.port, args.delay)
+    print(f"Login stub: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,16 +11,33 @@ Codex helper for SocialPublisher (isolated from Claude Skill)
 Usage:
   codex/run.sh status [--json] [-p platform]
   codex/run.sh login [--platform all|twitter|wechat|xiaohongshu]
+  codex/run.sh login --refresh
   codex/run.sh init --topic "Your Topic"
   codex/run.sh search --query "Your Topic" --time-range "24h" --posts '[...]'
+  codex/run.sh rank -k 20
   codex/run.sh engage --action like --post-id "123"
   codex/run.sh distill --trends '["t1"]' --points '["p1"]'
   codex/run.sh generate --platform twitter --thread '["1/ ..."]'
+  codex/run.sh preflight -f drafts.jsonl
+  codex/run.sh media -p wechat cover.png
   codex/run.sh publish --platform twitter --status published --count 1
+  codex/run.sh publish --platform twitter --index 3 --url "https://x.com/.../status/123"
+  codex/run.sh resume
+  codex/run.sh schedule --rate twitter=0.5
+  codex/run.sh run-many topics.jsonl -j 4
+  codex/run.sh dedupe
+  codex/run.sh find "keyword"
   codex/run.sh verify
+  codex/run.sh verify --all --since 7d
+  codex/run.sh stats --json
+  codex/run.sh archive --older-than 30d --budget 2G
   codex/run.sh report
   codex/run.sh list
   codex/run.sh session-id
+  codex/run.sh compact
+  codex/run.sh batch -f ops.jsonl
+  codex/run.sh serve
+  codex/run.sh reindex
 
 Notes:
   - This wrapper only calls scripts/ helpers.
@@ -43,7 +60,7 @@ case "$cmd" in
     login)
         "$PYTHON_BIN" "$ROOT_DIR/codex/login.py" "$@"
         ;;
-    init|search|engage|distill|generate|publish|verify|report|list|session-id)
+    init|search|rank|engage|distill|generate|preflight|media|publish|resume|schedule|run-many|dedupe|find|stats|verify|report|list|session-id|compact|archive|batch|serve|reindex)
         "$PYTHON_BIN" "$ROOT_DIR/scripts/content_tracker.py" "$cmd" "$@"
         ;;
     track)
@@ -0,0 +1,770 @@
+#!/usr/bin/env python3
+"""
+内容追踪性能测试
+用合成数据测量关键路径的耗时，检查是否随数据量线性增长
+
+用法:
+    python scripts/bench_tracker.py rank --sizes 10000,100000,1000000
+    python scripts/bench_tracker.py stress --workers 8 --ops 200
+    python scripts/bench_tracker.py schedule --sessions 20 --tweets 8
+    python scripts/bench_tracker.py pipeline --topics 16 --workers 1,2,4
+    python scripts/bench_tracker.py stats --sessions 100000
+    python scripts/bench_tracker.py preflight --drafts 30000
+    python scripts/bench_tracker.py suite --output result.json --baseline baseline.json
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import content_rules
+import post_ranking
+import pipeline_runner
+import publish_scheduler
+import session_store
+from session_store import get_store, set_default_store
+
+
+def synthetic_posts(n: int, seed: int = 42, now: float = None) -> Iterator[Dict]:
+    """生成 n 条合成帖子（字段格式与抓取结果一致，计数有数字也有 "1.2K" 这样的字符串）"""
+    rng = random.Random(seed)
+    now = time.time() if now is None else now
+    for i in range(n):
+        likes = int(rng.paretovariate(1.2))
+        yield {
+            "id": str(10 ** 18 + i),
+            "text": "synthetic post",
+            "likes": f"{likes / 1000:.1f}K" if likes >= 1000 else likes,
+            "retweets": int(rng.paretovariate(1.5)),
+            "replies": int(rng.paretovariate(1.8)),
+            "author": {"followers": int(rng.paretovariate(1.1) * 100)},
+            "created_at": now - rng.random() * 7 * 86400,
+        }
+
+
+def bench_rank(sizes: List[int], k: int = 20) -> List[Dict]:
+    """测量 rank_posts 在不同帖子数下的耗时（分别统计生成并提取列、打分、取前 K）"""
+    results = []
+    for n in sizes:
+        start = time.perf_counter()
+        columns = post_ranking.PostColumns.from_posts(synthetic_posts(n))
+        extracted = time.perf_counter()
+        scores = post_ranking.score_columns(columns)
+        scored = time.perf_counter()
+        post_ranking.top_k(columns, scores, k)
+        done = time.perf_counter()
+        results.append({
+            "posts": n,
+            "extract_s": extracted - start,
+            "score_s": scored - extracted,
+            "top_k_s": done - scored,
+            "total_s": done - start,
+            "us_per_post": (done - start) / n * 1e6,
+        })
+    return results
+
+
+def print_rank(results: List[Dict]):
+    print(f"{'帖子数':>10} {'生成+列提取(s)':>12} {'打分(s)':>9} {'前K(s)':>8} {'总计(s)':>9} {'µs/帖':>8}")
+    for r in results:
+        print(f"{r['posts']:>10} {r['extract_s']:>12.3f} {r['score_s']:>9.3f} "
+              f"{r['top_k_s']:>8.3f} {r['total_s']:>9.3f} {r['us_per_post']:>8.2f}")
+    base = results[0]["us_per_post"]
+    worst = max(r["us_per_post"] for r in results)
+    print(f"\n单帖耗时最大/最小比: {worst / base:.2f}（接近 1 表示线性增长）")
+
+
+# ========== 多进程并发写同一会话 ==========
+
+# stress 结果中必须为 0 的计数
+STRESS_CHECKS = ("missing_likes", "duplicate_likes", "missing_replies", "missing_reply_texts",
+                 "missing_core_updates", "read_errors", "duplicate_session_ids")
+
+def _stress_writer(args) -> int:
+    store_name, session_id, worker, ops = args
+    from content_tracker import ContentTracker
+    set_default_store(store_name)
+    tracker = ContentTracker.load(session_id)
+    tracker.messages = []
+    for i in range(ops):
+        post_id = f"w{worker}_{i}"
+        if i == ops // 2:
+            # 会话主体（core）里的字段：各进程手里的副本此时都已过期
+            if worker == 0:
+                tracker.record_distilled_content([], [], [], f"summary {worker}")
+            else:
+                tracker.record_xiaohongshu_publish(status="failed", error=f"w{worker}")
+        elif i % 10 == 9:
+            tracker.record_replies({post_id: f"reply {worker} {i}"})
+        else:
+            tracker.record_likes([post_id])
+        tracker.messages.clear()
+    return ops
+
+
+def _stress_reader(args) -> Dict:
+    store_name, session_id, stop_at = args
+    set_default_store(store_name)
+    store = get_store()
+    loads = errors = 0
+    while time.time() < stop_at:
+        try:
+            store.load(session_id)["engagement"]["liked"]
+            loads += 1
+        except (ValueError, KeyError, FileNotFoundError):
+            errors += 1
+    return {"loads": loads, "errors": errors}
+
+
+def _stress_create(args) -> str:
+    store_name, topic = args
+    from content_tracker import ContentTracker
+    set_default_store(store_name)
+    tracker = ContentTracker(topic)
+    return tracker.session_id
+
+
+def stress(store_name: str, workers: int, ops: int, readers: int = 2) -> Dict:
+    """多个进程同时向同一会话写入点赞/回复，另有进程反复读取；检查有无丢失的更新和读到半截文件
+
+    每个进程中途还会改一次会话主体（0 号记录提炼内容，其余记录一次小红书发布失败），
+    检查这些字段没有被其他进程的过期副本覆盖。
+
+    另外让 workers 个进程同时创建会话，检查会话ID没有重复。
+    """
+    with _temp_config_dir():
+        from content_tracker import ContentTracker
+        set_default_store(store_name)
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(workers) as pool:
+            created = pool.map(_stress_create, [(store_name, "stress-create")] * workers)
+
+        session_id = ContentTracker("stress").session_id
+        start = time.perf_counter()
+        with ctx.Pool(workers + readers) as pool:
+            reading = pool.map_async(_stress_reader, [(store_name, session_id, time.time() + 2)] * readers)
+            written = sum(pool.map(_stress_writer, [(store_name, session_id, w, ops) for w in range(workers)]))
+            elapsed = time.perf_counter() - start
+            reads = reading.get()
+
+        data = get_store().load(session_id)
+        engagement = data["engagement"]
+        expected_likes = {f"w{w}_{i}" for w in range(workers) for i in range(ops)
+                          if i % 10 != 9 and i != ops // 2}
+        expected_replies = {f"w{w}_{i}" for w in range(workers) for i in range(ops)
+                            if i % 10 == 9 and i != ops // 2}
+        expected_errors = {f"w{w}" for w in range(1, workers)}
+        return {
+            "store": store_name,
+            "workers": workers,
+            "ops": written,
+            "elapsed_s": elapsed,
+            "ops_per_s": written / elapsed,
+            "missing_likes": len(expected_likes - set(engagement["liked"])),
+            "duplicate_likes": len(engagement["liked"]) - len(set(engagement["liked"])),
+            "missing_replies": len(expected_replies - set(engagement["replied"])),
+            "missing_reply_texts": len(expected_replies - set(engagement["replies_content"])),
+            "missing_core_updates": (len(expected_errors - set(data["publish_status"]["xiaohongshu"]["errors"]))
+                                     + int(data["distilled"].get("summary") != "summary 0")),
+            "reads": sum(r["loads"] for r in reads),
+            "read_errors": sum(r["errors"] for r in reads),
+            "sessions_created": len(created),
+            "duplicate_session_ids": len(created) - len(set(created)),
+        }
+
+
+# ========== 发布调度：吞吐与中断续传 ==========
+
+# bench_schedule 结果中必须为 0 的计数
+SCHEDULE_CHECKS = ("missing", "duplicates", "broken_chains", "incomplete_sessions")
+
+def bench_schedule(sessions: int, tweets: int, rate: float, latency: float,
+                   failure_rate: float, interrupt_after: float, lost_response_rate: float = 0.0) -> Dict:
+    """用 MockAdapter 发布 sessions 个会话（每个 tweets 条推文 + 小红书 + 公众号）
+
+    lost_response_rate 为内容已发出但返回失败的概率（检查重试前是否先确认）。
+    先运行 interrupt_after 秒后取消，重新加载会话再运行一次，
+    检查每条内容恰好发布一次、Thread 的回复链没有断开、吞吐没有超过限速。
+    """
+    with _temp_config_dir():
+        from content_tracker import ContentTracker
+        session_ids = []
+        for s in range(sessions):
+            tracker = ContentTracker(f"schedule-bench-{s}")
+            tracker.messages = []
+            tracker.record_twitter_content([f"tweet {s}-{i}" for i in range(tweets)])
+            tracker.record_xiaohongshu_content(f"title {s}", "xhs content")
+            tracker.record_wechat_content(f"title {s}", "wechat content")
+            session_ids.append(tracker.session_id)
+
+        adapter = publish_scheduler.MockAdapter(latency, failure_rate, seed=1,
+                                                lost_response_rate=lost_response_rate)
+        limits = {platform: {"rate": rate, "burst": rate, "concurrency": sessions}
+                  for platform in publish_scheduler.PLATFORMS}
+
+        def load():
+            trackers = [ContentTracker.load(session_id) for session_id in session_ids]
+            for tracker in trackers:
+                tracker.messages = []
+            return trackers
+
+        async def interrupted():
+            scheduler = publish_scheduler.PublishScheduler(adapter, limits, backoff=0.01)
+            try:
+                await asyncio.wait_for(scheduler.run(load()), interrupt_after)
+            except asyncio.TimeoutError:
+                pass
+
+        start = time.perf_counter()
+        asyncio.run(interrupted())
+        first_run = len(adapter.published)
+        result = publish_scheduler.PublishScheduler(adapter, limits, backoff=0.01).run_sync(load())
+        elapsed = time.perf_counter() - start
+
+        published: Dict = {}
+        for entry in adapter.published:
+            published.setdefault((entry["session_id"], entry["platform"], entry["index"]), []).append(entry)
+        expected = sessions * (tweets + 2)
+        broken_chains = 0
+        for session_id in session_ids:
+            parent = None
+            for i in range(tweets):
+                entries = published.get((session_id, "twitter", i), [])
+                if entries and entries[0]["parent"] != parent:
+                    broken_chains += 1
+                parent = entries[0]["url"] if entries else None
+        incomplete = sum(1 for tracker in load()
+                         if tracker.data["publish_status"]["twitter"]["published_count"] != tweets)
+        items = len(adapter.published)
+        return {
+            "sessions": sessions,
+            "items": items,
+            "published_before_interrupt": first_run,
+            "elapsed_s": elapsed,
+            "items_per_s": items / elapsed,
+            "rate_limit_per_s": rate * len(publish_scheduler.PLATFORMS),
+            "retries": sum(stats["retries"] for stats in result["stats"].values()),
+            "recovered": sum(stats["recovered"] for stats in result["stats"].values()),
+            "missing": expected - len(published),
+            "duplicates": items - len(published),
+            "broken_chains": broken_chains,
+            "incomplete_sessions": incomplete,
+        }
+
+
+# ========== 多主题并行运行 ==========
+
+def bench_pipeline(topics: int, posts: int, workers: List[int], store_name: str = "json") -> List[Dict]:
+    """用合成帖子文件生成 topics 个主题的清单，分别以不同进程数运行 run-many，比较吞吐"""
+    results = []
+    with _temp_config_dir() as tmp:
+        entries = []
+        for t in range(topics):
+            posts_file = tmp / f"posts_{t}.ndjson"
+            with open(posts_file, "w", encoding="utf-8") as f:
+                for post in synthetic_posts(posts, seed=t):
+                    post["id"] = f"{t}_{post['id']}"
+                    f.write(json.dumps(post) + "\n")
+            entries.append({
+                "topic": f"pipeline-bench-{t}",
+                "posts_file": str(posts_file),
+                "ops": [{"op": "rank", "k": 20},
+                        {"op": "like", "post_ids": [f"{t}_{10 ** 18 + i}" for i in range(10)]},
+                        {"op": "generate", "platform": "twitter", "thread": [f"{t}/{i}" for i in range(8)]}],
+            })
+        for n in workers:
+            report = pipeline_runner.run_many(entries, store_name, n)
+            summary = report["summary"]
+            results.append(dict(summary, posts_per_topic=posts))
+    return results
+
+
+# ========== 统计汇总查询 ==========
+
+def bench_stats(sessions: int, days: int = 180, topics: int = 500) -> Dict:
+    """在临时索引库中写入 sessions 个会话的汇总行（约 days 天、topics 个主题），测量 stats 查询耗时"""
+    import tempfile
+    from datetime import datetime, timedelta
+    from tracker_index import TrackerIndex
+    rng = random.Random(7)
+    start_day = datetime.now() - timedelta(days=days)
+    statuses = ("published", "published", "published", "partial", "failed", "pending")
+    with tempfile.TemporaryDirectory() as tmp:
+        index = TrackerIndex(Path(tmp) / "index.db")
+        start = time.perf_counter()
+        for i in range(sessions):
+            created = start_day + timedelta(seconds=i * days * 86400 / sessions)
+            expected = rng.randint(3, 15)
+            status = rng.choice(statuses)
+            published = expected if status == "published" else rng.randint(0, expected - 1)
+            errors = [] if status in ("published", "pending") else [f"#{published}: {rng.choice(('rate limited', 'timeout', 'login expired'))}"]
+            index.update_session_stats({
+                "session_id": created.strftime("%Y%m%d_%H%M%S") + f"_{i:06d}",
+                "topic": f"topic-{rng.randrange(topics)}",
+                "created_at": created.isoformat(),
+                "status": "verified",
+                "search": {"total_found": rng.randint(0, 200)},
+                "engagement": {"selected_posts": [0] * rng.randint(0, 20), "liked": [0] * rng.randint(0, 10),
+                               "replied": [0] * rng.randint(0, 5)},
+                "generated_content": {"xiaohongshu": {"title": "t"}, "wechat": {"title": ""}},
+                "publish_status": {
+                    "twitter": {"status": status, "published_count": published, "expected_count": expected,
+                                "errors": errors},
+                    "xiaohongshu": {"status": rng.choice(statuses), "errors": []},
+                    "wechat": {"status": "pending", "errors": []},
+                },
+            })
+        filled = time.perf_counter()
+        index.stats()
+        queried = time.perf_counter()
+        index.stats(since=(datetime.now() - timedelta(days=30)).strftime("%Y%m%d"))
+        recent = time.perf_counter()
+        index.conn.close()
+    return {
+        "sessions": sessions,
+        "update_us_per_session": (filled - start) / sessions * 1e6,
+        "stats_s": queried - filled,
+        "stats_30d_s": recent - queried,
+    }
+
+
+def synthetic_drafts(n: int, seed: int = 11) -> Iterator[Dict]:
+    """生成 n 个三个平台轮流的草稿，约 1/5 的 Thread 含超长推文，部分小红书标题超长"""
+    rng = random.Random(seed)
+    words = ["增长", "产品", "模型", "用户", "数据", "优化", "发布", "AI", "market", "growth",
+             "launch", "thread", "https://example.com/post", "。", "，", "!"]
+    for i in range(n):
+        if i % 3 == 0:
+            longest = 160 if i % 5 == 0 else 60
+            yield {"id": i, "platform": "twitter",
+                   "thread": [f"{k + 1}/8 " + " ".join(rng.choice(words) for _ in range(rng.randint(10, longest)))
+                              for k in range(8)]}
+        elif i % 3 == 1:
+            yield {"id": i, "platform": "xiaohongshu", "title": "标题" * rng.randint(3, 11),
+                   "content": "正文内容" * rng.randint(50, 260), "hashtags": ["增长", "AI", "产品"]}
+        else:
+            yield {"id": i, "platform": "wechat", "title": f"公众号标题 {i}",
+                   "content": "公众号正文。" * 2000, "summary": "摘要"}
+
+
+def bench_preflight(drafts: int) -> Dict:
+    """测量发布前检查的吞吐（草稿先生成好，不计入耗时），以及先拆分超长推文再检查的吞吐"""
+    items = list(synthetic_drafts(drafts))
+    result = {"drafts": drafts}
+    for name, resplit in (("check", False), ("resplit", True)):
+        start = time.perf_counter()
+        rejected = sum(not r["ok"] for r in content_rules.check_drafts(items, resplit))
+        elapsed = time.perf_counter() - start
+        result[name] = {"elapsed_s": elapsed, "drafts_per_s": drafts / elapsed, "rejected": rejected}
+    return result
+
+
+# ========== 生产规模基准套件 ==========
+
+# 各操作的结果字段中参与基线比较的指标
+# per_call_ms 取各轮中最快的一轮（调度、GC 造成的抖动只会让某一轮变慢），disk_bytes 为数据目录的增长量
+SUITE_METRICS = ("per_call_ms", "disk_bytes")
+SUITE_THRESHOLD = 0.25   # 比基线慢（或多占磁盘）25% 以上算回退
+SUITE_MIN_DELTA_MS = 10.0  # 耗时差（单次差 × 调用次数）小于此值时视为噪声，几毫秒的单次调用偶尔慢一倍不算回退
+SUITE_MIN_DELTA_BYTES = 64 * 1024  # B 树页分裂随插入顺序略有不同，差几个页不算回退
+
+
+@contextlib.contextmanager
+def _temp_config_dir() -> Iterator[Path]:
+    """在临时目录里运行：会话、索引、归档、媒体目录都指向它，测试不碰真实数据
+
+    同时设置 SOCIAL_PUBLISHER_DIR，spawn 出的工作进程也使用该目录；结束后恢复原来的目录并删除临时目录。
+    """
+    import tempfile
+    import media_store
+    import session_archive
+    import tracker_index
+    modules = ((session_store, ("SESSIONS_DIR", "SESSIONS_DB", "_instances")),
+               (tracker_index, ("INDEX_DB", "_instance")), (session_archive, ("ARCHIVE_DIR", "_instance")),
+               (media_store, ("MEDIA_DIR", "_instance")))
+    saved = [(module, name, getattr(module, name)) for module, names in modules for name in names]
+    saved_env = os.environ.get("SOCIAL_PUBLISHER_DIR")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        os.environ["SOCIAL_PUBLISHER_DIR"] = tmp
+        session_store.SESSIONS_DIR = root / "sessions"
+        session_store.SESSIONS_DB = root / "sessions.db"
+        session_store._instances = {}
+        tracker_index.INDEX_DB = root / "index.db"
+        tracker_index._instance = None
+        session_archive.ARCHIVE_DIR = root / "archive"
+        session_archive._instance = None
+        media_store.MEDIA_DIR = root / "media"
+        media_store._instance = None
+        try:
+            yield root
+        finally:
+            if tracker_index._instance is not None:
+                tracker_index._instance.conn.close()
+            for store in session_store._instances.values():
+                if getattr(store, "conn", None) is not None:
+                    store.conn.close()
+            for module, name, value in saved:
+                setattr(module, name, value)
+            if saved_env is None:
+                os.environ.pop("SOCIAL_PUBLISHER_DIR", None)
+            else:
+                os.environ["SOCIAL_PUBLISHER_DIR"] = saved_env
+
+
+def _dir_bytes(root: Path) -> int:
+    """目录下所有文件的总字节数（进程累计写入量会把日志、页缓存溢出等都算进去，同样的操作两次相差很大）"""
+    total = 0
+    for path in root.rglob("*"):
+        try:
+            if path.is_file():
+                total += path.stat().st_size
+        except FileNotFoundError:
+            pass  # 临时文件在遍历时被替换
+    return total
+
+
+def _peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class _Timer:
+    """记录每个操作的调用次数、耗时、数据目录增长的字节数和操作结束时的峰值 RSS"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.results: Dict[str, Dict] = {}
+
+    @contextlib.contextmanager
+    def measure(self, name: str, calls: int = 1):
+        size = _dir_bytes(self.root)
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        self.results[name] = {
+            "calls": calls,
+            "total_ms": round(elapsed * 1000, 3),
+            "per_call_ms": round(elapsed * 1000 / calls, 4),
+            "disk_bytes": _dir_bytes(self.root) - size,
+            "peak_rss_kb": _peak_rss_kb(),
+        }
+
+
+def _suite_vocabulary(size: int = 5000) -> List[str]:
+    """固定的合成词表：英文伪词 + 常用汉字二字词"""
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    hanzi = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+    words += [rng.choice(hanzi) + rng.choice(hanzi) for _ in range(size // 2)]
+    return words
+
+
+def _suite_posts(n: int, seed: int, prefix: str = "") -> List[Dict]:
+    """合成帖子，正文为随机词组合（彼此不相似，近似重复的情形见 _suite_templated_posts）"""
+    rng = random.Random(seed)
+    vocabulary = _suite_vocabulary()
+    posts = list(synthetic_posts(n, seed=seed))
+    for post in posts:
+        post["id"] = f"{prefix}{post['id']}"
+        post["text"] = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(12, 40)))
+    return posts
+
+
+# 营销号、抽奖转发一类的模板化正文：只有少数几个词不同，彼此近似重复
+_SUITE_TEMPLATES = (
+    "Huge giveaway this week! Follow us and retweet to win a {item} worth ${price}. Winner announced {day} #giveaway",
+    "Breaking: {item} prices drop {price}% ahead of {day}, analysts say the trend will continue #markets",
+    "限时福利：关注转发本条抽送 {item}，价值 {price} 元，{day} 开奖，欢迎参与 #抽奖",
+    "Our new {item} is live! Use code SAVE{price} at checkout before {day} #launch #deal",
+)
+
+
+def _suite_templated_posts(n: int, seed: int, prefix: str = "") -> List[Dict]:
+    """合成的模板化帖子：少数几个模板只替换个别词，指纹大量落在相同的段上"""
+    rng = random.Random(seed)
+    items = ("iPhone", "MacBook", "Switch", "AirPods", "Kindle", "GPU", "机械键盘", "咖啡机")
+    days = ("Monday", "Friday", "tomorrow", "next week", "周五", "月底")
+    posts = list(synthetic_posts(n, seed=seed))
+    for post in posts:
+        post["id"] = f"{prefix}{post['id']}"
+        post["text"] = rng.choice(_SUITE_TEMPLATES).format(
+            item=rng.choice(items), price=rng.randint(1, 999), day=rng.choice(days))
+    return posts
+
+
+def _suite_history(sessions: int, posts: int):
+    """生成历史会话（不计时）：每个会话有少量帖子、互动和一条 Thread"""
+    from content_tracker import ContentTracker
+    for i in range(sessions):
+        tracker = ContentTracker(f"history-{i}")
+        tracker.messages = []
+        batch = _suite_posts(posts, seed=i, prefix=f"h{i}_")
+        tracker.begin_batch()
+        tracker.record_search(f"history {i}", "24h", batch)
+        tracker.record_likes([post["id"] for post in batch[:10]])
+        tracker.record_twitter_content([f"history {i} tweet {n}" for n in range(5)])
+        tracker.end_batch()
+
+
+def _suite_run(history: int, history_posts: int, posts: int, engagements: int, thread: int) -> Dict:
+    """在临时目录里跑一轮：生成历史会话，再对一个大会话逐个测量各操作"""
+    from content_tracker import ContentTracker, main as tracker_main
+    with _temp_config_dir() as root:
+        timer = _Timer(root)
+        _suite_history(history, history_posts)
+
+        with timer.measure("init"):
+            tracker = ContentTracker("production-scale")
+        tracker.messages = []
+        session_id = tracker.session_id
+
+        batch = _suite_posts(posts, seed=-1)
+        post_ids = [post["id"] for post in batch]
+        with timer.measure("record_search"):
+            tracker.record_search("production scale", "24h", batch)
+        with timer.measure("record_selected_for_engagement"):
+            tracker.record_selected_for_engagement(post_ids[:engagements])
+        with timer.measure("record_like", engagements):
+            for post_id in post_ids[:engagements]:
+                tracker.record_like(post_id)
+        with timer.measure("record_reply", engagements):
+            for post_id in post_ids[:engagements]:
+                tracker.record_reply(post_id, f"reply to {post_id}")
+        tracker.messages = []
+        with timer.measure("record_distilled_content"):
+            tracker.record_distilled_content([f"trend {i}" for i in range(20)], [f"point {i}" for i in range(50)],
+                                             [f"quote {i}" for i in range(20)], "summary " * 100)
+        with timer.measure("record_twitter_content"):
+            tracker.record_twitter_content([f"{i + 1}/{thread} long thread tweet number {i}" for i in range(thread)])
+        with timer.measure("record_xiaohongshu_content"):
+            tracker.record_xiaohongshu_content("规模测试", "正文" * 400, ["测试", "性能"])
+        with timer.measure("record_wechat_content"):
+            tracker.record_wechat_content("规模测试", "公众号正文。" * 5000, "摘要")
+        with timer.measure("record_tweet_published", thread):
+            for i in range(thread):
+                tracker.record_tweet_published(i, url=f"https://x.com/bench/status/{i}", tweet_id=str(i))
+        with timer.measure("record_xiaohongshu_publish"):
+            tracker.record_xiaohongshu_publish(url="https://www.xiaohongshu.com/explore/bench")
+        with timer.measure("record_wechat_publish"):
+            tracker.record_wechat_publish(url="https://mp.weixin.qq.com/bench", status="draft")
+        tracker.messages = []
+        with timer.measure("verify"):
+            tracker.verify()
+        with timer.measure("get_report"):
+            tracker.get_report()
+        with timer.measure("load"):
+            ContentTracker.load(session_id)
+        with timer.measure("get_latest_session"):
+            ContentTracker.get_latest_session()
+        # 近似重复：先有一个会话记录模板化帖子（不计时），再测另一个会话记录同类帖子，几乎每条都命中历史
+        seed_tracker = ContentTracker("near-duplicate-seed")
+        seed_tracker.messages = []
+        seed_tracker.record_search("templated", "24h", _suite_templated_posts(posts, seed=-2, prefix="t"))
+        near_tracker = ContentTracker("near-duplicate")
+        near_tracker.messages = []
+        near_batch = _suite_templated_posts(posts, seed=-3, prefix="n")
+        with timer.measure("record_search_near_duplicates"):
+            near_tracker.record_search("templated", "24h", near_batch)
+        argv = sys.argv
+        sys.argv = ["content_tracker.py", "--no-daemon", "list"]
+        try:
+            with timer.measure("list_cli"), contextlib.redirect_stdout(io.StringIO()):
+                tracker_main()
+        finally:
+            sys.argv = argv
+    return timer.results
+
+
+def bench_suite(repeat: int = 3, history: int = 300, history_posts: int = 200, posts: int = 20000,
+                engagements: int = 1000, thread: int = 100) -> Dict:
+    """重复 repeat 轮，每个操作取耗时最短那一轮的结果，另记中位数和最大值"""
+    runs = [_suite_run(history, history_posts, posts, engagements, thread) for _ in range(repeat)]
+    ops = {}
+    for name in runs[0]:
+        samples = sorted((run[name] for run in runs), key=lambda r: r["per_call_ms"])
+        ops[name] = dict(samples[0], median_ms=samples[len(samples) // 2]["per_call_ms"],
+                         max_ms=samples[-1]["per_call_ms"])
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "store": get_store().name,
+            # 刷盘方式决定了逐条写入的耗时，不同时比较结果没有意义
+            "params": {"repeat": repeat, "history": history, "history_posts": history_posts,
+                       "posts": posts, "engagements": engagements, "thread": thread,
+                       "fsync": session_store.FSYNC_MODE},
+        },
+        "peak_rss_kb": _peak_rss_kb(),
+        "ops": ops,
+    }
+
+
+def compare_suite(result: Dict, baseline: Dict, threshold: float = SUITE_THRESHOLD) -> List[Dict]:
+    """逐个操作与基线比较，返回各指标的变化（regression=True 表示超过阈值的回退）"""
+    rows = []
+    for name, current in result["ops"].items():
+        old = baseline.get("ops", {}).get(name)
+        if old is None:
+            continue
+        for metric in SUITE_METRICS:
+            before, after = old.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            # 耗时的噪声下限按整个操作算：调用 1000 次的操作单次差 0.01ms 也有意义
+            if metric == "per_call_ms":
+                delta = (after - before) * current.get("calls", 1)
+                floor = SUITE_MIN_DELTA_MS
+            else:
+                delta, floor = after - before, SUITE_MIN_DELTA_BYTES
+            ratio = after / before if before else (1.0 if not after else float("inf"))
+            rows.append({
+                "op": name, "metric": metric, "baseline": before, "current": after,
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1 + threshold and delta > floor,
+                "improvement": ratio < 1 - threshold and -delta > floor,
+            })
+    return rows
+
+
+def print_suite(result: Dict, comparison: List[Dict] = None, threshold: float = SUITE_THRESHOLD):
+    print(f"{'操作':<32} {'次数':>6} {'单次(ms)':>10} {'总计(ms)':>10} {'磁盘增长(KB)':>12} {'峰值RSS(MB)':>12}")
+    for name, r in result["ops"].items():
+        print(f"{name:<32} {r['calls']:>6} {r['per_call_ms']:>10.3f} {r['total_ms']:>10.1f} "
+              f"{r['disk_bytes'] / 1024:>12.1f} {r['peak_rss_kb'] / 1024:>12.1f}")
+    if comparison is None:
+        return
+    print(f"\n与基线比较（阈值 ±{threshold:.0%}）:")
+    changed = [row for row in comparison if row["regression"] or row["improvement"]]
+    for row in changed:
+        mark = "❌ 回退" if row["regression"] else "✅ 改善"
+        print(f"   {mark} {row['op']}.{row['metric']}: {row['baseline']} → {row['current']} ({row['ratio']}x)")
+    if not changed:
+        print("   无明显变化")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="内容追踪性能测试")
+    subparsers = parser.add_subparsers(dest="command")
+
+    rank_parser = subparsers.add_parser("rank", help="帖子排序（rank_posts）")
+    rank_parser.add_argument("--sizes", default="10000,100000,1000000", help="帖子数，逗号分隔")
+    rank_parser.add_argument("--k", type=int, default=20, help="选出的帖子数")
+
+    stress_parser = subparsers.add_parser("stress", help="多进程并发写同一会话（使用临时目录）")
+    stress_parser.add_argument("--store", choices=["json", "sqlite"], default="json", help="存储后端")
+    stress_parser.add_argument("--workers", type=int, default=8, help="写入进程数")
+    stress_parser.add_argument("--ops", type=int, default=200, help="每个进程的写入次数")
+
+    schedule_parser = subparsers.add_parser("schedule", help="发布调度吞吐和中断续传（mock 平台，使用临时目录）")
+    schedule_parser.add_argument("--sessions", type=int, default=20, help="会话数")
+    schedule_parser.add_argument("--tweets", type=int, default=8, help="每个会话的推文数")
+    schedule_parser.add_argument("--rate", type=float, default=50.0, help="每个平台每秒发布条数")
+    schedule_parser.add_argument("--latency", type=float, default=0.02, help="mock 单条发布耗时（秒）")
+    schedule_parser.add_argument("--failure-rate", type=float, default=0.05, help="mock 发布失败概率")
+    schedule_parser.add_argument("--lost-response-rate", type=float, default=0.05,
+                                 help="mock 已发出但返回失败的概率")
+    schedule_parser.add_argument("--interrupt-after", type=float, default=1.0, help="第一次运行多少秒后中断")
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="多主题并行运行（run-many）的吞吐（使用临时目录）")
+    pipeline_parser.add_argument("--topics", type=int, default=16, help="主题数")
+    pipeline_parser.add_argument("--posts", type=int, default=2000, help="每个主题的帖子数")
+    pipeline_parser.add_argument("--workers", default="1,2,4", help="进程数，逗号分隔")
+    pipeline_parser.add_argument("--store", choices=["json", "sqlite"], default="json", help="存储后端")
+
+    stats_parser = subparsers.add_parser("stats", help="统计汇总（stats 命令）的查询耗时（使用临时索引库）")
+    stats_parser.add_argument("--sessions", type=int, default=100000, help="会话数")
+
+    preflight_parser = subparsers.add_parser("preflight", help="发布前内容检查的批量吞吐（合成草稿）")
+    preflight_parser.add_argument("--drafts", type=int, default=30000, help="草稿数")
+
+    suite_parser = subparsers.add_parser("suite", help="生产规模基准：逐个测量 ContentTracker 各操作的耗时、磁盘增长和峰值内存（使用临时目录）")
+    suite_parser.add_argument("--repeat", type=int, default=3, help="重复轮数，耗时取最快的一轮（与基线比较时建议至少 3 轮）")
+    suite_parser.add_argument("--history", type=int, default=300, help="历史会话数")
+    suite_parser.add_argument("--history-posts", type=int, default=200, help="每个历史会话的帖子数")
+    suite_parser.add_argument("--posts", type=int, default=20000, help="被测会话的帖子数")
+    suite_parser.add_argument("--engagements", type=int, default=1000, help="点赞和回复各多少条")
+    suite_parser.add_argument("--thread", type=int, default=100, help="Thread 推文数")
+    suite_parser.add_argument("--store", choices=["json", "sqlite"], default="json", help="存储后端")
+    suite_parser.add_argument("--output", "-o", help="结果写入 JSON 文件")
+    suite_parser.add_argument("--baseline", "-b", help="与此前保存的结果比较，有回退时退出码为 1")
+    suite_parser.add_argument("--threshold", type=float, default=SUITE_THRESHOLD, help="回退阈值（比例）")
+    suite_parser.add_argument("--json", action="store_true", help="输出 JSON")
+
+    args = parser.parse_args()
+
+    if args.command == "rank":
+        sizes = [int(s) for s in args.sizes.split(",") if s]
+        print_rank(bench_rank(sizes, args.k))
+    elif args.command == "stress":
+        result = stress(args.store, args.workers, args.ops)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        failures = [key for key in STRESS_CHECKS if result[key]]
+        if failures:
+            print(f"❌ 并发写入检查失败: {', '.join(failures)}")
+            sys.exit(1)
+        print("✅ 并发写入检查通过")
+    elif args.command == "schedule":
+        result = bench_schedule(args.sessions, args.tweets, args.rate, args.latency,
+                                args.failure_rate, args.interrupt_after, args.lost_response_rate)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        failures = [key for key in SCHEDULE_CHECKS if result[key]]
+        if failures:
+            print(f"❌ 发布调度检查失败: {', '.join(failures)}")
+            sys.exit(1)
+        print("✅ 发布调度检查通过")
+    elif args.command == "stats":
+        print(json.dumps(bench_stats(args.sessions), ensure_ascii=False, indent=2))
+    elif args.command == "preflight":
+        print(json.dumps(bench_preflight(args.drafts), ensure_ascii=False, indent=2))
+    elif args.command == "pipeline":
+        workers = [int(w) for w in args.workers.split(",") if w]
+        results = bench_pipeline(args.topics, args.posts, workers, args.store)
+        print(f"{'进程数':>6} {'主题数':>6} {'失败':>4} {'耗时(s)':>9} {'主题/s':>8}")
+        for r in results:
+            print(f"{r['workers']:>6} {r['topics']:>6} {r['failed']:>4} {r['elapsed_s']:>9.2f} {r['topics_per_s']:>8.2f}")
+        if any(r["failed"] for r in results):
+            sys.exit(1)
+    elif args.command == "suite":
+        set_default_store(args.store)
+        result = bench_suite(args.repeat, args.history, args.history_posts, args.posts,
+                             args.engagements, args.thread)
+        comparison = None
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            if baseline.get("meta", {}).get("params") != result["meta"]["params"]:
+                print("⚠️ 基线的测试参数与本次不同，比较结果仅供参考", file=sys.stderr)
+            comparison = compare_suite(result, baseline, args.threshold)
+            result["comparison"] = comparison
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print_suite(result, comparison, args.threshold)
+        if comparison and any(row["regression"] for row in comparison):
+            sys.exit(1)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
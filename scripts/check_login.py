@@ -2,15 +2,28 @@
 """
 登录状态检查工具
 快速检查各社交平台的 Cookie 状态
+
+状态按关键 Cookie 的实际过期时间（Playwright 写入的 expires）判断；会话 Cookie（expires = -1）
+没有过期时间，按文件更新时间和 max_age_days 估计。
+解析结果按文件 mtime/size 缓存在 cookies/.status_cache.json，文件没变时不再读取 Cookie 文件。
+--probe 带上保存的 Cookie 请求各平台的 probe 地址，按响应判断登录是否仍然有效。
 """
 
+import http.client
 import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 from datetime import datetime, timedelta
 
+import tracker_metrics
+
 # 配置目录
-CONFIG_DIR = Path(__file__).parent.parent / ".social_publisher"
+CONFIG_DIR = Path(os.environ.get("SOCIAL_PUBLISHER_DIR") or Path(__file__).parent.parent / ".social_publisher")
 COOKIES_DIR = CONFIG_DIR / "cookies"
 
 # 平台配置
@@ -19,25 +32,237 @@ PLATFORMS = {
         "name": "Twitter/X",
         "cookie_file": "twitter_cookies.json",
         "key_cookies": ["auth_token", "ct0"],  # 关键 cookie 名称
-        "max_age_days": 30,
+        "max_age_days": 30,  # 关键 Cookie 没有过期时间时，按文件更新时间估计的有效期
+        "warn_days": 7,      # 距离过期不足这么多天时提示刷新
+        # 在线探测：不跟随跳转，logged_out 匹配响应（Location + 正文开头）即判定失效，
+        # logged_in 配置时必须匹配才算有效；都未配置时按状态码判断
+        "probe": {"url": "https://x.com/settings/account", "logged_out": r"/login|/i/flow/login"},
     },
     "wechat": {
         "name": "微信公众号",
         "cookie_file": "wechat_cookies.json",
         "key_cookies": ["slave_sid", "slave_user"],
         "max_age_days": 7,
+        "warn_days": 2,
+        "probe": {"url": "https://mp.weixin.qq.com/", "logged_in": r"token=\d+"},
     },
     "xiaohongshu": {
         "name": "小红书",
         "cookie_file": "xiaohongshu_cookies.json",
         "key_cookies": ["customer-sso-sid", "access-token-creator"],
         "max_age_days": 7,
+        "warn_days": 2,
+        "probe": {"url": "https://creator.xiaohongshu.com/api/galaxy/user/info",
+                  "logged_out": r'"success"\s*:\s*false|/login'},
     }
 }
 
+CACHE_FILE = COOKIES_DIR / ".status_cache.json"
+WATCH_INTERVAL = 5.0  # --watch 轮询间隔（秒）
+PROBE_TIMEOUT = 3.0   # 在线探测的连接/读取超时（秒）
+PROBE_READ_LIMIT = 64 * 1024  # 判断登录状态只看响应正文开头
+
+
+def _load_cache() -> dict:
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
 
-def check_cookie_file(platform: str) -> dict:
-    """检查单个平台的 Cookie 状态"""
+def _save_cache(cache: dict):
+    """写临时文件再替换，多个进程同时检查时不会读到半截缓存"""
+    tmp = CACHE_FILE.with_name(f"{CACHE_FILE.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp, CACHE_FILE)
+    except OSError:
+        pass
+
+
+def parse_cookie_file(cookie_file: Path, key_cookies: list) -> dict:
+    """读取 Cookie 文件（Cookie 列表或 storage_state），只保留判断状态需要的信息"""
+    with open(cookie_file, "r", encoding="utf-8") as f:
+        cookies = json.load(f)
+    if isinstance(cookies, dict):
+        cookies = cookies.get("cookies") or []
+    return parse_cookies(cookies, key_cookies)
+
+
+def parse_cookies(cookies: list, key_cookies: list) -> dict:
+    """从 Cookie 列表中取出关键 Cookie 的过期时间 {"cookie_count", "key_cookies": {名称: expires}}"""
+    keys = {}
+    for cookie in cookies:
+        name = cookie.get("name", "")
+        if name in key_cookies:
+            # 同名 Cookie 可能出现在多个域名下，取最晚过期的
+            expires = cookie.get("expires", -1)
+            expires = -1 if expires is None or expires < 0 else float(expires)
+            if name not in keys or keys[name] != -1 and (expires == -1 or expires > keys[name]):
+                keys[name] = expires
+    return {"cookie_count": len(cookies), "key_cookies": keys}
+
+
+def has_key_cookies(platform: str, cookies: list, now: float = None) -> bool:
+    """Cookie 列表中是否有该平台未过期的关键 Cookie（任意一个即视为已登录，codex/login.py 也用它判断登录完成）"""
+    now = time.time() if now is None else now
+    keys = parse_cookies(cookies, PLATFORMS[platform]["key_cookies"])["key_cookies"]
+    return any(expires == -1 or expires > now for expires in keys.values())
+
+
+def _parsed(platform: str, cookie_file: Path, stat: os.stat_result, cache: dict) -> dict:
+    """取缓存的解析结果；文件 mtime/size 变化时重新解析并更新 cache（调用方负责落盘）"""
+    signature = [stat.st_mtime_ns, stat.st_size]
+    entry = cache.get(platform)
+    if entry and entry.get("signature") == signature:
+        tracker_metrics.count("cookie_cache", result="hit")
+        return entry["parsed"]
+    tracker_metrics.count("cookie_cache", result="miss")
+    parsed = parse_cookie_file(cookie_file, PLATFORMS[platform]["key_cookies"])
+    cache[platform] = {"signature": signature, "parsed": parsed}
+    return parsed
+
+
+# ========== 在线探测 ==========
+
+class ProbeClient:
+    """按 (scheme, host, port) 复用 HTTP 连接的小连接池，线程安全；--watch 时跨轮次复用"""
+
+    def __init__(self, timeout: float = PROBE_TIMEOUT):
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def _release(self, key, conn):
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    def get(self, url: str, headers: dict) -> tuple:
+        """发送 GET（不跟随跳转），返回 (状态码, Location, 正文开头)"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        for attempt in (0, 1):
+            conn = self._acquire(key)
+            reused = conn.sock is not None
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read(PROBE_READ_LIMIT)
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine):
+                conn.close()
+                if reused and attempt == 0:
+                    continue  # 池里的连接已被服务器关闭，换新连接重试一次
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                response.read()  # 没读完的部分（超出上限时）直接丢弃，然后放回池里
+                self._release(key, conn)
+            return response.status, response.getheader("Location", ""), body.decode("utf-8", "replace")
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+def _cookie_header(cookie_file: Path, host: str) -> str:
+    """按域名挑出发往 host 的未过期 Cookie"""
+    with open(cookie_file, "r", encoding="utf-8") as f:
+        cookies = json.load(f)
+    if isinstance(cookies, dict):
+        cookies = cookies.get("cookies") or []
+    now = time.time()
+    pairs = []
+    for cookie in cookies:
+        if not isinstance(cookie, dict) or not cookie.get("name"):
+            continue  # 格式不对的条目跳过
+        domain = (cookie.get("domain") or "").lstrip(".")
+        expires = cookie.get("expires", -1)
+        if domain and host != domain and not host.endswith("." + domain):
+            continue
+        if isinstance(expires, (int, float)) and 0 <= expires < now:
+            continue
+        pairs.append(f"{cookie['name']}={cookie.get('value', '')}")
+    return "; ".join(pairs)
+
+
+def probe_platform(platform: str, client: ProbeClient) -> dict:
+    """带上保存的 Cookie 请求平台的 probe 地址，返回 {"status", "http_status", "elapsed_ms", "error"}
+
+    status: ok（登录有效）/ expired（已失效）/ unknown（超时、限流、服务器错误等，无法判断）
+    """
+    config = PLATFORMS[platform]["probe"]
+    url = config["url"]
+    outcome = {"status": "unknown", "url": url, "http_status": None, "elapsed_ms": None, "error": None}
+    headers = {"Cookie": _cookie_header(COOKIES_DIR / PLATFORMS[platform]["cookie_file"], urlsplit(url).hostname),
+               "User-Agent": "Mozilla/5.0 (check_login probe)", "Accept": "*/*"}
+    headers.update(config.get("headers", {}))
+    start = time.perf_counter()
+    try:
+        status, location, body = client.get(url, headers)
+    except (OSError, http.client.HTTPException) as e:
+        outcome["error"] = f"{type(e).__name__}: {e}"
+        return outcome
+    finally:
+        outcome["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    outcome["http_status"] = status
+
+    text = f"{location}\n{body}"
+    if status in (401, 403) or config.get("logged_out") and re.search(config["logged_out"], text):
+        outcome["status"] = "expired"
+    elif config.get("logged_in"):
+        outcome["status"] = "ok" if re.search(config["logged_in"], text) else "expired"
+    elif status < 400:
+        outcome["status"] = "ok"
+    else:
+        outcome["error"] = f"HTTP {status}"
+    return outcome
+
+
+def apply_probes(results: list, client: ProbeClient) -> list:
+    """并发探测所有有关键 Cookie 的平台，用探测结果覆盖按文件判断的状态"""
+    targets = [r for r in results if r["status"] in ("ok", "warning") and PLATFORMS[r["platform"]].get("probe")]
+    if not targets:
+        return results
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        outcomes = list(pool.map(lambda r: probe_platform(r["platform"], client), targets))
+    for r, probe in zip(targets, outcomes):
+        r["probe"] = probe
+        tracker_metrics.observe("probe", probe["elapsed_ms"], platform=r["platform"], status=probe["status"])
+        if probe["status"] == "expired":
+            r["status"] = "expired"
+            r["message"] = f"登录已失效 (在线探测: HTTP {probe['http_status']})"
+        elif probe["status"] == "ok":
+            # 在线有效；Cookie 快到过期时间时仍提示刷新
+            expiring = r["expires_in_days"] is not None and r["expires_in_days"] < PLATFORMS[r["platform"]]["warn_days"]
+            r["status"] = "warning" if expiring else "ok"
+            r["message"] = (f"在线有效，Cookie 剩余 {r['expires_in_days']} 天" if expiring
+                            else f"在线有效 ({probe['elapsed_ms']:.0f} ms)")
+        else:
+            r["message"] += f" (在线探测失败: {probe['error']})"
+    return results
+
+
+def check_cookie_file(platform: str, cache: dict = None) -> dict:
+    """检查单个平台的 Cookie 状态；传入 cache 时复用并更新其中的解析结果"""
     config = PLATFORMS[platform]
     cookie_file = COOKIES_DIR / config["cookie_file"]
 
@@ -50,10 +275,14 @@ def check_cookie_file(platform: str) -> dict:
         "cookie_count": 0,
         "has_key_cookies": False,
         "file_age_days": None,
+        "expires_at": None,
+        "expires_in_days": None,
     }
 
     # 检查文件是否存在
-    if not cookie_file.exists():
+    try:
+        stat = cookie_file.stat()
+    except FileNotFoundError:
         result["status"] = "missing"
         result["message"] = "Cookie 文件不存在，需要登录"
         return result
@@ -61,32 +290,44 @@ def check_cookie_file(platform: str) -> dict:
     result["file_exists"] = True
 
     # 检查文件年龄
-    file_mtime = datetime.fromtimestamp(cookie_file.stat().st_mtime)
-    age = datetime.now() - file_mtime
+    now = time.time()
+    age = timedelta(seconds=now - stat.st_mtime)
     result["file_age_days"] = age.days
 
     # 读取 Cookie 内容
     try:
-        with open(cookie_file, "r") as f:
-            cookies = json.load(f)
-        result["cookie_count"] = len(cookies)
-    except (json.JSONDecodeError, IOError) as e:
+        parsed = _parsed(platform, cookie_file, stat, {} if cache is None else cache)
+        result["cookie_count"] = parsed["cookie_count"]
+    except (json.JSONDecodeError, IOError, AttributeError) as e:
         result["status"] = "error"
         result["message"] = f"Cookie 文件损坏: {e}"
         return result
 
     # 检查关键 Cookie 是否存在
-    cookie_names = {c.get("name", "") for c in cookies}
-    key_cookies = set(config["key_cookies"])
-    found_keys = cookie_names & key_cookies
-    result["has_key_cookies"] = len(found_keys) > 0
+    keys = parsed["key_cookies"]
+    result["has_key_cookies"] = len(keys) > 0
 
-    # 判断状态
+    # 判断状态：有过期时间的关键 Cookie 取最早过期的一个；都是会话 Cookie 时按文件年龄估计
     max_age = config["max_age_days"]
+    expiring = [expires for expires in keys.values() if expires != -1]
 
     if not result["has_key_cookies"]:
         result["status"] = "invalid"
         result["message"] = "缺少关键 Cookie，需要重新登录"
+    elif expiring:
+        expires = min(expiring)
+        days_left = (expires - now) / 86400
+        result["expires_at"] = datetime.fromtimestamp(expires).isoformat(timespec="seconds")
+        result["expires_in_days"] = round(days_left, 1) or 0.0
+        if days_left <= 0:
+            result["status"] = "expired"
+            result["message"] = f"Cookie 已过期 ({result['expires_at']} 过期)"
+        elif days_left < config["warn_days"]:
+            result["status"] = "warning"
+            result["message"] = f"Cookie 即将过期 (剩余 {days_left:.1f} 天)"
+        else:
+            result["status"] = "ok"
+            result["message"] = f"正常 (剩余 {int(days_left)} 天)"
     elif age.days > max_age:
         result["status"] = "expired"
         result["message"] = f"Cookie 已过期 ({age.days} 天前更新，建议 {max_age} 天内刷新)"
@@ -100,14 +341,45 @@ def check_cookie_file(platform: str) -> dict:
     return result
 
 
-def check_all() -> list:
-    """检查所有平台"""
+def check_all(platforms: list = None, client: ProbeClient = None) -> list:
+    """检查所有平台（或指定平台），解析结果经缓存复用；传入 client 时再做在线探测"""
+    cache = _load_cache()
+    before = json.dumps(cache, sort_keys=True)
     results = []
-    for platform in PLATFORMS:
-        results.append(check_cookie_file(platform))
+    for platform in platforms or PLATFORMS:
+        with tracker_metrics.timed("check_cookie_file", platform=platform):
+            results.append(check_cookie_file(platform, cache))
+    if json.dumps(cache, sort_keys=True) != before:
+        _save_cache(cache)
+    if client is not None:
+        apply_probes(results, client)
     return results
 
 
+def watch(platforms: list, interval: float = WATCH_INTERVAL, as_json: bool = False,
+          client: ProbeClient = None):
+    """持续检查，只输出状态有变化的平台（首次输出全部），Ctrl+C 退出"""
+    previous = {}
+    try:
+        while True:
+            for r in check_all(platforms, client):
+                state = (r["status"], r["expires_at"], r["cookie_count"])
+                if previous.get(r["platform"]) == state:
+                    continue
+                old = previous.get(r["platform"])
+                previous[r["platform"]] = state
+                if as_json:
+                    print(json.dumps(dict(r, previous_status=old[0] if old else None,
+                                          checked_at=datetime.now().isoformat(timespec="seconds")),
+                                     ensure_ascii=False), flush=True)
+                else:
+                    change = f"{old[0]} → {r['status']}" if old else r["status"]
+                    print(f"[{datetime.now():%H:%M:%S}] {r['name']}: {change} - {r['message']}", flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
 def print_status(results: list):
     """打印状态报告"""
     print("\n" + "=" * 50)
@@ -163,16 +435,44 @@ def main():
     parser = argparse.ArgumentParser(description="检查社交平台登录状态")
     parser.add_argument("--json", "-j", action="store_true", help="输出 JSON 格式")
     parser.add_argument("--platform", "-p", choices=list(PLATFORMS.keys()), help="只检查指定平台")
+    parser.add_argument("--watch", "-w", action="store_true", help="持续检查，只输出状态变化（--json 时每行一个 JSON）")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="--watch 检查间隔（秒）")
+    parser.add_argument("--probe", action="store_true", help="带上 Cookie 请求平台，按响应判断登录是否有效")
+    parser.add_argument("--probe-url", action="append", metavar="PLATFORM=URL",
+                        help="覆盖平台的探测地址（可重复），如本地测试服务")
+    parser.add_argument("--timeout", type=float, default=PROBE_TIMEOUT, help="在线探测超时（秒）")
+    parser.add_argument("--profile", action="store_true", help="结束时打印分项耗时（stderr）")
+    parser.add_argument("--metrics-dir", help="把耗时统计累加导出到该目录（JSON + Prometheus）")
 
     args = parser.parse_args()
+    metrics_dir = args.metrics_dir or tracker_metrics.metrics_dir()
+    if args.profile or metrics_dir:
+        tracker_metrics.enable()
 
     # 确保目录存在
     COOKIES_DIR.mkdir(parents=True, exist_ok=True)
 
-    if args.platform:
-        results = [check_cookie_file(args.platform)]
-    else:
-        results = check_all()
+    for spec in args.probe_url or []:
+        platform, _, url = spec.partition("=")
+        if platform not in PLATFORMS or not url:
+            parser.error(f"无效的探测地址: {spec}")
+        PLATFORMS[platform]["probe"] = dict(PLATFORMS[platform].get("probe", {}), url=url)
+
+    platforms = [args.platform] if args.platform else None
+    client = ProbeClient(args.timeout) if args.probe else None
+    try:
+        if args.watch:
+            watch(platforms, args.interval, args.json, client)
+            return
+        results = check_all(platforms, client)
+    finally:
+        if client is not None:
+            client.close()
+        if args.profile:
+            import sys
+            print(tracker_metrics.format_profile(), file=sys.stderr)
+        if metrics_dir:
+            tracker_metrics.export(metrics_dir)
 
     if args.json:
         print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+发布前内容检查
+按平台规则检查生成的内容：Twitter 加权字数（CJK 等宽字符计 2，链接固定计 23）和 Thread 内重复推文，
+小红书标题/正文字数和话题数，公众号标题/摘要字数。一次遍历给出全部问题，超限内容和有问题的 Thread
+（空推文、重复推文）在记录时直接拒绝，不必等到浏览器发布失败后再重试；标题/正文为空、话题重复只作提醒。
+
+超长推文可以自动拆分：依次按句子、分句、空格、单字切开再贪心合并，链接不会被切断；
+整条 Thread 带 "1/5" 式编号时拆分后重新编号。
+"""
+
+import json
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+LIMITS = {
+    "twitter": {"tweet": 280, "url": 23},
+    "xiaohongshu": {"title": 20, "content": 1000, "hashtags": 10},
+    "wechat": {"title": 64, "summary": 120},
+}
+
+# Twitter 计 1 的字符范围（twitter-text v3），其余字符（CJK、emoji 等）计 2
+_HEAVY_RE = re.compile("[^\u0000-\u10ff\u2000-\u200d\u2010-\u201f\u2032-\u2037]")
+_URL_RE = re.compile(r"https?://[^\s<>\"'，。！？、；：）】」]+|www\.[^\s<>\"'，。！？、；：）】」]+", re.I)
+
+# 拆分时链接替换成私用区的单个字符（避开正文里已有的字符），保证不被切断，且每个字符的权重可以直接相加
+_PLACEHOLDERS = (range(0xE000, 0xF900), range(0xF0000, 0xFFFFE))
+# 依次尝试的切分粒度：句子、分句、空格分词，最后按单字
+_SPLITTERS = (
+    re.compile(r".+?(?:[。！？!?…\n]+[\"'”’」）)]*\s*|[.;；](?=\s)\s*|$)", re.S),
+    re.compile(r".+?(?:[，,、：:；;]\s*|$)", re.S),
+    re.compile(r"\S+\s*|\s+"),
+)
+_NUMBER_PREFIX_RE = re.compile(r"^\s*\(?(\d+)\s*/\s*(\d+)\)?\s*")
+_NUMBER_SUFFIX_RE = re.compile(r"\s*\(?(\d+)\s*/\s*(\d+)\)?\s*$")
+_NUMBER_RESERVE = len("99/99 ")
+
+
+class ContentRejected(ValueError):
+    """内容未通过发布前检查；issues 为拒绝的问题（severity 为 error）"""
+
+    def __init__(self, platform: str, issues: List[Dict]):
+        self.platform = platform
+        self.issues = issues
+        shown = "; ".join(issue["message"] for issue in issues[:3])
+        more = f" 等 {len(issues)} 个问题" if len(issues) > 3 else ""
+        super().__init__(f"{platform} 内容未通过发布前检查: {shown}{more}")
+
+
+def twitter_length(text: str) -> int:
+    """Twitter 加权字数：链接计 23，CJK 等字符计 2，其余计 1"""
+    urls = 0
+    if "://" in text or "www." in text:
+        text, urls = _URL_RE.subn("", text)
+    if text.isascii():
+        return len(text) + urls * LIMITS["twitter"]["url"]
+    return len(text) + len(_HEAVY_RE.findall(text)) + urls * LIMITS["twitter"]["url"]
+
+
+def _issue(platform: str, field: str, code: str, message: str, index: int = None,
+           length: int = None, limit: int = None, severity: str = "error") -> Dict:
+    return {"platform": platform, "field": field, "index": index, "code": code,
+            "message": message, "length": length, "limit": limit, "severity": severity}
+
+
+def errors(issues: List[Dict]) -> List[Dict]:
+    """需要拒绝的问题（warning 只作提醒）"""
+    return [issue for issue in issues if issue["severity"] == "error"]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def check_thread_type(thread) -> List[Dict]:
+    """Thread 必须是字符串列表，否则返回一个 invalid 问题（后续检查和拆分都依赖这一点）"""
+    if not isinstance(thread, list):
+        return [_issue("twitter", "thread", "invalid", f"Thread 必须是字符串列表，实际是 {type(thread).__name__}")]
+    for i, text in enumerate(thread):
+        if not isinstance(text, str):
+            return [_issue("twitter", "thread", "invalid",
+                           f"第 {i + 1} 条推文不是字符串（{type(text).__name__}）", index=i)]
+    return []
+
+
+def check_twitter(thread: List[str]) -> List[Dict]:
+    limits = LIMITS["twitter"]
+    issues = check_thread_type(thread)
+    if issues:
+        return issues
+    if not thread:
+        return [_issue("twitter", "thread", "empty", "Thread 为空", severity="warning")]
+    seen = {}
+    for i, text in enumerate(thread):
+        if not text or not text.strip():
+            issues.append(_issue("twitter", "thread", "empty", f"第 {i + 1} 条推文为空", index=i))
+            continue
+        length = twitter_length(text)
+        if length > limits["tweet"]:
+            issues.append(_issue("twitter", "thread", "too_long",
+                                 f"第 {i + 1} 条推文 {length} 字，超过 {limits['tweet']}",
+                                 index=i, length=length, limit=limits["tweet"]))
+        key = _normalize(text)
+        if key in seen:
+            issues.append(_issue("twitter", "thread", "duplicate",
+                                 f"第 {i + 1} 条推文与第 {seen[key] + 1} 条重复", index=i))
+        else:
+            seen[key] = i
+    return issues
+
+
+def check_xiaohongshu(title: str, content: str, hashtags: List[str] = None) -> List[Dict]:
+    limits = LIMITS["xiaohongshu"]
+    issues = []
+    if len(title) > limits["title"]:
+        issues.append(_issue("xiaohongshu", "title", "too_long",
+                             f"标题 {len(title)} 字，超过 {limits['title']}",
+                             length=len(title), limit=limits["title"]))
+    if not content.strip():
+        issues.append(_issue("xiaohongshu", "content", "empty", "正文为空", severity="warning"))
+    elif len(content) > limits["content"]:
+        issues.append(_issue("xiaohongshu", "content", "too_long",
+                             f"正文 {len(content)} 字，超过 {limits['content']}",
+                             length=len(content), limit=limits["content"]))
+    tags = [tag.strip().lstrip("#") for tag in hashtags or [] if tag and tag.strip().lstrip("#")]
+    if len(tags) > limits["hashtags"]:
+        issues.append(_issue("xiaohongshu", "hashtags", "too_many",
+                             f"话题 {len(tags)} 个，超过 {limits['hashtags']} 个",
+                             length=len(tags), limit=limits["hashtags"]))
+    seen = set()
+    for i, tag in enumerate(tags):
+        if tag.casefold() in seen:
+            issues.append(_issue("xiaohongshu", "hashtags", "duplicate", f"话题 #{tag} 重复", index=i,
+                                 severity="warning"))
+        seen.add(tag.casefold())
+    return issues
+
+
+def check_wechat(title: str, content: str, summary: str = "") -> List[Dict]:
+    limits = LIMITS["wechat"]
+    issues = []
+    if not title.strip():
+        issues.append(_issue("wechat", "title", "empty", "标题为空", severity="warning"))
+    elif len(title) > limits["title"]:
+        issues.append(_issue("wechat", "title", "too_long", f"标题 {len(title)} 字，超过 {limits['title']}",
+                             length=len(title), limit=limits["title"]))
+    if not content.strip():
+        issues.append(_issue("wechat", "content", "empty", "正文为空", severity="warning"))
+    if len(summary) > limits["summary"]:
+        issues.append(_issue("wechat", "summary", "too_long", f"摘要 {len(summary)} 字，超过 {limits['summary']}",
+                             length=len(summary), limit=limits["summary"]))
+    return issues
+
+
+def check_content(platform: str, content: Dict) -> List[Dict]:
+    """按 generated_content 中的结构检查一个平台的内容，返回问题列表（没有 error 即通过）"""
+    if platform == "twitter":
+        return check_twitter(content.get("thread") or [])
+    if platform == "xiaohongshu":
+        return check_xiaohongshu(content.get("title") or "", content.get("content") or "",
+                                 content.get("hashtags") or [])
+    if platform == "wechat":
+        return check_wechat(content.get("title") or "", content.get("content") or "",
+                            content.get("summary") or "")
+    raise ValueError(f"未知平台: {platform}")
+
+
+# ========== 超长推文拆分 ==========
+
+def _masked_weight(text: str, placeholder_re: Optional[re.Pattern]) -> int:
+    """链接已替换为占位符的文本的权重（逐字可加）"""
+    placeholders = len(placeholder_re.findall(text)) if placeholder_re else 0
+    # 占位符按非 ASCII 字符已计 2，补足到链接的 23
+    return len(text) + len(_HEAVY_RE.findall(text)) + placeholders * (LIMITS["twitter"]["url"] - 2)
+
+
+def _pack(text: str, limit: int, placeholder_re: Optional[re.Pattern], level: int = 0) -> List[str]:
+    """按 level 对应的粒度切开，贪心合并成不超过 limit 的片段；单个片段仍超长时换更细的粒度"""
+    if level < len(_SPLITTERS):
+        pieces = [piece for piece in _SPLITTERS[level].findall(text) if piece]
+    else:
+        pieces = list(text)
+    chunks, current, weight = [], "", 0
+    for piece in pieces:
+        piece_weight = _masked_weight(piece, placeholder_re)
+        if weight + piece_weight <= limit:
+            current += piece
+            weight += piece_weight
+            continue
+        if current.strip():
+            chunks.append(current)
+        current, weight = piece, piece_weight
+        if piece_weight > limit and level < len(_SPLITTERS):
+            finer = _pack(piece, limit, placeholder_re, level + 1) or [""]
+            chunks.extend(finer[:-1])
+            current = finer[-1]
+            weight = _masked_weight(current, placeholder_re)
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def split_tweet(text: str, limit: int = None) -> List[str]:
+    """把一条推文拆成若干条不超过 limit（默认 280）加权字数的推文"""
+    limit = limit or LIMITS["twitter"]["tweet"]
+    if twitter_length(text) <= limit:
+        return [text]
+    taken = set(text)
+    free = (chr(code) for codes in _PLACEHOLDERS for code in codes if chr(code) not in taken)
+    urls = {}
+
+    def hide(match):
+        placeholder = next(free, None)
+        if placeholder is None:
+            raise ValueError("推文中的链接过多，无法拆分")
+        urls[placeholder] = match.group(0)
+        return placeholder
+
+    masked = _URL_RE.sub(hide, text)
+    if not urls:
+        return [chunk.strip() for chunk in _pack(masked, limit, None)]
+    placeholder_re = re.compile("[" + re.escape("".join(urls)) + "]")
+    return [placeholder_re.sub(lambda m: urls[m.group(0)], chunk).strip()
+            for chunk in _pack(masked, limit, placeholder_re)]
+
+
+def _numbering(thread: List[str]) -> Optional[re.Pattern]:
+    """整条 Thread 都带 i/n 编号时返回编号的正则（前缀或后缀）"""
+    if len(thread) < 2:
+        return None
+    for pattern in (_NUMBER_PREFIX_RE, _NUMBER_SUFFIX_RE):
+        matches = [pattern.search(text) for text in thread]
+        if all(m and int(m.group(1)) == i for i, m in enumerate(matches, 1)):
+            return pattern
+    return None
+
+
+def resplit_thread(thread: List[str], limit: int = None) -> List[str]:
+    """拆分 Thread 中超长的推文，其余推文原样保留；带 i/n 编号的 Thread 拆分后重新编号"""
+    limit = limit or LIMITS["twitter"]["tweet"]
+    pattern = _numbering(thread)
+    bodies = [pattern.sub("", text) for text in thread] if pattern else list(thread)
+    body_limit = limit - _NUMBER_RESERVE if pattern else limit
+    if all(twitter_length(text) <= limit for text in thread):
+        return list(thread)
+    result = []
+    for text, body in zip(thread, bodies):
+        if twitter_length(text) <= limit:
+            result.append(body)
+        else:
+            result.extend(split_tweet(body, body_limit))
+    if pattern is None:
+        return result
+    total = len(result)
+    if pattern is _NUMBER_PREFIX_RE:
+        return [f"{i}/{total} {body}" for i, body in enumerate(result, 1)]
+    return [f"{body} {i}/{total}" for i, body in enumerate(result, 1)]
+
+
+# ========== 批量检查 ==========
+
+def parse_drafts(lines: Iterable[str]) -> Iterator[Dict]:
+    """逐行解析 JSONL 草稿，跳过空行；无法解析的行产出 {"invalid": 错误信息}"""
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            draft = json.loads(line)
+        except json.JSONDecodeError as e:
+            draft = {"invalid": f"第 {i + 1} 行不是 JSON: {e}"}
+        if not isinstance(draft, dict):
+            draft = {"invalid": f"第 {i + 1} 行不是 JSON 对象"}
+        yield dict(draft, id=draft.get("id", i))
+
+
+def check_drafts(drafts: Iterable[Dict], resplit: bool = False) -> Iterator[Dict]:
+    """逐个检查草稿 {"platform", ...generated_content 字段, "id"?}，产出
+    {"id", "platform", "ok", "issues"}（ok 表示没有 error，issues 含 warning）；
+    resplit 时先拆分超长推文并在结果中附上 "thread"
+    """
+    for i, draft in enumerate(drafts):
+        platform = draft.get("platform")
+        result = {"id": draft.get("id", i), "platform": platform}
+        if draft.get("invalid"):
+            issues = [_issue(platform, "draft", "invalid", draft["invalid"])]
+        else:
+            try:
+                if platform == "twitter" and resplit and not check_thread_type(draft.get("thread") or []):
+                    draft = dict(draft, thread=resplit_thread(draft.get("thread") or []))
+                    result["thread"] = draft["thread"]
+                issues = check_content(platform, draft)
+            except (ValueError, TypeError, AttributeError) as e:
+                issues = [_issue(platform, "draft", "invalid", str(e))]
+        result["ok"] = not errors(issues)
+        result["issues"] = issues
+        yield result
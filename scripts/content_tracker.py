@@ -4,30 +4,33 @@
 用于记录社交媒体运营全流程的内容，并在发布后进行验证
 """
 
+import hashlib
 import json
 import os
+import re
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 
-# 配置目录
-CONFIG_DIR = Path(__file__).parent.parent / ".social_publisher"
-SESSIONS_DIR = CONFIG_DIR / "sessions"
-
-
-def ensure_dirs():
-    """确保目录存在"""
-    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+# 装饰器在定义类时就要用到；其余模块（asyncio、socket、索引、图片等）按命令在用到时导入
+import tracker_metrics
+from session_store import (
+    CONFIG_DIR, SESSIONS_DIR, ensure_dirs, apply_op, get_store, set_default_store,
+    migrate_json_to_sqlite, post_key, parse_since, LazyDict, attach_segment
+)
 
 
 class ContentTracker:
     """内容追踪器"""
 
-    def __init__(self, topic: str):
+    @tracker_metrics.instrument("init")
+    def __init__(self, topic: str, store=None):
         ensure_dirs()
+        self.store = store or get_store()
+        self.messages = None
+        self._pending = None
         self.topic = topic
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.session_file = SESSIONS_DIR / f"session_{self.session_id}.json"
 
         self.data = {
             "session_id": self.session_id,
@@ -84,6 +87,7 @@ class ContentTracker:
                     "published_count": 0,
                     "expected_count": 0,
                     "urls": [],
+                    "tweets": {},  # 逐条发布状态，键为推文序号（从 0 开始），见 record_tweet_*
                     "errors": []
                 },
                 "xiaohongshu": {
@@ -109,152 +113,697 @@ class ContentTracker:
             }
         }
 
-        self._save()
+        self._build_indexes()
+        # 同一秒内创建的会话由存储后端分配带后缀的唯一ID
+        self.session_id = self.store.create(self.data)
+        self._update_index([("set", ["topic"], topic)])
 
-    def _save(self):
-        """保存会话数据"""
-        with open(self.session_file, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+    def _build_indexes(self):
+        """根据序列化的列表重建内存中的集合索引（成员判断 O(1)）"""
+        engagement = self.data["engagement"]
+        self._selected = set(engagement["selected_posts"])
+        self._liked = set(engagement["liked"])
+        self._replied = set(engagement["replied"])
+
+    def _persist(self, ops: List, snapshot: bool):
+        """持久化已应用到内存的操作；其他进程改过该会话时后端会重新加载并重放 ops，此时重建集合索引"""
+        if snapshot:
+            reloaded = self.store.save(self.session_id, self.data, ops)
+        else:
+            reloaded = self.store.append(self.session_id, self.data, ops)
+        if reloaded:
+            self._build_indexes()
+
+    def _commit(self, ops: List, snapshot: bool = False):
+        """应用一组增量操作并持久化：默认走后端的增量写入，snapshot=True 时写完整快照"""
+        for op in ops:
+            apply_op(self.data, op)
+        if self._pending is not None:
+            self._pending.extend(ops)
+            self._pending_snapshot = self._pending_snapshot or snapshot
+        else:
+            self._persist(ops, snapshot)
+            self._update_index(ops)
+
+    def begin_batch(self):
+        """进入批量模式：之后的改动只应用到内存，调用 flush() 时一次性持久化"""
+        if self._pending is None:
+            self._pending = []
+            self._pending_snapshot = False
+
+    def flush(self) -> int:
+        """持久化批量模式下累积的改动，返回写入的操作数（仍保持批量模式）"""
+        if not self._pending:
+            return 0
+        ops, self._pending = self._pending, []
+        self._persist(ops, self._pending_snapshot)
+        self._pending_snapshot = False
+        self._update_index(ops)
+        return len(ops)
+
+    def end_batch(self):
+        """持久化剩余改动并退出批量模式"""
+        self.flush()
+        self._pending = None
+
+    # ========== 跨会话索引（全文、已互动帖子、统计汇总） ==========
+
+    @staticmethod
+    def _text_fields(ops: List) -> set:
+        """一组操作改动了哪些全文索引字段"""
+        from tracker_index import TEXT_FIELDS
+        fields = set()
+        for _, path, _ in ops:
+            if path[0] == "topic":
+                fields.add("topic")
+            elif path[0] == "search" and len(path) > 1 and path[1] in ("query", "posts"):
+                fields.add("query" if path[1] == "query" else "post")
+            elif path[0] == "distilled":
+                fields.update(path[1:2] or ("trends", "key_points", "quotes", "summary"))
+            elif path[0] == "generated_content" and len(path) > 1 and path[2:3] != ["media"]:
+                fields.add(path[1])
+        return fields & set(TEXT_FIELDS)
+
+    def _text_items(self, field: str) -> Iterator:
+        """某个字段的 (ref, text) 文档流；列表字段每项一个文档"""
+        from tracker_index import post_text
+        if field == "topic":
+            yield "", self.data["topic"]
+        elif field == "query":
+            yield "", self.data["search"]["query"]
+        elif field == "post":
+            for post in self.iter_posts():
+                key = post_key(post)
+                if key is not None:
+                    author = post.get("author")
+                    if isinstance(author, dict):
+                        author = author.get("name") or author.get("username")
+                    yield key, f"{author or post.get('username') or ''} {post_text(post)}"
+        elif field in ("trends", "key_points", "quotes", "summary"):
+            value = self.data["distilled"][field]
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    yield str(i), _flatten_text(item)
+            else:
+                yield "", _flatten_text(value)
+        elif field == "twitter":
+            for i, tweet in enumerate(self.data["generated_content"]["twitter"]["thread"]):
+                yield str(i), tweet
+        else:
+            content = self.data["generated_content"][field]
+            yield "", _flatten_text([content.get("title"), content.get("content"), content.get("hashtags")])
+
+    def _update_index(self, ops: List):
+        """把已持久化的改动同步到跨会话索引：涉及的全文字段、新增的点赞/回复、统计汇总行
+
+        全部放在 index.db 的一个事务里，每次持久化（批量模式下每次 flush）只提交一次。
+        """
+        fields = self._text_fields(ops)
+        engaged = {"like": [], "reply": []}
+        for action, path, value in ops:
+            if action == "append" and path[:1] == ["engagement"] and path[1:] in (["liked"], ["replied"]):
+                engaged["like" if path[1] == "liked" else "reply"].append(value)
+        roots = {path[0] for _, path, _ in ops}
+        stats = bool(roots & {"topic", "status", "search", "engagement", "generated_content", "publish_status"})
+        if not (fields or stats or engaged["like"] or engaged["reply"]):
+            return
+        from tracker_index import get_index
+        index = get_index()
+        with index.transaction():
+            for field in fields:
+                index.replace_text(self.session_id, field, self._text_items(field))
+            for kind, post_ids in engaged.items():
+                if post_ids:
+                    index.mark_engaged(post_ids, kind, self.session_id)
+            if stats:
+                index.update_session_stats(self.data, errors="publish_status" in roots)
+
+    def reindex_text(self):
+        """把本会话所有字段写入全文索引"""
+        from tracker_index import TEXT_FIELDS, get_index
+        for field in TEXT_FIELDS:
+            get_index().replace_text(self.session_id, field, self._text_items(field))
+
+    def _echo(self, message: str):
+        """输出提示信息；设置了 messages 列表时收集起来而不是打印"""
+        if self.messages is not None:
+            self.messages.append(message)
+        else:
+            print(message)
+
+    def compact(self):
+        """把增量日志合并进快照（批量模式下先落盘待写改动）"""
+        self.flush()
+        self.store.compact(self.session_id, self.data)
 
     @classmethod
-    def load(cls, session_id: str) -> "ContentTracker":
+    @tracker_metrics.instrument()
+    def load(cls, session_id: str, store=None) -> "ContentTracker":
         """加载已有会话"""
-        session_file = SESSIONS_DIR / f"session_{session_id}.json"
-        if not session_file.exists():
-            raise FileNotFoundError(f"Session {session_id} not found")
-
-        with open(session_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        store = store or get_store()
+        data = store.load(session_id)
 
         tracker = cls.__new__(cls)
+        tracker.store = store
+        tracker.messages = None
+        tracker._pending = None
         tracker.topic = data["topic"]
         tracker.session_id = session_id
-        tracker.session_file = session_file
         tracker.data = data
+        tracker._build_indexes()
         return tracker
 
     @classmethod
-    def get_latest_session(cls) -> Optional["ContentTracker"]:
+    def get_latest_session(cls, store=None) -> Optional["ContentTracker"]:
         """获取最新的会话"""
-        ensure_dirs()
-        sessions = list(SESSIONS_DIR.glob("session_*.json"))
-        if not sessions:
+        store = store or get_store()
+        session_id = store.latest_id()
+        if not session_id:
             return None
-        latest = max(sessions, key=lambda p: p.stat().st_mtime)
-        session_id = latest.stem.replace("session_", "")
-        return cls.load(session_id)
+        return cls.load(session_id, store)
 
     # ========== Phase 1: 搜索 ==========
 
-    def record_search(self, query: str, time_range: str, posts: List[Dict]):
-        """记录搜索结果"""
-        self.data["search"]["query"] = query
-        self.data["search"]["time_range"] = time_range
-        self.data["search"]["total_found"] = len(posts)
-        self.data["search"]["posts"] = posts
-        self.data["status"] = "searched"
-        self._save()
-        print(f"📝 已记录 {len(posts)} 条搜索结果")
+    @tracker_metrics.instrument()
+    def record_search(self, query: str, time_range: str, posts: List[Dict],
+                      drop_duplicates: bool = False):
+        """记录搜索结果
+
+        与历史会话中的帖子近似重复的，加上 duplicate_of 标记（drop_duplicates 时直接丢弃）。
+        """
+        stats = {"duplicates": 0}
+        posts = list(self._dedupe_posts(posts, drop_duplicates, stats))
+        ops = [
+            ("set", ["search", "query"], query),
+            ("set", ["search", "time_range"], time_range),
+            ("set", ["search", "total_found"], len(posts)),
+            ("set", ["search", "posts"], posts),
+            ("set", ["status"], "searched"),
+        ]
+        if self.data["search"].get("posts_external"):
+            ops.append(("set", ["search", "posts_external"], False))
+        self._commit(ops, snapshot=True)
+        self._echo(f"📝 已记录 {len(posts)} 条搜索结果{self._duplicates_note(stats, drop_duplicates)}")
+
+    @tracker_metrics.instrument()
+    def record_search_stream(self, query: str, time_range: str, posts: Iterable[Dict],
+                             drop_duplicates: bool = False) -> int:
+        """流式记录搜索结果：逐条去重后写入帖子旁路存储，会话本身只记录计数
+
+        内存占用只有已见过的帖子ID和指纹，与帖子内容总量无关。返回去重后的帖子数。
+        与历史帖子近似重复的处理同 record_search。
+        """
+        stats = {"duplicates": 0}
+        seen = set()
+        duplicates = 0
+
+        def unique_posts():
+            nonlocal duplicates
+            for post in posts:
+                key = post_key(post)
+                if key is not None:
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                yield post
+
+        total = self.store.write_posts(
+            self.session_id, self._dedupe_posts(unique_posts(), drop_duplicates, stats))
+        self._commit([
+            ("set", ["search", "query"], query),
+            ("set", ["search", "time_range"], time_range),
+            ("set", ["search", "total_found"], total),
+            ("set", ["search", "posts_external"], True),
+            ("set", ["status"], "searched"),
+        ])
+        attach_segment(self.data, "posts", lambda: list(self.store.iter_posts(self.session_id)))
+        self._update_index([("set", ["search", "posts"], None)])
+        self._echo(f"📝 已流式记录 {total} 条搜索结果（去重 {duplicates} 条）"
+                   f"{self._duplicates_note(stats, drop_duplicates)}")
+        return total
+
+    def _dedupe_posts(self, posts: Iterable[Dict], drop: bool, stats: Dict) -> Iterator[Dict]:
+        """对照历史会话的帖子指纹逐条检查近似重复，全部检查完后把本次帖子写入指纹索引
+
+        本次的指纹最后一次性写入：查找时不会扫到本会话自己的指纹，写入也只有一个事务。
+        """
+        from tracker_index import get_index, post_text, simhash
+        index = get_index()
+        index.clear_fingerprints("post", self.session_id)
+        fingerprints = []
+        checked = {}  # 转发等正文相同的帖子指纹相同，只查一次
+        for post in posts:
+            key = post_key(post)
+            h = simhash(post_text(post)) if key is not None else None
+            if h is not None:
+                matches = checked.get(h)
+                if matches is None:
+                    # 只用到最相近的一条
+                    matches = checked[h] = index.find_similar(h, "post", exclude_session=self.session_id, limit=1)
+                fingerprints.append((key, h))
+                if matches:
+                    stats["duplicates"] += 1
+                    if drop:
+                        continue
+                    match = matches[0]
+                    post = dict(post, duplicate_of={"session_id": match["session_id"],
+                                                    "post_id": match["ref"],
+                                                    "distance": match["distance"]})
+            yield post
+        index.add_fingerprints("post", self.session_id, fingerprints)
+
+    @staticmethod
+    def _duplicates_note(stats: Dict, dropped: bool) -> str:
+        if not stats["duplicates"]:
+            return ""
+        action = "已丢弃" if dropped else "已标记 duplicate_of"
+        return f"，{stats['duplicates']} 条与历史帖子近似重复（{action}）"
+
+    def iter_posts(self) -> Iterator[Dict]:
+        """逐条遍历搜索结果（流式写入的帖子从旁路存储读取）"""
+        search = self.data["search"]
+        if isinstance(search, LazyDict) and search.is_lazy("posts"):
+            return self.store.iter_posts(self.session_id)
+        return iter(search["posts"])
 
     # ========== Phase 2: 互动 ==========
 
+    @tracker_metrics.instrument()
     def record_selected_for_engagement(self, post_ids: List[str]):
         """记录选定要互动的帖子"""
-        self.data["engagement"]["selected_posts"] = post_ids
-        self._save()
-        print(f"📝 已记录 {len(post_ids)} 条选定互动的帖子")
-
+        self._commit([("set", ["engagement", "selected_posts"], post_ids)])
+        self._selected = set(post_ids)
+        self._echo(f"📝 已记录 {len(post_ids)} 条选定互动的帖子")
+
+    def rank_posts(self, k: int = 20, weights: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """给搜索结果打分，把前 K 条写入 engagement.selected_posts
+
+        weights 覆盖 post_ranking.DEFAULT_WEIGHTS 中的部分权重；本会话已点赞或回复过的帖子不参与排序。
+        返回 [{"post_id", "score"}]，按分数降序。
+        """
+        if k < 1:
+            raise ValueError(f"k 必须是正整数: {k}")
+        import post_ranking
+        ranked = post_ranking.rank_posts(self.iter_posts(), k, weights,
+                                         exclude=self._liked | self._replied)
+        self.record_selected_for_engagement([post_id for post_id, _ in ranked])
+        return [{"post_id": post_id, "score": round(score, 4)} for post_id, score in ranked]
+
+    def is_selected(self, post_id: str) -> bool:
+        return post_id in self._selected
+
+    def is_liked(self, post_id: str) -> bool:
+        return post_id in self._liked
+
+    def is_replied(self, post_id: str) -> bool:
+        return post_id in self._replied
+
+    @tracker_metrics.instrument()
     def record_like(self, post_id: str):
         """记录点赞"""
-        if post_id not in self.data["engagement"]["liked"]:
-            self.data["engagement"]["liked"].append(post_id)
-            self._save()
-
+        self.record_likes([post_id])
+
+    @tracker_metrics.instrument()
+    def record_likes(self, post_ids: List[str]) -> int:
+        """批量记录点赞，只持久化一次，返回新增数量"""
+        ops = []
+        for post_id in post_ids:
+            if post_id not in self._liked:
+                self._liked.add(post_id)
+                ops.append(("append", ["engagement", "liked"], post_id))
+        if ops:
+            self._commit(ops)
+        return len(ops)
+
+    @tracker_metrics.instrument()
     def record_reply(self, post_id: str, reply_text: str):
         """记录回复"""
-        if post_id not in self.data["engagement"]["replied"]:
-            self.data["engagement"]["replied"].append(post_id)
-        self.data["engagement"]["replies_content"][post_id] = reply_text
-        self._save()
+        self.record_replies({post_id: reply_text})
+
+    @tracker_metrics.instrument()
+    def record_replies(self, replies: Dict[str, str]) -> int:
+        """批量记录回复 {post_id: reply_text}，只持久化一次，返回新增回复的帖子数"""
+        ops = []
+        added = []
+        for post_id, reply_text in replies.items():
+            if post_id not in self._replied:
+                self._replied.add(post_id)
+                ops.append(("append", ["engagement", "replied"], post_id))
+                added.append(post_id)
+            ops.append(("set", ["engagement", "replies_content", post_id], reply_text))
+        if ops:
+            self._commit(ops)
+        return len(added)
+
+    @staticmethod
+    def already_engaged(post_ids: List[str], kind: str = None) -> List[str]:
+        """跨会话查询：返回 post_ids 中任意会话已经互动过的帖子（kind 可限定 like / reply）"""
+        from tracker_index import get_index
+        engaged = get_index().filter_engaged(post_ids, kind)
+        return [post_id for post_id in post_ids if post_id in engaged]
 
     # ========== Phase 3: 提炼 ==========
 
+    @tracker_metrics.instrument()
     def record_distilled_content(self, trends: List[str], key_points: List[str],
                                   quotes: List[Dict], summary: str):
         """记录提炼的内容"""
-        self.data["distilled"] = {
-            "trends": trends,
-            "key_points": key_points,
-            "quotes": quotes,
-            "summary": summary
-        }
-        self.data["status"] = "distilled"
-        self._save()
-        print(f"📝 已记录提炼内容: {len(trends)} 个趋势, {len(key_points)} 个要点")
+        self._commit([
+            ("set", ["distilled"], {
+                "trends": trends,
+                "key_points": key_points,
+                "quotes": quotes,
+                "summary": summary
+            }),
+            ("set", ["status"], "distilled"),
+        ])
+        self._echo(f"📝 已记录提炼内容: {len(trends)} 个趋势, {len(key_points)} 个要点")
 
     # ========== Phase 4: 生成内容 ==========
 
-    def record_twitter_content(self, thread: List[str]):
-        """记录 Twitter Thread 内容"""
-        self.data["generated_content"]["twitter"]["thread"] = thread
-        self.data["generated_content"]["twitter"]["total_tweets"] = len(thread)
-        self.data["publish_status"]["twitter"]["expected_count"] = len(thread)
-        self._save()
-        print(f"📝 已记录 Twitter Thread: {len(thread)} 条推文")
-
-    def record_xiaohongshu_content(self, title: str, content: str, hashtags: List[str] = None):
-        """记录小红书内容"""
-        self.data["generated_content"]["xiaohongshu"] = {
+    @tracker_metrics.instrument()
+    def record_twitter_content(self, thread: List[str], resplit: bool = False, check: bool = True) -> List[Dict]:
+        """记录 Twitter Thread 内容，返回历史上近似重复的内容
+
+        check 时先做发布前检查，超限则抛出 ContentRejected 且不记录；resplit 时先自动拆分超长推文。
+        thread 不是字符串列表时无论 check 与否都拒绝。
+        """
+        import content_rules
+        invalid = content_rules.check_thread_type(thread)
+        if invalid:
+            raise content_rules.ContentRejected("twitter", invalid)
+        if resplit:
+            split = content_rules.resplit_thread(thread)
+            if len(split) != len(thread):
+                self._echo(f"✂️ 已拆分超长推文: {len(thread)} → {len(split)} 条")
+            thread = split
+        if check:
+            self._preflight("twitter", {"thread": thread})
+        self._commit([
+            ("set", ["generated_content", "twitter", "thread"], thread),
+            ("set", ["generated_content", "twitter", "total_tweets"], len(thread)),
+            ("set", ["publish_status", "twitter", "expected_count"], len(thread)),
+        ])
+        self._echo(f"📝 已记录 Twitter Thread: {len(thread)} 条推文")
+        return self._check_similar_content("twitter", {"thread": thread})
+
+    @tracker_metrics.instrument()
+    def record_xiaohongshu_content(self, title: str, content: str, hashtags: List[str] = None,
+                                   check: bool = True) -> List[Dict]:
+        """记录小红书内容，返回历史上近似重复的内容（check 同 record_twitter_content）"""
+        if check:
+            self._preflight("xiaohongshu", {"title": title, "content": content, "hashtags": hashtags})
+        self._commit([("set", ["generated_content", "xiaohongshu"], self._keep_media("xiaohongshu", {
             "title": title,
             "content": content,
             "hashtags": hashtags or []
-        }
-        self._save()
-        print(f"📝 已记录小红书内容: {title}")
-
-    def record_wechat_content(self, title: str, content: str, summary: str = ""):
-        """记录微信公众号内容"""
-        self.data["generated_content"]["wechat"] = {
+        }))])
+        self._echo(f"📝 已记录小红书内容: {title}")
+        return self._check_similar_content("xiaohongshu", {"title": title, "content": content})
+
+    @tracker_metrics.instrument()
+    def record_wechat_content(self, title: str, content: str, summary: str = "",
+                              check: bool = True) -> List[Dict]:
+        """记录微信公众号内容，返回历史上近似重复的内容（check 同 record_twitter_content）"""
+        if check:
+            self._preflight("wechat", {"title": title, "content": content, "summary": summary})
+        self._commit([("set", ["generated_content", "wechat"], self._keep_media("wechat", {
             "title": title,
             "content": content,
             "summary": summary
-        }
-        self._save()
-        print(f"📝 已记录微信公众号内容: {title}")
+        }))])
+        self._echo(f"📝 已记录微信公众号内容: {title}")
+        return self._check_similar_content("wechat", {"title": title, "content": content})
+
+    def _keep_media(self, platform: str, content: Dict) -> Dict:
+        """重新记录文案时保留已记录的媒体引用"""
+        media = self.data["generated_content"][platform].get("media")
+        if media:
+            content["media"] = media
+        return content
+
+    @tracker_metrics.instrument()
+    def record_media(self, platform: str, paths: List[str]) -> List[Dict]:
+        """把图片加入媒体库并准备 platform 可用的版本，引用记录到 generated_content[platform]["media"]
+
+        同一文件（按内容哈希）已处理过或已上传过时直接复用，引用中带上有效的 upload_id。
+        """
+        if platform not in self.data["generated_content"]:
+            raise ValueError(f"未知平台: {platform}")
+        from media_store import MediaError, get_media_store
+        store = get_media_store()
+        refs, reused, uploaded = [], 0, 0
+        for path in paths:
+            original = store.add(path)
+            try:
+                prepared = store.prepare(original["hash"], platform)
+            except MediaError as e:
+                raise MediaError(f"{Path(path).name}: {e}")
+            upload = store.upload_for(original["hash"], platform)
+            reused += prepared["reused"]
+            uploaded += upload is not None
+            refs.append({
+                "hash": original["hash"],
+                "name": Path(path).name,
+                "path": prepared["path"],
+                "format": prepared["format"],
+                "width": prepared["width"],
+                "height": prepared["height"],
+                "upload_id": upload["upload_id"] if upload else "",
+                "url": upload["url"] if upload else "",
+            })
+        self._commit([("set", ["generated_content", platform, "media"], refs)])
+        self._echo(f"🖼️ 已记录 {platform} 媒体: {len(refs)} 个（复用已处理 {reused} 个，可复用上传 {uploaded} 个）")
+        return refs
+
+    @tracker_metrics.instrument()
+    def record_media_upload(self, platform: str, media_hash: str, upload_id: str, url: str = "") -> Dict:
+        """记录平台返回的上传 ID（媒体库中全局复用），并更新本会话中对应的媒体引用"""
+        if platform not in self.data["generated_content"]:
+            raise ValueError(f"未知平台: {platform}")
+        if not media_hash or not upload_id:
+            raise ValueError("需要媒体哈希和上传ID")
+        refs = [dict(ref) for ref in self.data["generated_content"][platform].get("media", [])]
+        matched = [ref for ref in refs if ref["hash"].startswith(media_hash)]
+        if len(matched) != 1:
+            raise ValueError(f"{platform} 媒体中{'没有' if not matched else '有多个'}匹配 {media_hash} 的引用")
+        ref = matched[0]
+        from media_store import get_media_store
+        get_media_store().record_upload(ref["hash"], platform, upload_id, url)
+        ref.update(upload_id=upload_id, url=url or "")
+        self._commit([("set", ["generated_content", platform, "media"], refs)])
+        return ref
+
+    def _preflight(self, platform: str, content: Dict):
+        """发布前检查，有 error 时抛出 ContentRejected（本会话不做任何写入），warning 只提示"""
+        import content_rules
+        issues = content_rules.check_content(platform, content)
+        errors = content_rules.errors(issues)
+        if errors:
+            tracker_metrics.count("preflight_rejected", platform=platform)
+            raise content_rules.ContentRejected(platform, errors)
+        for issue in issues:
+            self._echo(f"⚠️ {issue['message']}")
+
+    def _check_similar_content(self, platform: str, content: Dict) -> List[Dict]:
+        """对照历史会话检查生成内容是否近似重复，并更新本会话的指纹"""
+        from tracker_index import content_text, get_index, simhash
+        h = simhash(content_text(platform, content))
+        if h is None:
+            return []
+        index = get_index()
+        matches = index.find_similar(h, platform, exclude_session=self.session_id)
+        index.add_fingerprints(platform, self.session_id, [("", h)])
+        for match in matches[:3]:
+            self._echo(f"⚠️ 与会话 {match['session_id']} 的 {platform} 内容高度相似"
+                       f"（汉明距离 {match['distance']}）")
+        return matches
+
+    def find_duplicates(self) -> List[Dict]:
+        """检查本会话的帖子和生成内容在历史会话中的近似重复（只读）"""
+        from tracker_index import content_text, get_index, post_text, simhash
+        index = get_index()
+        found = []
+        for post in self.iter_posts():
+            key = post_key(post)
+            h = simhash(post_text(post)) if key is not None else None
+            if h is not None:
+                for match in index.find_similar(h, "post", exclude_session=self.session_id):
+                    found.append(dict(match, source=key))
+        generated = self.data["generated_content"]
+        for platform in ("twitter", "xiaohongshu", "wechat"):
+            h = simhash(content_text(platform, generated[platform]))
+            if h is not None:
+                for match in index.find_similar(h, platform, exclude_session=self.session_id):
+                    found.append(dict(match, source=platform))
+        return found
 
     # ========== Phase 5: 发布状态 ==========
 
+    @tracker_metrics.instrument()
     def record_twitter_publish(self, published_count: int, urls: List[str] = None,
                                 status: str = "published", error: str = None):
-        """记录 Twitter 发布状态"""
-        self.data["publish_status"]["twitter"]["published_count"] = published_count
-        self.data["publish_status"]["twitter"]["status"] = status
+        """记录 Twitter 发布状态（按前缀计数；逐条记录见 record_tweet_published）"""
+        ops = [
+            ("set", ["publish_status", "twitter", "published_count"], published_count),
+            ("set", ["publish_status", "twitter", "status"], status),
+        ]
         if urls:
-            self.data["publish_status"]["twitter"]["urls"] = urls
+            ops.append(("set", ["publish_status", "twitter", "urls"], urls))
         if error:
-            self.data["publish_status"]["twitter"]["errors"].append(error)
-        self._save()
-
+            ops.append(("append", ["publish_status", "twitter", "errors"], error))
+        if self.data["publish_status"]["twitter"].get("tweets"):
+            # 已有逐条状态时，把前 published_count 条同步标记为已发布
+            now = datetime.now().isoformat()
+            for tweet in self.twitter_progress()[:published_count]:
+                if tweet["status"] != "published":
+                    url = urls[tweet["index"]] if urls and tweet["index"] < len(urls) else ""
+                    entry = dict(_tweet_entry(tweet), status="published", url=url, tweet_id=_tweet_id(url),
+                                 published_at=now, updated_at=now)
+                    ops.append(("set", ["publish_status", "twitter", "tweets", str(tweet["index"])], entry))
+        self._commit(ops)
+        tracker_metrics.count("publish_outcomes", platform="twitter", status=status)
+
+    def twitter_progress(self) -> List[Dict]:
+        """Thread 中每条推文的发布状态（含 text），按序号排列
+
+        旧会话没有逐条记录时，按 published_count / urls 把前缀视为已发布。
+        """
+        status = self.data["publish_status"]["twitter"]
+        tweets = status.get("tweets") or {}
+        urls = status.get("urls") or []
+        progress = []
+        for index, text in enumerate(self.data["generated_content"]["twitter"]["thread"]):
+            entry = tweets.get(str(index))
+            if entry is None:
+                entry = _tweet_entry({"index": index})
+                if not tweets and index < status["published_count"]:
+                    url = urls[index] if index < len(urls) else ""
+                    entry.update(status="published", url=url, tweet_id=_tweet_id(url))
+            progress.append(dict(entry, text=text))
+        return progress
+
+    def _record_tweet(self, index: int, error: str = None, **fields) -> Dict:
+        """更新第 index 条推文的状态，同时重算 published_count / urls / status"""
+        status = self.data["publish_status"]["twitter"]
+        progress = self.twitter_progress()
+        if not 0 <= index < len(progress):
+            raise ValueError(f"推文序号超出范围: {index}（共 {len(progress)} 条）")
+        entry = _tweet_entry(progress[index])
+        entry.update(fields, updated_at=datetime.now().isoformat())
+        progress[index] = entry
+
+        ops = []
+        if not status.get("tweets"):
+            # 第一次逐条记录：先把按前缀推断出的已发布推文写下来
+            ops.append(("set", ["publish_status", "twitter", "tweets"],
+                        {str(t["index"]): _tweet_entry(t) for t in progress if t["status"] == "published"}))
+        ops.append(("set", ["publish_status", "twitter", "tweets", str(index)], entry))
+
+        confirmed = [t for t in progress if t["status"] == "published"]
+        if len(confirmed) == len(progress):
+            overall = "published"
+        elif confirmed:
+            overall = "partial"
+        else:
+            overall = "failed" if entry["status"] == "failed" else status["status"]
+        ops += [
+            ("set", ["publish_status", "twitter", "published_count"], len(confirmed)),
+            ("set", ["publish_status", "twitter", "urls"], [t["url"] for t in confirmed if t["url"]]),
+            ("set", ["publish_status", "twitter", "status"], overall),
+        ]
+        if error:
+            ops.append(("append", ["publish_status", "twitter", "errors"], f"#{index}: {error}"))
+        self._commit(ops)
+        # 逐条推文的结果（pending 为发送前记录的尝试）
+        tracker_metrics.count("tweet_outcomes", status=entry["status"])
+        return entry
+
+    @tracker_metrics.instrument()
+    def record_tweet_attempt(self, index: int) -> Dict:
+        """发送第 index 条推文之前记录一次尝试；之后没有确认的尝试在续发时会被标出"""
+        progress = self.twitter_progress()
+        entry = progress[index] if 0 <= index < len(progress) else {}
+        now = datetime.now().isoformat()
+        fields = {"attempts": entry.get("attempts", 0) + 1,
+                  "first_attempt_at": entry.get("first_attempt_at") or now, "last_attempt_at": now}
+        if entry.get("status") != "published":
+            fields["status"] = "pending"
+        return self._record_tweet(index, **fields)
+
+    @tracker_metrics.instrument()
+    def record_tweet_published(self, index: int, url: str = "", tweet_id: str = "",
+                               parent_id: str = None) -> Dict:
+        """确认第 index 条推文已发布；parent_id 默认取它前面最近一条已确认推文"""
+        if parent_id is None:
+            confirmed = [t for t in self.twitter_progress()[:index] if t["status"] == "published"]
+            parent_id = (confirmed[-1]["tweet_id"] or confirmed[-1]["url"]) if confirmed else ""
+        return self._record_tweet(index, status="published", url=url, tweet_id=tweet_id or _tweet_id(url),
+                                  parent_id=parent_id, published_at=datetime.now().isoformat(), error_message="")
+
+    @tracker_metrics.instrument()
+    def record_tweet_failed(self, index: int, error: str = "") -> Dict:
+        """记录第 index 条推文发布失败（已确认的推文不会被改回失败）"""
+        progress = self.twitter_progress()
+        if 0 <= index < len(progress) and progress[index]["status"] == "published":
+            return progress[index]
+        return self._record_tweet(index, error=error or None, status="failed", error_message=error)
+
+    def twitter_resume(self) -> Dict:
+        """Thread 续发计划：只列出未确认的推文，以及每条应回复的推文
+
+        reply_to 为 None 表示作为 Thread 第一条发出；reply_to["confirmed"] 为 False 时，
+        表示回复本次续发中刚发出的第 reply_to["index"] 条。
+        unconfirmed_attempt 为 True 的推文曾经发送过但没有确认，续发前应先到时间线上确认是否已发出。
+        """
+        progress = self.twitter_progress()
+        remaining = []
+        parent = None
+        for tweet in progress:
+            if tweet["status"] == "published":
+                parent = {"index": tweet["index"], "confirmed": True,
+                          "tweet_id": tweet["tweet_id"], "url": tweet["url"]}
+                continue
+            remaining.append({
+                "index": tweet["index"],
+                "text": tweet["text"],
+                "reply_to": parent,
+                "attempts": tweet["attempts"],
+                "unconfirmed_attempt": tweet["attempts"] > 0 and tweet["status"] == "pending",
+            })
+            parent = {"index": tweet["index"], "confirmed": False, "tweet_id": "", "url": ""}
+        return {"total": len(progress), "confirmed": len(progress) - len(remaining), "remaining": remaining}
+
+    @tracker_metrics.instrument()
     def record_xiaohongshu_publish(self, url: str = "", status: str = "published",
                                     error: str = None):
         """记录小红书发布状态"""
-        self.data["publish_status"]["xiaohongshu"]["status"] = status
-        self.data["publish_status"]["xiaohongshu"]["url"] = url
+        ops = [
+            ("set", ["publish_status", "xiaohongshu", "status"], status),
+            ("set", ["publish_status", "xiaohongshu", "url"], url),
+        ]
         if error:
-            self.data["publish_status"]["xiaohongshu"]["errors"].append(error)
-        self._save()
+            ops.append(("append", ["publish_status", "xiaohongshu", "errors"], error))
+        self._commit(ops)
+        tracker_metrics.count("publish_outcomes", platform="xiaohongshu", status=status)
 
+    @tracker_metrics.instrument()
     def record_wechat_publish(self, url: str = "", status: str = "published",
                                error: str = None):
         """记录微信发布状态"""
-        self.data["publish_status"]["wechat"]["status"] = status
-        self.data["publish_status"]["wechat"]["url"] = url
+        ops = [
+            ("set", ["publish_status", "wechat", "status"], status),
+            ("set", ["publish_status", "wechat", "url"], url),
+        ]
         if error:
-            self.data["publish_status"]["wechat"]["errors"].append(error)
-        self._save()
+            ops.append(("append", ["publish_status", "wechat", "errors"], error))
+        self._commit(ops)
+        tracker_metrics.count("publish_outcomes", platform="wechat", status=status)
 
     # ========== Phase 6: 核查 ==========
 
+    @tracker_metrics.instrument()
     def verify(self) -> Dict:
         """执行核查并返回结果"""
         issues = []
@@ -300,19 +849,38 @@ class ContentTracker:
                 })
 
         # 更新核查结果
-        self.data["verification"] = {
-            "verified_at": datetime.now().isoformat(),
-            "twitter_verified": len([i for i in issues if i["platform"] == "twitter"]) == 0,
-            "xiaohongshu_verified": len([i for i in issues if i["platform"] == "xiaohongshu"]) == 0,
-            "wechat_verified": len([i for i in issues if i["platform"] == "wechat"]) == 0,
-            "issues": issues,
-            "notes": ""
-        }
-        self.data["status"] = "verified"
-        self._save()
+        self._commit([
+            ("set", ["verification"], {
+                "verified_at": datetime.now().isoformat(),
+                "twitter_verified": len([i for i in issues if i["platform"] == "twitter"]) == 0,
+                "xiaohongshu_verified": len([i for i in issues if i["platform"] == "xiaohongshu"]) == 0,
+                "wechat_verified": len([i for i in issues if i["platform"] == "wechat"]) == 0,
+                "issues": issues,
+                "notes": "",
+                "input_hash": self.verify_input_hash(),
+            }),
+            ("set", ["status"], "verified"),
+        ])
 
         return self.data["verification"]
 
+    def verify_input_hash(self) -> str:
+        """核查所依赖内容的摘要：发布状态，以及生成内容的推文数和标题（不加载公众号正文）"""
+        generated = self.data["generated_content"]
+        basis = {
+            "publish_status": self.data["publish_status"],
+            "twitter": len(generated["twitter"]["thread"]),
+            "xiaohongshu": generated["xiaohongshu"]["title"],
+            "wechat": generated["wechat"]["title"],
+        }
+        return hashlib.sha1(json.dumps(basis, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def needs_verify(self) -> bool:
+        """自上次核查以来发布状态或生成内容是否有变化（从未核查过也算）"""
+        verification = self.data["verification"]
+        return not verification["verified_at"] or verification.get("input_hash") != self.verify_input_hash()
+
+    @tracker_metrics.instrument()
     def get_report(self) -> str:
         """生成核查报告"""
         report = []
@@ -343,6 +911,11 @@ class ContentTracker:
         report.append(f"   Twitter Thread: {generated['twitter']['total_tweets']} 条推文")
         report.append(f"   小红书: {generated['xiaohongshu']['title'] or '(无)'}")
         report.append(f"   微信公众号: {generated['wechat']['title'] or '(无)'}")
+        media = [f"{name} {len(generated[platform]['media'])}"
+                 for platform, name in (("twitter", "Twitter"), ("xiaohongshu", "小红书"), ("wechat", "微信公众号"))
+                 if generated[platform].get("media")]
+        if media:
+            report.append(f"   媒体: {', '.join(media)}")
 
         # 发布状态
         publish = self.data["publish_status"]
@@ -379,24 +952,480 @@ class ContentTracker:
         return "\n".join(report)
 
     def get_unpublished_twitter_content(self) -> List[str]:
-        """获取未发布的 Twitter 内容"""
-        twitter = self.data["generated_content"]["twitter"]
-        publish = self.data["publish_status"]["twitter"]
+        """获取未发布的 Twitter 内容（跳过已逐条确认的推文）"""
+        return [tweet["text"] for tweet in self.twitter_resume()["remaining"]]
+
+    def get_resume_plan(self) -> Dict:
+        """所有平台剩余的发布工作：Twitter 为逐条续发计划，小红书 / 公众号为未发布的完整内容"""
+        plan = {}
+        twitter = self.twitter_resume()
+        if twitter["remaining"]:
+            plan["twitter"] = twitter
+        generated, publish = self.data["generated_content"], self.data["publish_status"]
+        for platform, done in (("xiaohongshu", ("published",)), ("wechat", ("published", "draft"))):
+            content = generated[platform]
+            if content["title"] and publish[platform]["status"] not in done:
+                plan[platform] = dict({key: content[key] for key in content},
+                                      status=publish[platform]["status"])
+        return plan
+
+
+# ========== 操作分发 ==========
+# CLI 子命令和 batch 模式共用的操作格式: {"op": "like", "post_id": "..."}
+
+
+def _as_list(value) -> List:
+    """接受 JSON 数组、逗号分隔字符串或 None"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v for v in value.split(",") if v]
+    return list(value)
 
-        published_count = publish["published_count"]
-        all_tweets = twitter["thread"]
 
-        if published_count < len(all_tweets):
-            return all_tweets[published_count:]
-        return []
+def _flatten_text(value) -> str:
+    """把字符串 / 列表 / dict 中的文本拼接起来（用于全文索引）"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        return " ".join(_flatten_text(v) for v in value if v)
+    return "" if value is None else str(value)
+
+
+_TWEET_ID_RE = re.compile(r"/status(?:es)?/(\d+)")
+
+
+def _tweet_id(url: str) -> str:
+    """从推文 URL 中取出推文ID"""
+    match = _TWEET_ID_RE.search(url or "")
+    return match.group(1) if match else ""
+
+
+def _tweet_entry(tweet: Dict) -> Dict:
+    """单条推文的发布状态（去掉 text 等附加字段，缺省字段补齐）"""
+    entry = {"index": tweet["index"], "status": "pending", "tweet_id": "", "url": "", "parent_id": "",
+             "attempts": 0, "first_attempt_at": "", "last_attempt_at": "", "published_at": "",
+             "updated_at": "", "error_message": ""}
+    entry.update((key, tweet[key]) for key in entry if key in tweet)
+    return entry
+
+
+def iter_ndjson(lines) -> Iterator[Dict]:
+    """逐行解析 NDJSON，跳过空行"""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _op_search(tracker: "ContentTracker", op: Dict) -> Dict:
+    query, time_range = op["query"], op.get("time_range", "24h")
+    drop = bool(op.get("drop_duplicates"))
+    if op.get("posts_file"):
+        with open(op["posts_file"], "r", encoding="utf-8") as f:
+            tracker.record_search_stream(query, time_range, iter_ndjson(f), drop)
+    elif op.get("posts_stream") is not None:
+        tracker.record_search_stream(query, time_range, iter_ndjson(op["posts_stream"]), drop)
+    else:
+        tracker.record_search(query, time_range, op.get("posts", []), drop)
+    return {"total_found": tracker.data["search"]["total_found"]}
+
+
+def _op_select(tracker: "ContentTracker", op: Dict) -> Dict:
+    post_ids = _as_list(op.get("post_ids")) or [op["post_id"]]
+    tracker.record_selected_for_engagement(post_ids)
+    return {"selected": len(post_ids)}
+
+
+def _op_rank(tracker: "ContentTracker", op: Dict) -> Dict:
+    weights = op.get("weights")
+    if isinstance(weights, str):
+        weights = json.loads(weights)
+    ranked = tracker.rank_posts(int(op["k"]) if op.get("k") is not None else 20, weights)
+    return {"ranked": ranked}
+
+
+def _op_like(tracker: "ContentTracker", op: Dict) -> Dict:
+    post_ids = _as_list(op.get("post_ids")) or [op["post_id"]]
+    added = tracker.record_likes(post_ids)
+    tracker._echo(f"✅ 已记录点赞: {', '.join(post_ids)}")
+    return {"added": added}
+
+
+def _op_reply(tracker: "ContentTracker", op: Dict) -> Dict:
+    replies = op.get("replies") or {op["post_id"]: op.get("reply_text") or ""}
+    added = tracker.record_replies(replies)
+    tracker._echo(f"✅ 已记录回复: {', '.join(replies)}")
+    return {"added": added}
+
+
+def _op_check(tracker: "ContentTracker", op: Dict) -> Dict:
+    post_ids = _as_list(op.get("post_ids")) or [op["post_id"]]
+    tracker.flush()  # 批量模式下本会话还没写入索引的互动先落盘
+    engaged = ContentTracker.already_engaged(post_ids, op.get("kind"))
+    tracker._echo(f"🔎 {len(engaged)}/{len(post_ids)} 条帖子已在历史会话中互动过")
+    return {"engaged": engaged}
+
+
+def _op_distill(tracker: "ContentTracker", op: Dict) -> Dict:
+    tracker.record_distilled_content(op.get("trends", []), op.get("points", []),
+                                     op.get("quotes", []), op.get("summary") or "")
+    return {}
+
+
+def _op_generate(tracker: "ContentTracker", op: Dict) -> Dict:
+    platform = op["platform"]
+    if platform == "twitter":
+        similar = tracker.record_twitter_content(op.get("thread", []), resplit=bool(op.get("resplit")),
+                                                 check=op.get("check", True))
+    elif platform == "xiaohongshu":
+        similar = tracker.record_xiaohongshu_content(op.get("title") or "", op.get("content") or "",
+                                                     _as_list(op.get("hashtags")), check=op.get("check", True))
+    elif platform == "wechat":
+        similar = tracker.record_wechat_content(op.get("title") or "", op.get("content") or "",
+                                                op.get("summary") or "", check=op.get("check", True))
+    else:
+        raise ValueError(f"未知平台: {platform}")
+    return {"similar": similar}
+
+
+def _op_media(tracker: "ContentTracker", op: Dict) -> Dict:
+    if op.get("action") == "uploaded":
+        return {"media": [tracker.record_media_upload(op["platform"], op.get("hash") or "",
+                                                      op.get("upload_id") or "", op.get("url") or "")]}
+    return {"media": tracker.record_media(op["platform"], _as_list(op.get("paths")))}
+
+
+def _op_dedupe(tracker: "ContentTracker", op: Dict) -> Dict:
+    if op.get("text"):
+        from tracker_index import get_index, simhash
+        kind = op.get("kind") or "post"
+        h = simhash(op["text"])
+        found = get_index().find_similar(h, kind) if h is not None else []
+        return {"duplicates": [dict(match, source="text") for match in found]}
+    return {"duplicates": tracker.find_duplicates()}
+
+
+def _op_publish(tracker: "ContentTracker", op: Dict) -> Dict:
+    platform = op["platform"]
+    status = op.get("status", "published")
+    if platform == "twitter" and op.get("index") is not None:
+        # 逐条记录：published 确认发布，failed 记录失败，pending 记录一次发送尝试
+        index = int(op["index"])
+        if status == "published":
+            tracker.record_tweet_published(index, url=op.get("url") or "", tweet_id=op.get("tweet_id") or "",
+                                           parent_id=op.get("parent_id"))
+        elif status == "failed":
+            tracker.record_tweet_failed(index, op.get("error") or "")
+        elif status == "pending":
+            tracker.record_tweet_attempt(index)
+        else:
+            raise ValueError(f"逐条记录不支持状态: {status}")
+        tracker._echo(f"✅ 已记录推文 #{index}: {status}")
+        return {}
+    if platform == "twitter":
+        urls = _as_list(op.get("urls")) or ([op["url"]] if op.get("url") else [])
+        tracker.record_twitter_publish(
+            published_count=op.get("count") or 0,
+            urls=urls,
+            status=status,
+            error=op.get("error")
+        )
+    elif platform == "xiaohongshu":
+        tracker.record_xiaohongshu_publish(url=op.get("url") or "", status=status,
+                                           error=op.get("error"))
+    elif platform == "wechat":
+        tracker.record_wechat_publish(url=op.get("url") or "", status=status,
+                                      error=op.get("error"))
+    else:
+        raise ValueError(f"未知平台: {platform}")
+    tracker._echo(f"✅ 已记录 {platform} 发布状态: {status}")
+    return {}
+
+
+def _op_verify(tracker: "ContentTracker", op: Dict) -> Dict:
+    return {"verification": tracker.verify(),
+            "unpublished_twitter": tracker.get_unpublished_twitter_content(),
+            "report": tracker.get_report()}
+
+
+def _op_resume(tracker: "ContentTracker", op: Dict) -> Dict:
+    return {"remaining": tracker.get_resume_plan()}
+
+
+def _op_report(tracker: "ContentTracker", op: Dict) -> Dict:
+    return {"report": tracker.get_report()}
+
+
+def _op_compact(tracker: "ContentTracker", op: Dict) -> Dict:
+    tracker.compact()
+    return {}
+
+
+OPERATIONS = {
+    "search": _op_search,
+    "select": _op_select,
+    "rank": _op_rank,
+    "like": _op_like,
+    "reply": _op_reply,
+    "check": _op_check,
+    "distill": _op_distill,
+    "generate": _op_generate,
+    "media": _op_media,
+    "publish": _op_publish,
+    "verify": _op_verify,
+    "report": _op_report,
+    "resume": _op_resume,
+    "compact": _op_compact,
+    "dedupe": _op_dedupe,
+}
+
+
+def run_operation(tracker: "ContentTracker", op: Dict) -> Dict:
+    """执行单个操作，返回结果（不捕获异常）"""
+    name = op.get("op")
+    if name not in OPERATIONS:
+        raise ValueError(f"未知操作: {name}")
+    result = OPERATIONS[name](tracker, op)
+    result.update({"op": name, "ok": True, "session_id": tracker.session_id})
+    return result
+
+
+def run_batch(tracker: "ContentTracker", lines, flush_every: int = 0, out=None, client=None):
+    """逐行执行 JSONL 操作流，每个操作输出一行 JSON 结果，返回 (成功数, 失败数)
+
+    传入 client（常驻服务连接）时操作交给服务执行，由服务负责落盘。
+    """
+    import sys
+    out = out or sys.stdout
+    ok_count = failed = 0
+    if client is None:
+        tracker.begin_batch()
+        tracker.messages = []
+    try:
+        for index, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+            op = None
+            try:
+                op = json.loads(line)
+                if not isinstance(op, dict):
+                    raise ValueError("操作必须是 JSON 对象")
+                if client is not None:
+                    result = client.call(dict(op, session=tracker.session_id, store=tracker.store.name))
+                else:
+                    result = run_operation(tracker, op)
+                    result["messages"], tracker.messages = tracker.messages, []
+            except (json.JSONDecodeError, KeyError, ValueError, TypeError, AttributeError, OSError) as e:
+                # 单个操作失败（参数错误、文件不存在等）只输出这一行的错误，后续操作照常执行
+                result = {"op": op.get("op") if isinstance(op, dict) else None,
+                          "ok": False, "error": f"{type(e).__name__}: {e}", "messages": []}
+                if getattr(e, "issues", None):
+                    result["issues"] = e.issues
+                if client is None:
+                    tracker.messages = []
+            if result["ok"]:
+                ok_count += 1
+            else:
+                failed += 1
+            result["index"] = index
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if client is None and flush_every and (ok_count + failed) % flush_every == 0:
+                tracker.flush()
+    finally:
+        if client is None:
+            tracker.messages = None
+            tracker.end_batch()
+    return ok_count, failed
 
 
 # ========== CLI ==========
 
+def _op_from_args(args) -> Optional[Dict]:
+    """把记录类 CLI 参数转换为操作；其他命令返回 None"""
+    if args.command == "search":
+        op = {"op": "search", "query": args.query, "time_range": args.time_range,
+              "drop_duplicates": args.drop_duplicates}
+        if args.posts_file:
+            return dict(op, posts_file=str(Path(args.posts_file).resolve()))
+        if args.ndjson:
+            import sys
+            return dict(op, posts_stream=sys.stdin)
+
+        posts = []
+        if args.posts:
+            posts = json.loads(args.posts)
+        else:
+            # 从 stdin 读取
+            import sys
+            if not sys.stdin.isatty():
+                posts = json.load(sys.stdin)
+        return dict(op, posts=posts)
+    if args.command == "engage":
+        return {"op": args.action, "post_id": args.post_id, "post_ids": args.post_ids,
+                "reply_text": args.reply_text, "kind": args.kind}
+    if args.command == "distill":
+        return {
+            "op": "distill",
+            "trends": json.loads(args.trends) if args.trends else [],
+            "points": json.loads(args.points) if args.points else [],
+            "quotes": json.loads(args.quotes) if args.quotes else [],
+            "summary": args.summary or "",
+        }
+    if args.command == "generate":
+        return {
+            "op": "generate",
+            "platform": args.platform,
+            "thread": json.loads(args.thread) if args.thread else [],
+            "title": args.title,
+            "content": args.content,
+            "hashtags": args.hashtags,
+            "resplit": args.resplit,
+            "check": not args.no_check,
+        }
+    if args.command == "media" and args.action in ("add", "uploaded"):
+        # 路径按调用方的工作目录解析（常驻服务的工作目录可能不同）
+        return {"op": "media", "action": args.action, "platform": args.platform,
+                "paths": [os.path.abspath(path) for path in args.files],
+                "hash": args.hash, "upload_id": args.upload_id, "url": args.url}
+    if args.command == "publish":
+        return {"op": "publish", "platform": args.platform, "status": args.status,
+                "url": args.url, "count": args.count, "error": args.error,
+                "index": args.index, "tweet_id": args.tweet_id, "parent_id": args.parent_id}
+    if args.command == "rank":
+        return {"op": "rank", "k": args.k, "weights": args.weights}
+    if args.command == "dedupe":
+        return {"op": "dedupe", "text": args.text, "kind": args.kind}
+    if args.command == "verify" and args.all:
+        return None
+    if args.command in ("report", "verify", "compact", "resume"):
+        return {"op": args.command}
+    return None
+
+
+def _print_response(command: str, response: Dict):
+    """打印命令结果（本地执行和常驻服务返回的格式相同）"""
+    if command == "init":
+        print(f"✅ 新会话已创建: {response['session_id']}")
+        print(response["session_id"])  # 输出ID供脚本捕获
+    elif command == "session-id":
+        print(response["session_id"])
+    elif command == "report":
+        print(response["report"])
+    elif command == "engage" and "engaged" in response:
+        for post_id in response["engaged"]:
+            print(post_id)
+    elif command == "rank":
+        for i, item in enumerate(response["ranked"], 1):
+            print(f"   {i}. {item['post_id']} ({item['score']})")
+    elif command == "dedupe":
+        duplicates = response["duplicates"]
+        if not duplicates:
+            print("✅ 未发现与历史内容近似重复")
+        for match in duplicates:
+            ref = f" {match['ref']}" if match["ref"] else ""
+            print(f"   {match['source']} ≈ 会话 {match['session_id']} 的 {match['kind']}{ref}"
+                  f"（汉明距离 {match['distance']}）")
+    elif command == "media":
+        for ref in response["media"]:
+            size = f"{ref['width']}x{ref['height']}" if ref["width"] else ref["format"]
+            upload = f" 上传ID {ref['upload_id']}" if ref["upload_id"] else ""
+            print(f"   {ref['hash'][:12]} {ref['name']} → {ref['path']} ({size}){upload}")
+    elif command == "compact":
+        print(f"✅ 已合并会话日志: {response['session_id']}")
+    elif command == "resume":
+        _print_resume(response)
+    elif command == "verify":
+        print(response["report"])
+        issues = response["verification"]["issues"]
+        if issues:
+            print("\n💡 建议操作:")
+            for issue in issues:
+                if issue["type"] == "incomplete" and issue["platform"] == "twitter":
+                    unpublished = response["unpublished_twitter"]
+                    if unpublished:
+                        print(f"   需要补发 {len(unpublished)} 条推文:")
+                        for i, tweet in enumerate(unpublished, 1):
+                            print(f"   {i}. {tweet[:50]}...")
+
+
+def _print_resume(response: Dict):
+    remaining = response["remaining"]
+    if not remaining:
+        print("✅ 所有内容均已发布，无需续发")
+        return
+    twitter = remaining.get("twitter")
+    if twitter:
+        print(f"🐦 Twitter: 已确认 {twitter['confirmed']}/{twitter['total']} 条，待发 {len(twitter['remaining'])} 条")
+        for tweet in twitter["remaining"]:
+            reply_to = tweet["reply_to"]
+            if reply_to is None:
+                target = "作为 Thread 第一条"
+            elif reply_to["confirmed"]:
+                link = reply_to["url"] or reply_to["tweet_id"]
+                target = f"回复已发布的 #{reply_to['index']}" + (f" {link}" if link else "（未记录链接）")
+            else:
+                target = f"回复刚发出的 #{reply_to['index']}"
+            warning = "（⚠️ 曾发送未确认，先检查是否已发出）" if tweet["unconfirmed_attempt"] else ""
+            print(f"   #{tweet['index']} {target}{warning}: {tweet['text'][:50]}")
+    for platform, name in (("xiaohongshu", "小红书"), ("wechat", "微信公众号")):
+        if platform in remaining:
+            print(f"📕 {name}: {remaining[platform]['title']} ({remaining[platform]['status']})")
+
+
+def _print_stats(stats: Dict):
+    if not stats["sessions"]:
+        print("暂无统计数据（已有会话可运行 reindex 生成）")
+        return
+    print(f"📊 会话数: {stats['sessions']}")
+    print("\n📤 发布成功率:")
+    for platform, item in stats["publish"].items():
+        rate = f"{item['success_rate'] * 100:.1f}%" if item["success_rate"] is not None else "-"
+        statuses = ", ".join(f"{status} {n}" for status, n in sorted(item["statuses"].items()))
+        print(f"   {platform}: {rate} ({item['succeeded']}/{item['sessions']}){f' [{statuses}]' if statuses else ''}")
+    thread = stats["thread_completion"]
+    if thread["threads"]:
+        print(f"\n🧵 Thread 平均完成度: {thread['average'] * 100:.1f}%（完整 {thread['complete']}/{thread['threads']}）")
+    if stats["failure_reasons"]:
+        print("\n❌ 失败原因:")
+        for item in stats["failure_reasons"]:
+            print(f"   {item['count']:>4}  {item['platform']}: {item['reason']}")
+    print("\n📅 按天互动:")
+    for item in stats["engagement_by_day"]:
+        print(f"   {item['day']}  会话 {item['sessions']}, 选定 {item['selected']}, "
+              f"点赞 {item['likes']}, 回复 {item['replies']}")
+    print("\n🏷  按主题互动:")
+    for item in stats["engagement_by_topic"]:
+        print(f"   {item['topic']}  会话 {item['sessions']}, 点赞 {item['likes']}, 回复 {item['replies']}")
+
+
+def _int_at_least(minimum: int):
+    """argparse 类型：不小于 minimum 的整数"""
+    def parse(value: str) -> int:
+        import argparse
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"需要整数: {value}") from None
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"不能小于 {minimum}: {value}")
+        return number
+    return parse
+
+
 def main():
     import argparse
 
     parser = argparse.ArgumentParser(description="内容追踪和核查系统")
+    parser.add_argument("--store", choices=["json", "sqlite"], help="存储后端（默认 json，或环境变量 SOCIAL_PUBLISHER_STORE）")
+    parser.add_argument("--no-daemon", action="store_true", help="不使用常驻追踪服务，直接读写会话文件")
+    parser.add_argument("--profile", action="store_true", help="本地执行并在结束时打印分项耗时（stderr）")
+    parser.add_argument("--metrics-dir", help=f"把耗时/写入统计累加导出到该目录（JSON + Prometheus，"
+                                              f"或环境变量 {tracker_metrics.METRICS_DIR_ENV}）")
     subparsers = parser.add_subparsers(dest="command")
 
     # init 命令 - 初始化新会话
@@ -409,14 +1438,60 @@ def main():
     search_parser.add_argument("--query", "-q", required=True, help="搜索查询词")
     search_parser.add_argument("--time-range", "-r", default="24h", help="时间范围")
     search_parser.add_argument("--posts", "-p", help="帖子JSON数组（或从stdin读取）")
+    search_parser.add_argument("--ndjson", action="store_true", help="帖子为 NDJSON（每行一个），流式去重写入")
+    search_parser.add_argument("--posts-file", "-f", help="NDJSON 帖子文件（隐含 --ndjson）")
+    search_parser.add_argument("--drop-duplicates", action="store_true",
+                               help="丢弃与历史会话帖子近似重复的结果（默认只标记 duplicate_of）")
 
     # engage 命令 - 记录互动
     engage_parser = subparsers.add_parser("engage", help="记录互动")
     engage_parser.add_argument("--session", "-s", help="会话ID，默认最新")
-    engage_parser.add_argument("--action", "-a", choices=["select", "like", "reply"], required=True)
+    engage_parser.add_argument("--action", "-a", choices=["select", "like", "reply", "check"], required=True,
+                               help="check: 查询帖子是否已在任意会话中互动过")
     engage_parser.add_argument("--post-id", "-p", help="帖子ID")
     engage_parser.add_argument("--post-ids", help="多个帖子ID，逗号分隔")
     engage_parser.add_argument("--reply-text", help="回复内容")
+    engage_parser.add_argument("--kind", choices=["like", "reply"], help="check 时只查点赞或回复")
+
+    # rank 命令 - 给搜索结果打分并选出前 K 条
+    rank_parser = subparsers.add_parser("rank", help="给搜索结果打分，前 K 条记为选定互动的帖子")
+    rank_parser.add_argument("--session", "-s", help="会话ID，默认最新")
+    rank_parser.add_argument("--k", "-k", type=_int_at_least(1), default=20, help="选出的帖子数")
+    rank_parser.add_argument("--weights", "-w",
+                             help='权重JSON，如 {"likes": 1, "reposts": 2, "replies": 1.5, "recency": 3, "reach": 0.5}')
+
+    # find 命令 - 全文检索历史会话
+    find_parser = subparsers.add_parser("find", help="全文检索所有会话（主题、搜索词、帖子、提炼和生成内容）")
+    find_parser.add_argument("query", help="检索词，中英文均可")
+    find_parser.add_argument("--field", action="append", help="只检索指定字段，可重复（topic、query、post、trends、key_points、quotes、summary 及平台名）")
+    find_parser.add_argument("--limit", "-n", type=int, default=20, help="返回条数")
+    find_parser.add_argument("--json", action="store_true", help="输出 JSON")
+
+    # dedupe 命令 - 近似重复检查
+    dedupe_parser = subparsers.add_parser("dedupe", help="检查帖子和生成内容是否与历史会话近似重复")
+    dedupe_parser.add_argument("--session", "-s", help="会话ID，默认最新")
+    dedupe_parser.add_argument("--text", help="只检查这段文本，不读取会话")
+    dedupe_parser.add_argument("--kind", choices=["post", "twitter", "xiaohongshu", "wechat"],
+                               help="--text 对照的内容类型，默认 post")
+
+    # media 命令 - 媒体库
+    media_parser = subparsers.add_parser("media", help="记录各平台使用的图片（按内容哈希去重，缓存各平台处理后的版本和上传ID）")
+    media_parser.add_argument("--action", "-a", choices=["add", "uploaded", "stats", "evict"], default="add",
+                              help="add 加入并准备平台版本，uploaded 记录上传ID，stats 媒体库统计，evict 按预算淘汰平台版本")
+    media_parser.add_argument("--session", "-s", help="会话ID，默认最新")
+    media_parser.add_argument("--platform", "-p", choices=["twitter", "xiaohongshu", "wechat"], help="平台（add/uploaded）")
+    media_parser.add_argument("files", nargs="*", help="图片文件（add）")
+    media_parser.add_argument("--hash", help="媒体哈希或其前缀（uploaded）")
+    media_parser.add_argument("--upload-id", help="平台返回的上传ID（uploaded）")
+    media_parser.add_argument("--url", help="平台返回的媒体地址（uploaded）")
+    media_parser.add_argument("--budget", help="平台版本缓存的大小上限（evict），如 500M")
+    media_parser.add_argument("--json", action="store_true", help="输出 JSON（stats）")
+
+    # preflight 命令 - 批量发布前检查
+    preflight_parser = subparsers.add_parser("preflight", help="批量检查草稿是否超出平台限制（JSONL，不读写会话）")
+    preflight_parser.add_argument("--file", "-f", help="草稿文件（每行一个 {\"platform\": ..., 与 generate 相同的字段}），默认从 stdin 读取")
+    preflight_parser.add_argument("--resplit", action="store_true", help="先自动拆分超长推文，结果中附上拆分后的 thread")
+    preflight_parser.add_argument("--json", action="store_true", help="每个草稿输出一行 JSON 结果")
 
     # distill 命令 - 记录提炼内容
     distill_parser = subparsers.add_parser("distill", help="记录提炼内容")
@@ -434,6 +1509,8 @@ def main():
     generate_parser.add_argument("--content", "-c", help="内容")
     generate_parser.add_argument("--thread", help="Twitter Thread JSON数组")
     generate_parser.add_argument("--hashtags", help="话题标签，逗号分隔")
+    generate_parser.add_argument("--resplit", action="store_true", help="自动拆分超过 280 加权字数的推文")
+    generate_parser.add_argument("--no-check", action="store_true", help="跳过发布前检查（字数、话题数、重复推文）")
 
     # publish 命令 - 记录发布状态
     publish_parser = subparsers.add_parser("publish", help="记录发布状态")
@@ -443,6 +1520,43 @@ def main():
     publish_parser.add_argument("--url", "-u", help="发布URL")
     publish_parser.add_argument("--count", "-n", type=int, help="已发布数量（Twitter用）")
     publish_parser.add_argument("--error", "-e", help="错误信息")
+    publish_parser.add_argument("--index", "-i", type=int,
+                                help="逐条记录推文（序号从 0 开始）：published 确认、failed 失败、pending 发送前记录尝试")
+    publish_parser.add_argument("--tweet-id", help="推文ID（默认从 --url 中解析）")
+    publish_parser.add_argument("--parent-id", help="回复的上一条推文ID（默认为前面最近一条已确认推文）")
+
+    # resume 命令 - 输出剩余发布工作
+    resume_parser = subparsers.add_parser("resume", help="列出剩余的发布工作（Thread 只列未确认的推文及应回复的推文）")
+    resume_parser.add_argument("--session", "-s", help="会话ID，默认最新")
+    resume_parser.add_argument("--json", action="store_true", help="输出 JSON")
+
+    # schedule 命令 - 按平台限速自动发布
+    schedule_parser = subparsers.add_parser("schedule", help="按平台排队限速发布一个或多个会话的生成内容，逐条写回发布状态")
+    schedule_parser.add_argument("--session", "-s", action="append", help="会话ID，可重复，默认最新")
+    schedule_parser.add_argument("--platform", "-p", action="append", choices=["twitter", "xiaohongshu", "wechat"],
+                                 help="只发布指定平台，可重复")
+    schedule_parser.add_argument("--adapter", default="mock",
+                                 help="平台适配器（mock 为本地模拟）")
+    schedule_parser.add_argument("--rate", action="append",
+                                 help="平台限速，如 twitter=0.5 或 twitter=2:4（每秒条数:突发条数），可重复")
+    schedule_parser.add_argument("--concurrency", type=_int_at_least(1), help="每个平台同时发布的会话数")
+    schedule_parser.add_argument("--retries", type=_int_at_least(0), help="单条最大重试次数，默认 3")
+    schedule_parser.add_argument("--backoff", type=float, help="首次重试等待秒数，默认 1")
+    schedule_parser.add_argument("--mock-latency", type=float, default=0.05, help="mock 单条发布耗时（秒）")
+    schedule_parser.add_argument("--mock-failure-rate", type=float, default=0.0, help="mock 发布失败概率")
+    schedule_parser.add_argument("--json", action="store_true", help="输出 JSON")
+
+    # run-many 命令 - 多主题并行运行
+    run_many_parser = subparsers.add_parser("run-many", help="按主题清单在进程池中并行运行多个会话，输出合并报告")
+    run_many_parser.add_argument("manifest", help="主题清单（JSON 数组或 JSONL），格式见 pipeline_runner.py")
+    run_many_parser.add_argument("--workers", "-j", type=int, help="进程数，默认 CPU 核数")
+    run_many_parser.add_argument("--json", action="store_true", help="输出 JSON")
+
+    # stats 命令 - 跨会话统计
+    stats_parser = subparsers.add_parser("stats", help="跨会话统计：发布成功率、Thread 完成度、失败原因、按天/主题的互动数")
+    stats_parser.add_argument("--since", help="只统计此时间之后创建的会话（如 30d、2026-01-01）")
+    stats_parser.add_argument("--top", type=int, default=20, help="失败原因和主题的条数")
+    stats_parser.add_argument("--json", action="store_true", help="输出 JSON")
 
     # list 命令
     list_parser = subparsers.add_parser("list", help="列出所有会话")
@@ -454,159 +1568,412 @@ def main():
     # verify 命令
     verify_parser = subparsers.add_parser("verify", help="执行核查")
     verify_parser.add_argument("--session", "-s", help="指定会话ID，默认最新")
+    verify_parser.add_argument("--all", action="store_true",
+                               help="核查所有会话（跳过上次核查后没有变化的会话），输出按平台汇总的 JSON")
+    verify_parser.add_argument("--since", help="配合 --all，只核查此时间之后创建的会话（如 7d、24h、2026-01-19）")
+    verify_parser.add_argument("--workers", "-j", type=int, help="配合 --all，进程数，默认 CPU 核数")
+    verify_parser.add_argument("--force", action="store_true", help="配合 --all，不跳过未变化的会话")
 
     # session-id 命令 - 获取当前会话ID
     session_parser = subparsers.add_parser("session-id", help="获取最新会话ID")
 
-    args = parser.parse_args()
+    # batch 命令 - 在一个进程里执行 JSONL 操作流
+    batch_parser = subparsers.add_parser("batch", help="批量执行 JSONL 操作（每行一个 {\"op\": ...}）")
+    batch_parser.add_argument("--session", "-s", help="会话ID，默认最新")
+    batch_parser.add_argument("--file", "-f", help="操作文件，默认从 stdin 读取")
+    batch_parser.add_argument("--flush-every", "-n", type=int, default=0, help="每 N 个操作持久化一次，默认只在结束时持久化")
 
-    # ========== init ==========
-    if args.command == "init":
-        tracker = ContentTracker(args.topic)
-        print(f"✅ 新会话已创建: {tracker.session_id}")
-        print(tracker.session_id)  # 输出ID供脚本捕获
-
-    # ========== search ==========
-    elif args.command == "search":
-        tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
-        if not tracker:
-            print("❌ 未找到会话，请先运行 init")
-            return
+    # compact 命令 - 将增量日志合并回快照
+    compact_parser = subparsers.add_parser("compact", help="合并会话增量日志")
+    compact_parser.add_argument("--session", "-s", help="指定会话ID，默认最新")
 
-        posts = []
-        if args.posts:
-            posts = json.loads(args.posts)
-        else:
-            # 从 stdin 读取
-            import sys
-            if not sys.stdin.isatty():
-                posts = json.load(sys.stdin)
+    # migrate 命令 - JSON 会话迁移到 SQLite
+    migrate_parser = subparsers.add_parser("migrate", help="将 JSON 会话迁移到 SQLite 后端")
+    migrate_parser.add_argument("--force", action="store_true", help="覆盖 SQLite 中已存在的会话")
 
-        tracker.record_search(args.query, args.time_range, posts)
+    # archive 命令 - 较早的会话打包进压缩段文件
+    archive_parser = subparsers.add_parser("archive", help="把较早的会话打包进压缩的归档段文件（JSON 后端），仍可按会话ID加载")
+    archive_parser.add_argument("--older-than", default="30d", help="归档此时间之前创建且之后未修改的会话（如 30d、2026-01-01），默认 30d")
+    archive_parser.add_argument("--budget", help="归档占用的磁盘上限（如 500M、2G），超出时从最早的段开始淘汰")
+    archive_parser.add_argument("--json", action="store_true", help="输出 JSON")
 
-    # ========== engage ==========
-    elif args.command == "engage":
-        tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
-        if not tracker:
-            print("❌ 未找到会话")
-            return
-
-        if args.action == "select":
-            post_ids = args.post_ids.split(",") if args.post_ids else [args.post_id]
-            tracker.record_selected_for_engagement(post_ids)
-        elif args.action == "like":
-            tracker.record_like(args.post_id)
-            print(f"✅ 已记录点赞: {args.post_id}")
-        elif args.action == "reply":
-            tracker.record_reply(args.post_id, args.reply_text or "")
-            print(f"✅ 已记录回复: {args.post_id}")
-
-    # ========== distill ==========
-    elif args.command == "distill":
-        tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
-        if not tracker:
-            print("❌ 未找到会话")
-            return
+    # reindex 命令 - 从会话记录重建跨会话索引
+    reindex_parser = subparsers.add_parser("reindex", help="重建跨会话索引")
 
-        trends = json.loads(args.trends) if args.trends else []
-        points = json.loads(args.points) if args.points else []
-        quotes = json.loads(args.quotes) if args.quotes else []
-        summary = args.summary or ""
-
-        tracker.record_distilled_content(trends, points, quotes, summary)
-
-    # ========== generate ==========
-    elif args.command == "generate":
-        tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
-        if not tracker:
-            print("❌ 未找到会话")
-            return
+    # serve 命令 - 启动常驻追踪服务
+    serve_parser = subparsers.add_parser("serve", help="启动常驻追踪服务（Unix socket）")
+    serve_parser.add_argument("--cache-size", type=int, help="缓存的会话数，默认 32")
+    serve_parser.add_argument("--flush-interval", type=float, help="延迟落盘间隔（秒），默认 0.5")
 
-        if args.platform == "twitter":
-            thread = json.loads(args.thread) if args.thread else []
-            tracker.record_twitter_content(thread)
-        elif args.platform == "xiaohongshu":
-            hashtags = args.hashtags.split(",") if args.hashtags else []
-            tracker.record_xiaohongshu_content(args.title or "", args.content or "", hashtags)
-        elif args.platform == "wechat":
-            tracker.record_wechat_content(args.title or "", args.content or "", "")
-
-    # ========== publish ==========
-    elif args.command == "publish":
-        tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
-        if not tracker:
-            print("❌ 未找到会话")
-            return
+    args = parser.parse_args()
 
-        if args.platform == "twitter":
-            tracker.record_twitter_publish(
-                published_count=args.count or 0,
-                urls=[args.url] if args.url else [],
-                status=args.status,
-                error=args.error
-            )
-        elif args.platform == "xiaohongshu":
-            tracker.record_xiaohongshu_publish(
-                url=args.url or "",
-                status=args.status,
-                error=args.error
-            )
-        elif args.platform == "wechat":
-            tracker.record_wechat_publish(
-                url=args.url or "",
-                status=args.status,
-                error=args.error
-            )
-        print(f"✅ 已记录 {args.platform} 发布状态: {args.status}")
+    if args.store:
+        set_default_store(args.store)
+    if args.command == "media" and args.action == "add" and not (args.platform and args.files):
+        parser.error("media --action add 需要 --platform 和图片文件")
+    if args.command == "media" and args.action == "uploaded" and not (args.platform and args.hash and args.upload_id):
+        parser.error("media --action uploaded 需要 --platform、--hash 和 --upload-id")
+    metrics_dir = args.metrics_dir or tracker_metrics.metrics_dir()
+    if args.profile or metrics_dir:
+        tracker_metrics.enable()
+    if args.profile:
+        # 耗时在本进程内统计，经常驻服务执行的部分测不到
+        args.no_daemon = True
+    try:
+        _run(args, parser)
+    finally:
+        if args.profile:
+            import sys
+            print(tracker_metrics.format_profile(), file=sys.stderr)
+        if metrics_dir:
+            tracker_metrics.export(metrics_dir)
+
+
+def _run(args, parser):
+    # 记录类命令：常驻服务在运行时通过 socket 执行，否则本地加载会话执行
+    op = _op_from_args(args)
+    if op is not None or args.command in ("init", "session-id"):
+        import tracker_daemon
+        response = None
+        if op and op.get("posts_stream") is not None:
+            # stdin 流无法经 socket 转发：先让常驻服务落盘并释放该会话，再在本地流式写入
+            if not args.no_daemon:
+                tracker_daemon.request({"op": "release", "session": args.session,
+                                        "store": get_store().name})
+        elif not args.no_daemon:
+            payload = dict(op or {"op": args.command, "topic": getattr(args, "topic", None)},
+                           session=getattr(args, "session", None), store=get_store().name)
+            response = tracker_daemon.request(payload)
+            if response is not None and response.get("unavailable"):
+                response = None
+        if response is not None:
+            for message in response.get("messages", []):
+                print(message)
+        elif args.command == "init":
+            response = {"ok": True, "session_id": ContentTracker(args.topic).session_id}
+        elif args.command == "session-id":
+            response = {"ok": True, "session_id": get_store().latest_id() or ""}
+        else:
+            try:
+                # 指定的会话可能不存在（或已随归档段淘汰）
+                tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
+            except FileNotFoundError:
+                tracker = None
+            try:
+                if tracker is None:
+                    response = {"ok": False, "error": "未找到会话"}
+                else:
+                    # 一个命令内的改动在结束时一次落盘、一次同步索引
+                    tracker.begin_batch()
+                    try:
+                        response = run_operation(tracker, op)
+                    finally:
+                        tracker.end_batch()
+            except (ValueError, OSError) as e:
+                # 参数错误，或 -f 指定的文件无法读取
+                response = {"ok": False, "error": str(e)}
+                if getattr(e, "issues", None):
+                    response["issues"] = e.issues
+
+        if not response["ok"]:
+            if args.command in ("report", "verify", "compact", "resume"):
+                print("未找到会话记录" if response["error"] == "未找到会话" else f"❌ {response['error']}")
+            elif args.command == "session-id":
+                print("")
+            else:
+                hint = "，请先运行 init" if args.command == "search" and response["error"] == "未找到会话" else ""
+                print(f"❌ {response['error']}{hint}")
+            if response.get("issues"):
+                # 内容被发布前检查拒绝，未记录
+                import sys
+                sys.exit(1)
+        elif args.command == "resume" and args.json:
+            print(json.dumps(response["remaining"], ensure_ascii=False, indent=2))
+        else:
+            _print_response(args.command, response)
 
     # ========== list ==========
     elif args.command == "list":
-        ensure_dirs()
-        sessions = list(SESSIONS_DIR.glob("session_*.json"))
+        import tracker_daemon
+        response = None if args.no_daemon else tracker_daemon.request(
+            {"op": "list", "store": get_store().name})
+        if response is not None and response.get("ok"):
+            sessions = response["sessions"]
+        else:
+            sessions = get_store().list_sessions(10)
         if not sessions:
             print("暂无会话记录")
             return
 
         print("📁 会话列表:")
-        for session_file in sorted(sessions, reverse=True)[:10]:
-            with open(session_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+        for data in sessions:
             print(f"   {data['session_id']} - {data['topic']} ({data['status']})")
 
-    # ========== report ==========
-    elif args.command == "report":
-        tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
-        if tracker:
-            print(tracker.get_report())
+    # ========== serve ==========
+    elif args.command == "serve":
+        import tracker_daemon
+        daemon = tracker_daemon.TrackerDaemon(
+            ContentTracker, run_operation, get_store(),
+            capacity=args.cache_size if args.cache_size is not None else tracker_daemon.CACHE_SIZE,
+            flush_interval=args.flush_interval if args.flush_interval is not None else tracker_daemon.FLUSH_INTERVAL)
+        daemon.serve()
+
+    # ========== batch ==========
+    elif args.command == "batch":
+        import sys
+        import tracker_daemon
+        client = None if args.no_daemon else tracker_daemon.connect(get_store().name)
+        if client is not None:
+            # 服务在运行时由服务执行，避免与其缓存的会话互相覆盖
+            response = client.call({"op": "session-id", "session": args.session,
+                                    "store": get_store().name})
+            tracker = ContentTracker.__new__(ContentTracker)
+            tracker.session_id, tracker.store = response.get("session_id"), get_store()
+        else:
+            tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
+        if not tracker or not tracker.session_id:
+            print(json.dumps({"ok": False, "error": "未找到会话"}, ensure_ascii=False))
+            sys.exit(1)
+
+        try:
+            if args.file:
+                with open(args.file, "r", encoding="utf-8") as f:
+                    _, failed = run_batch(tracker, f, args.flush_every, client=client)
+            else:
+                _, failed = run_batch(tracker, sys.stdin, args.flush_every, client=client)
+        except OSError as e:
+            print(json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False))
+            sys.exit(1)
+        finally:
+            if client is not None:
+                client.close()
+        if failed:
+            sys.exit(1)
+
+    # ========== media（stats / evict；add / uploaded 在上面按会话操作执行） ==========
+    elif args.command == "media":
+        import sys
+        from media_store import DERIVED_BUDGET, get_media_store
+        store = get_media_store()
+        if args.action == "evict":
+            from session_archive import parse_size
+            try:
+                budget = parse_size(args.budget) if args.budget else DERIVED_BUDGET
+            except ValueError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            evicted = store.evict(budget)
+            print(f"✅ 已淘汰 {evicted['files']} 个平台版本，释放 {evicted['bytes'] / 1024 / 1024:.1f} MB")
+        else:
+            stats = store.stats()
+            if args.json:
+                print(json.dumps(stats, ensure_ascii=False, indent=2))
+            else:
+                print(f"🖼️ 原图 {stats['objects']} 个, {stats['original_bytes'] / 1024 / 1024:.1f} MB; "
+                      f"平台版本 {stats['derived_bytes'] / 1024 / 1024:.1f} MB; 上传记录 {stats['uploads']} 条")
+                for platform, item in sorted(stats["platforms"].items()):
+                    print(f"   {platform}: {item['versions']} 个版本, 使用 {item['uses']} 次")
+
+    # ========== preflight ==========
+    elif args.command == "preflight":
+        import sys
+        import content_rules
+        total = failed = 0
+        try:
+            source = open(args.file, "r", encoding="utf-8") if args.file else sys.stdin
+        except OSError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        with source as lines:
+            for result in content_rules.check_drafts(content_rules.parse_drafts(lines), args.resplit):
+                total += 1
+                failed += not result["ok"]
+                if args.json:
+                    print(json.dumps(result, ensure_ascii=False))
+                elif result["issues"]:
+                    print(f"{'⚠️' if result['ok'] else '❌'} {result['id']} ({result['platform']})")
+                    for issue in result["issues"]:
+                        print(f"   {issue['message']}")
+        if not args.json:
+            print(f"{'✅' if not failed else '⚠️'} 共 {total} 个草稿，{failed} 个未通过")
+        if failed:
+            sys.exit(1)
+
+    # ========== find ==========
+    elif args.command == "find":
+        from tracker_index import TEXT_FIELDS, get_index
+        unknown = sorted(set(args.field or ()) - set(TEXT_FIELDS))
+        if unknown:
+            parser.error(f"--field 可选值: {', '.join(TEXT_FIELDS)}（未知: {', '.join(unknown)}）")
+        hits = get_index().find(args.query, args.limit, args.field)
+        if args.json:
+            print(json.dumps(hits, ensure_ascii=False, indent=2))
+        elif not hits:
+            print("未找到匹配内容")
         else:
-            print("未找到会话记录")
+            for hit in hits:
+                ref = f"#{hit['ref']}" if hit["ref"] else ""
+                print(f"   {hit['session_id']} [{hit['field']}{ref}] {hit['snippet']} ({hit['score']})")
+
+    # ========== reindex ==========
+    elif args.command == "reindex":
+        from tracker_index import get_index
+        store = get_store()
+        # 已归档的会话也计入索引（JSON 后端从归档读取）
+        session_ids = sorted(store.session_ids(archived=True))
+        sessions = (store.load(session_id) for session_id in session_ids)
+        count = get_index().rebuild_engaged(sessions)
+        print(f"✅ 已重建互动索引: {count} 个会话")
+        trackers = (ContentTracker.load(session_id, store) for session_id in session_ids)
+        count = get_index().rebuild_fingerprints((t.data, t.iter_posts()) for t in trackers)
+        print(f"✅ 已重建相似内容索引: {count} 个会话")
+        get_index().clear_text()
+        count = 0
+        for session_id in session_ids:
+            ContentTracker.load(session_id, store).reindex_text()
+            count += 1
+        print(f"✅ 已重建全文索引: {count} 个会话")
+        get_index().clear_stats()
+        for session_id in session_ids:
+            get_index().update_session_stats(store.load(session_id))
+        print(f"✅ 已重建统计汇总: {count} 个会话")
+
+    # ========== schedule ==========
+    elif args.command == "schedule":
+        import publish_scheduler
+        import tracker_daemon
+        if args.adapter not in publish_scheduler.ADAPTERS:
+            parser.error(f"--adapter 可选值: {', '.join(publish_scheduler.ADAPTERS)}")
+        session_ids = args.session or [get_store().latest_id()]
+        if not session_ids[0]:
+            print("❌ 未找到会话")
+            return
+        if not args.no_daemon:
+            # 发布过程中直接写会话文件，先让常驻服务落盘并释放这些会话
+            for session_id in session_ids:
+                tracker_daemon.request({"op": "release", "session": session_id, "store": get_store().name})
+        try:
+            limits = publish_scheduler.parse_limits(args.rate)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        if args.concurrency:
+            for platform in publish_scheduler.PLATFORMS:
+                limits.setdefault(platform, {})["concurrency"] = args.concurrency
+        if args.adapter == "mock":
+            adapter = publish_scheduler.MockAdapter(args.mock_latency, args.mock_failure_rate)
+        else:
+            adapter = publish_scheduler.ADAPTERS[args.adapter]()
+        trackers = [ContentTracker.load(session_id) for session_id in session_ids]
+        scheduler = publish_scheduler.PublishScheduler(
+            adapter, limits, args.platform or publish_scheduler.PLATFORMS,
+            args.retries if args.retries is not None else publish_scheduler.MAX_RETRIES,
+            args.backoff if args.backoff is not None else publish_scheduler.BACKOFF_BASE)
+        result = scheduler.run_sync(trackers)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            for session_id, platforms in result["sessions"].items():
+                print(f"📤 {session_id}")
+                for platform, outcome in platforms.items():
+                    error = f" - {outcome['error']}" if outcome.get("error") else ""
+                    print(f"   {platform}: {outcome['status']} (+{outcome['published']}){error}")
+            print(f"⏱  {result['elapsed_s']}s, 重试 {sum(s['retries'] for s in result['stats'].values())} 次")
+
+    # ========== stats ==========
+    elif args.command == "stats":
+        import sys
+        import tracker_daemon
+        from tracker_index import get_index
+        if not args.no_daemon:
+            tracker_daemon.request({"op": "flush", "store": get_store().name})
+        try:
+            since = parse_since(args.since) if args.since else None
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        stats = get_index().stats(since, args.top)
+        if args.json:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+        else:
+            _print_stats(stats)
 
-    # ========== verify ==========
+    # ========== verify --all ==========
     elif args.command == "verify":
-        tracker = ContentTracker.load(args.session) if args.session else ContentTracker.get_latest_session()
-        if tracker:
-            result = tracker.verify()
-            print(tracker.get_report())
-
-            if result["issues"]:
-                print("\n💡 建议操作:")
-                for issue in result["issues"]:
-                    if issue["type"] == "incomplete" and issue["platform"] == "twitter":
-                        unpublished = tracker.get_unpublished_twitter_content()
-                        if unpublished:
-                            print(f"   需要补发 {len(unpublished)} 条推文:")
-                            for i, tweet in enumerate(unpublished, 1):
-                                print(f"   {i}. {tweet[:50]}...")
+        import sys
+        import pipeline_runner
+        import tracker_daemon
+        if not args.no_daemon:
+            # 先让常驻服务把缓存的改动落盘
+            tracker_daemon.request({"op": "flush", "store": get_store().name})
+        session_ids = sorted(get_store().session_ids())
+        if args.since:
+            try:
+                since = parse_since(args.since)
+            except ValueError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            session_ids = [session_id for session_id in session_ids if session_id >= since]
+        summary = pipeline_runner.verify_sessions(session_ids, get_store().name, args.workers, args.force)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        if summary["sessions_with_issues"] or summary["errors"]:
+            sys.exit(1)
+
+    # ========== run-many ==========
+    elif args.command == "run-many":
+        import sys
+        import pipeline_runner
+        try:
+            entries = pipeline_runner.load_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法读取清单: {e}")
+            sys.exit(1)
+
+        def progress(result):
+            if not args.json:
+                print(f"   {'✅' if result['ok'] else '❌'} {result['topic']} → {result['session_id']}", flush=True)
+
+        report = pipeline_runner.run_many(entries, get_store().name, args.workers, progress)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
         else:
-            print("未找到会话记录")
-
-    # ========== session-id ==========
-    elif args.command == "session-id":
-        tracker = ContentTracker.get_latest_session()
-        if tracker:
-            print(tracker.session_id)
+            print(pipeline_runner.format_report(report))
+        if report["summary"]["failed"]:
+            sys.exit(1)
+
+    # ========== archive ==========
+    elif args.command == "archive":
+        import sys
+        import session_archive
+        import tracker_daemon
+        store = get_store()
+        if store.name != "json":
+            print("❌ 归档只用于 JSON 后端（SQLite 后端的会话已有索引）")
+            sys.exit(1)
+        try:
+            before = parse_since(args.older_than)
+            budget = session_archive.parse_size(args.budget) if args.budget else None
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        if not args.no_daemon:
+            # 先让常驻服务落盘并释放缓存的会话
+            tracker_daemon.request({"op": "flush", "store": store.name})
+        result = session_archive.archive_sessions(store, before, budget)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
         else:
-            print("")
+            ratio = f", 压缩比 {result['raw_bytes'] / result['packed_bytes']:.1f}x" if result["packed_bytes"] else ""
+            print(f"✅ 已归档 {result['archived']} 个会话{ratio}, 跳过最近修改过的 {result['skipped']} 个")
+            evicted = result.get("evicted")
+            if evicted and evicted["segments"]:
+                print(f"🗑  超出预算，淘汰 {evicted['segments']} 个段 ({evicted['sessions']} 个会话)")
+            print(f"📦 归档: {result['archive_sessions']} 个会话, {result['archive_bytes'] / 1024 / 1024:.1f} MB")
+
+    # ========== migrate ==========
+    elif args.command == "migrate":
+        stats = migrate_json_to_sqlite(force=args.force)
+        print(f"✅ 迁移完成: {stats['migrated']} 个会话, 跳过 {stats['skipped']} 个, 失败 {stats['failed']} 个")
 
     else:
         parser.print_help()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+媒体库
+图片按内容哈希（SHA-256）存放在 .social_publisher/media/objects/ 下，同一文件不论来自哪个会话只存一份。
+各平台需要的版本（尺寸、格式、压缩目标见 PLATFORM_SPECS）处理一次后缓存在 derived/ 下，
+总大小超过预算时按最近使用时间淘汰；原图已满足平台要求时直接使用原图，不另存。
+平台返回的上传 ID 也按 (哈希, 平台, 版本) 记录，重复发布时直接复用（Twitter 的 media_id 24 小时后失效）。
+
+转换尺寸和格式需要 Pillow（可选依赖）；未安装时只能使用已满足平台要求的原图。
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from session_store import CONFIG_DIR
+
+MEDIA_DIR = CONFIG_DIR / "media"
+MB = 1024 * 1024
+DERIVED_BUDGET = 512 * MB  # 平台版本缓存的总大小上限
+
+# 长边上限、单文件大小上限、平台接受的格式；需要转换时输出 output 格式，从 quality 开始逐步压缩到 max_bytes 以内
+PLATFORM_SPECS = {
+    "twitter": {"max_side": 4096, "max_bytes": 5 * MB, "formats": ["jpeg", "png", "webp", "gif"],
+                "output": "jpeg", "quality": 85},
+    "xiaohongshu": {"max_side": 2160, "max_bytes": 20 * MB, "formats": ["jpeg", "png", "webp"],
+                    "output": "jpeg", "quality": 90},
+    # 公众号正文图片接口限 1MB、仅 jpg/png
+    "wechat": {"max_side": 1920, "max_bytes": 1 * MB, "formats": ["jpeg", "png"],
+               "output": "jpeg", "quality": 85},
+}
+# 上传 ID 的有效期（秒），None 为不过期
+UPLOAD_TTL = {"twitter": 24 * 3600, "xiaohongshu": None, "wechat": None}
+EXTENSIONS = {"jpeg": "jpg", "png": "png", "gif": "gif", "webp": "webp"}
+MIN_QUALITY = 40
+SHRINK_STEP = 0.85  # 最低质量仍超限时每次把长边缩小到 85%
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    hash TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    path TEXT NOT NULL,
+    added_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS derivatives (
+    hash TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    path TEXT NOT NULL,
+    format TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    passthrough INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (hash, platform, spec)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_derivatives_lru ON derivatives(passthrough, last_used);
+CREATE TABLE IF NOT EXISTS uploads (
+    hash TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    upload_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (hash, platform, spec)
+) WITHOUT ROWID;
+"""
+
+
+class MediaError(ValueError):
+    """文件无法加入媒体库或无法处理成平台可用的版本"""
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MB), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        if length < 2:
+            return None
+        # SOF0-SOF15（不含 DHT/JPG/DAC）记录图片尺寸
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def image_info(path: Path) -> Tuple[str, Optional[int], Optional[int]]:
+    """只读文件头识别格式和尺寸（不依赖 Pillow），返回 (格式, 宽, 高)，无法识别时格式为 "unknown" """
+    with open(path, "rb") as f:
+        head = f.read(32)
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return ("png",) + struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return ("gif",) + struct.unpack("<HH", head[6:10])
+            if head.startswith(b"\xff\xd8"):
+                return ("jpeg",) + (_jpeg_size(f) or (None, None))
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                chunk = head[12:16]
+                if chunk == b"VP8 ":
+                    width, height = struct.unpack("<HH", head[26:30])
+                    return "webp", width & 0x3FFF, height & 0x3FFF
+                if chunk == b"VP8L":
+                    bits = int.from_bytes(head[21:25], "little")
+                    return "webp", (bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1
+                if chunk == b"VP8X":
+                    return "webp", int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+                return "webp", None, None
+        except struct.error:
+            pass
+    return "unknown", None, None
+
+
+def spec_key(spec: Dict) -> str:
+    """版本规格的短哈希；规格变化后旧版本不再命中"""
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+
+
+def _fits(info: Dict, spec: Dict) -> bool:
+    """原图是否已满足平台要求（尺寸未知时按满足处理）"""
+    longest = max(info["width"] or 0, info["height"] or 0)
+    return info["format"] in spec["formats"] and info["bytes"] <= spec["max_bytes"] and longest <= spec["max_side"]
+
+
+def _pillow():
+    """Pillow 是可选依赖，需要转换时才导入（避免拖慢每次 CLI 启动）；未安装时返回 None"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def check_image(path: Path) -> Tuple[str, Optional[int], Optional[int]]:
+    """确认文件是支持的图片，返回 (格式, 宽, 高)；文件头不是 jpeg/png/gif/webp，
+    或装了 Pillow 时校验出文件损坏、像素数超出 Pillow 的安全上限，抛出 MediaError"""
+    fmt, width, height = image_info(path)
+    if fmt == "unknown":
+        raise MediaError(f"{path.name}: 不是支持的图片格式（{'/'.join(EXTENSIONS)}）")
+    pillow = _pillow()
+    if pillow is not None:
+        Image = pillow[0]
+        try:
+            with Image.open(path) as img:
+                img.verify()
+        except Image.DecompressionBombError as e:
+            raise MediaError(f"{path.name}: 像素数过大: {e}")
+        except (OSError, SyntaxError) as e:
+            raise MediaError(f"{path.name}: 图片已损坏或无法识别: {e}")
+    return fmt, width, height
+
+
+def _convert(source: Path, spec: Dict, dest: Path) -> Dict:
+    """用 Pillow 缩放并压缩到 spec 以内，写到 dest（先写临时文件再替换），返回尺寸和格式"""
+    Image, ImageOps = _pillow()
+    output = spec["output"]
+    with Image.open(source) as img:
+        if getattr(img, "is_animated", False):
+            raise MediaError("动图超出平台限制，无法自动处理")
+        img = ImageOps.exif_transpose(img)
+        if output == "jpeg" and img.mode != "RGB":
+            # 透明背景铺白
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        img.thumbnail((spec["max_side"], spec["max_side"]), Image.LANCZOS)
+        tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+        quality = spec["quality"]
+        while True:
+            options = {"quality": quality, "optimize": True}
+            if output == "jpeg":
+                options["progressive"] = True
+            img.save(tmp, format=output.upper(), **options)
+            if tmp.stat().st_size <= spec["max_bytes"]:
+                break
+            if quality > MIN_QUALITY:
+                quality = max(MIN_QUALITY, quality - 10)
+            elif min(img.size) > 64:
+                img = img.resize((int(img.width * SHRINK_STEP), int(img.height * SHRINK_STEP)), Image.LANCZOS)
+            else:
+                tmp.unlink()
+                raise MediaError(f"无法压缩到 {spec['max_bytes'] // 1024} KB 以内")
+        width, height = img.size
+    os.replace(tmp, dest)
+    return {"format": output, "width": width, "height": height}
+
+
+class MediaStore:
+    """内容寻址的原图 + 各平台版本缓存（SQLite 索引）"""
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root or MEDIA_DIR)
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        (self.root / "derived").mkdir(exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.root / "media.db"), timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def writing(self):
+        """写入文件/淘汰时持有的进程间排他锁"""
+        fd = os.open(str(self.root / "media.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _row(self, sql: str, params: tuple) -> Optional[Dict]:
+        """查询一行；path 列存的是相对 root 的路径，返回时换成绝对路径"""
+        with self._lock:
+            row = self.conn.execute(sql, params).fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        if "path" in row:
+            row["path"] = str(self.root / row["path"])
+        return row
+
+    def _relative(self, path) -> str:
+        return str(Path(path).relative_to(self.root))
+
+    # ========== 原图 ==========
+
+    def get(self, media_hash: str) -> Optional[Dict]:
+        return self._row("SELECT * FROM objects WHERE hash = ?", (media_hash,))
+
+    def add(self, path) -> Dict:
+        """把图片加入媒体库（内容相同的文件只存一份），返回原图信息，其中 "new" 表示是否首次加入
+
+        不是支持的图片时抛出 MediaError（见 check_image），不写入媒体库。
+        """
+        path = Path(path)
+        if not path.is_file():
+            raise MediaError(f"文件不存在: {path}")
+        media_hash = file_hash(path)
+        existing = self.get(media_hash)
+        if existing and Path(existing["path"]).exists():
+            return dict(existing, new=False)
+        fmt, width, height = check_image(path)
+        dest = self.root / "objects" / media_hash[:2] / f"{media_hash}.{EXTENSIONS[fmt]}"
+        with self.writing():
+            if not dest.exists():
+                dest.parent.mkdir(exist_ok=True)
+                tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, dest)
+            info = {"hash": media_hash, "format": fmt, "bytes": dest.stat().st_size, "width": width,
+                    "height": height, "path": str(dest), "added_at": time.time()}
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO objects (hash, format, bytes, width, height, path, added_at) "
+                    "VALUES (:hash, :format, :bytes, :width, :height, :path, :added_at)",
+                    dict(info, path=self._relative(dest)))
+        return dict(info, new=True)
+
+    # ========== 平台版本 ==========
+
+    def prepare(self, media_hash: str, platform: str, spec: Dict = None) -> Dict:
+        """取 platform 可用的版本：缓存命中时直接返回（"reused" 为 True），否则处理一次并缓存"""
+        spec = spec or PLATFORM_SPECS[platform]
+        key = spec_key(spec)
+        now = time.time()
+        cached = self._row("SELECT * FROM derivatives WHERE hash = ? AND platform = ? AND spec = ?",
+                           (media_hash, platform, key))
+        if cached and Path(cached["path"]).exists():
+            with self._lock, self.conn:
+                self.conn.execute("UPDATE derivatives SET last_used = ?, uses = uses + 1 "
+                                  "WHERE hash = ? AND platform = ? AND spec = ?", (now, media_hash, platform, key))
+            return dict(cached, reused=True)
+
+        original = self.get(media_hash)
+        if original is None or not Path(original["path"]).exists():
+            raise MediaError(f"媒体库中没有 {media_hash[:12]}")
+        if _fits(original, spec):
+            derived = {"path": original["path"], "format": original["format"], "bytes": 0,
+                       "width": original["width"], "height": original["height"], "passthrough": 1}
+        elif _pillow() is None:
+            raise MediaError(f"不满足 {platform} 的要求"
+                             f"（格式 {'/'.join(spec['formats'])}、长边 ≤ {spec['max_side']}、"
+                             f"≤ {spec['max_bytes'] // 1024} KB），转换需要安装 Pillow")
+        else:
+            dest = self.root / "derived" / media_hash[:2] / f"{media_hash}_{platform}_{key}.{EXTENSIONS[spec['output']]}"
+            dest.parent.mkdir(exist_ok=True)
+            Image = _pillow()[0]
+            with self.writing():
+                try:
+                    derived = _convert(Path(original["path"]), spec, dest)
+                except (OSError, Image.DecompressionBombError) as e:  # 不是 Pillow 能识别的图片，或像素数超出安全上限
+                    raise MediaError(f"无法处理: {e}")
+            derived.update(path=str(dest), bytes=dest.stat().st_size, passthrough=0)
+        row = dict(derived, hash=media_hash, platform=platform, spec=key, created_at=now, last_used=now, uses=1)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO derivatives (hash, platform, spec, path, format, bytes, width, height, "
+                "passthrough, created_at, last_used, uses) VALUES (:hash, :platform, :spec, :path, :format, "
+                ":bytes, :width, :height, :passthrough, :created_at, :last_used, :uses)",
+                dict(row, path=self._relative(row["path"])))
+        if not row["passthrough"]:
+            self.evict(DERIVED_BUDGET)
+        return dict(row, reused=False)
+
+    def derived_size(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM derivatives WHERE passthrough = 0").fetchone()[0]
+
+    def evict(self, budget: int) -> Dict:
+        """平台版本总大小超过 budget 字节时，从最久未使用的开始删除（原图不删）"""
+        evicted = {"files": 0, "bytes": 0}
+        with self.writing():
+            total = self.derived_size()
+            if total <= budget:
+                return evicted
+            with self._lock:
+                rows = self.conn.execute("SELECT hash, platform, spec, path, bytes FROM derivatives "
+                                         "WHERE passthrough = 0 ORDER BY last_used").fetchall()
+            for row in rows:
+                if total <= budget:
+                    break
+                # 先删索引再删文件：读者要么命中完整文件，要么重新生成
+                with self._lock, self.conn:
+                    self.conn.execute("DELETE FROM derivatives WHERE hash = ? AND platform = ? AND spec = ?",
+                                      (row["hash"], row["platform"], row["spec"]))
+                try:
+                    os.unlink(self.root / row["path"])
+                except FileNotFoundError:
+                    pass
+                total -= row["bytes"]
+                evicted["files"] += 1
+                evicted["bytes"] += row["bytes"]
+        return evicted
+
+    # ========== 上传记录 ==========
+
+    def record_upload(self, media_hash: str, platform: str, upload_id: str, url: str = "",
+                      spec: Dict = None, ttl: Optional[float] = -1) -> Dict:
+        """记录平台返回的上传 ID；ttl 默认按 UPLOAD_TTL，None 为不过期"""
+        now = time.time()
+        ttl = UPLOAD_TTL.get(platform) if ttl == -1 else ttl
+        row = {"hash": media_hash, "platform": platform, "spec": spec_key(spec or PLATFORM_SPECS[platform]),
+               "upload_id": upload_id, "url": url or "", "uploaded_at": now,
+               "expires_at": now + ttl if ttl else None}
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO uploads (hash, platform, spec, upload_id, url, uploaded_at, expires_at) "
+                "VALUES (:hash, :platform, :spec, :upload_id, :url, :uploaded_at, :expires_at)", row)
+        return row
+
+    def upload_for(self, media_hash: str, platform: str, spec: Dict = None) -> Optional[Dict]:
+        """仍有效的上传记录，没有或已过期时返回 None"""
+        row = self._row("SELECT * FROM uploads WHERE hash = ? AND platform = ? AND spec = ?",
+                        (media_hash, platform, spec_key(spec or PLATFORM_SPECS[platform])))
+        if row and row["expires_at"] is not None and row["expires_at"] <= time.time():
+            return None
+        return row
+
+    def stats(self) -> Dict:
+        with self._lock:
+            objects, original_bytes = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM objects").fetchone()
+            per_platform = {row["platform"]: {"versions": row["versions"], "bytes": row["bytes"], "uses": row["uses"]}
+                            for row in self.conn.execute(
+                                "SELECT platform, COUNT(*) AS versions, SUM(bytes) AS bytes, SUM(uses) AS uses "
+                                "FROM derivatives GROUP BY platform")}
+            uploads = self.conn.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+        return {"objects": objects, "original_bytes": original_bytes, "derived_bytes": self.derived_size(),
+                "platforms": per_platform, "uploads": uploads}
+
+
+_instance: Optional[MediaStore] = None
+
+
+def get_media_store() -> MediaStore:
+    """获取媒体库实例（同一进程内复用）"""
+    global _instance
+    if _instance is None:
+        _instance = MediaStore()
+    return _instance
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+多主题并行运行
+读取主题清单，每个主题在进程池的一个工作进程里独立走完 init → 记录操作 → 发布调度 → verify，
+最后汇总成一份报告。每个会话只由一个进程读写，不同会话之间互不影响。
+verify_sessions 用同样的进程池批量核查已有会话（verify --all）。
+
+清单为 JSON 数组或 JSONL（每行一个主题）:
+    {
+      "topic": "Claude Skill",
+      "query": "Claude Skill",                 # 可选，默认同 topic
+      "time_range": "24h",                     # 可选
+      "posts_file": "posts/claude.ndjson",     # 可选，NDJSON 帖子文件（相对清单所在目录）
+      "ops": [{"op": "rank", "k": 20}, {"op": "generate", "platform": "twitter", "thread": [...]}],
+      "schedule": {"adapter": "mock", "rate": ["twitter=2"], "platforms": ["twitter"]},  # 可选
+      "verify": true                           # 可选，默认 true
+    }
+ops 与 batch 命令的操作格式相同。
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from session_store import set_default_store
+
+
+def load_manifest(path: str) -> List[Dict]:
+    """读取主题清单，posts_file 转为绝对路径"""
+    manifest = Path(path).resolve()
+    text = manifest.read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        entries = json.loads(text)
+    else:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for i, entry in enumerate(entries):
+        if not entry.get("topic"):
+            raise ValueError(f"清单第 {i + 1} 项缺少 topic")
+        if entry.get("posts_file"):
+            entry["posts_file"] = str((manifest.parent / entry["posts_file"]).resolve())
+    return entries
+
+
+def _topic_ops(entry: Dict) -> List[Dict]:
+    ops = []
+    if entry.get("posts_file"):
+        ops.append({"op": "search", "query": entry.get("query") or entry["topic"],
+                    "time_range": entry.get("time_range", "24h"), "posts_file": entry["posts_file"]})
+    return ops + list(entry.get("ops") or [])
+
+
+def _schedule(tracker, options: Dict) -> Dict:
+    import publish_scheduler
+    if options.get("adapter", "mock") == "mock":
+        adapter = publish_scheduler.MockAdapter(options.get("mock_latency", 0.05),
+                                                options.get("mock_failure_rate", 0.0))
+    else:
+        adapter = publish_scheduler.ADAPTERS[options["adapter"]]()
+    limits = publish_scheduler.parse_limits(options.get("rate"))
+    scheduler = publish_scheduler.PublishScheduler(
+        adapter, limits, options.get("platforms") or publish_scheduler.PLATFORMS,
+        options.get("retries", publish_scheduler.MAX_RETRIES),
+        options.get("backoff", publish_scheduler.BACKOFF_BASE))
+    return scheduler.run_sync([tracker])["sessions"][tracker.session_id]
+
+
+def run_topic(args) -> Dict:
+    """在工作进程中运行一个主题的完整流程，返回该主题的结果（异常不会抛出）"""
+    index, entry, store_name = args
+    from content_tracker import ContentTracker, run_operation
+    set_default_store(store_name)
+
+    start = time.perf_counter()
+    result = {"index": index, "topic": entry["topic"], "session_id": None, "ok": False,
+              "ops": 0, "failed_ops": [], "error": None}
+    try:
+        tracker = ContentTracker(entry["topic"])
+        result["session_id"] = tracker.session_id
+        tracker.messages = []
+        # 记录类操作攒在内存里，结束时一次落盘
+        tracker.begin_batch()
+        try:
+            for i, op in enumerate(_topic_ops(entry)):
+                try:
+                    run_operation(tracker, op)
+                    result["ops"] += 1
+                except (KeyError, ValueError, TypeError, OSError) as e:
+                    result["failed_ops"].append({"index": i, "op": op.get("op"),
+                                                 "error": f"{type(e).__name__}: {e}"})
+        finally:
+            tracker.end_batch()
+
+        # 发布调度逐条写回，需在批量模式之外执行
+        if entry.get("schedule"):
+            result["schedule"] = _schedule(tracker, entry["schedule"])
+        if entry.get("verify", True):
+            verification = tracker.verify()
+            result["issues"] = verification["issues"]
+        result["publish_status"] = {
+            platform: {"status": status["status"],
+                       **({"published": status["published_count"], "expected": status["expected_count"]}
+                          if platform == "twitter" else {})}
+            for platform, status in tracker.data["publish_status"].items()
+        }
+        result["ok"] = not result["failed_ops"]
+    except Exception as e:  # 单个主题失败不影响其他主题
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_many(entries: List[Dict], store_name: str, workers: Optional[int] = None,
+             on_result=None) -> Dict:
+    """用进程池并行运行所有主题，返回 {"topics": [...], "summary": {...}}（topics 按清单顺序）"""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(entries) or 1))
+    start = time.perf_counter()
+    results = []
+    tasks = [(i, entry, store_name) for i, entry in enumerate(entries)]
+    if workers == 1:
+        outcomes: Iterable[Dict] = map(run_topic, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.get_context("spawn").Pool(workers)
+        outcomes = pool.imap_unordered(run_topic, tasks)
+    try:
+        for result in outcomes:
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    results.sort(key=lambda r: r["index"])
+    return {"topics": results, "summary": summarize(results, workers, time.perf_counter() - start)}
+
+
+def summarize(results: List[Dict], workers: int, elapsed: float) -> Dict:
+    """汇总：成功/失败主题数、各平台未解决的问题数"""
+    issues: Dict[str, int] = {}
+    for result in results:
+        for issue in result.get("issues") or []:
+            issues[issue["platform"]] = issues.get(issue["platform"], 0) + 1
+    return {
+        "topics": len(results),
+        "ok": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "issues_by_platform": issues,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "topics_per_s": round(len(results) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def format_report(report: Dict) -> str:
+    """合并报告（文本）"""
+    summary = report["summary"]
+    lines = ["=" * 60,
+             f"📦 批量运行报告: {summary['topics']} 个主题, 成功 {summary['ok']}, 失败 {summary['failed']}",
+             f"   进程数: {summary['workers']}, 耗时: {summary['elapsed_s']}s ({summary['topics_per_s']} 主题/s)",
+             "=" * 60]
+    for result in report["topics"]:
+        emoji = "✅" if result["ok"] and not result.get("issues") else "⚠️" if result["ok"] else "❌"
+        lines.append(f"\n{emoji} {result['topic']} ({result['session_id'] or '未创建'}, {result['elapsed_s']}s)")
+        if result["error"]:
+            lines.append(f"   ❌ {result['error']}")
+        for failed in result["failed_ops"]:
+            lines.append(f"   ❌ 操作 #{failed['index']} {failed['op']}: {failed['error']}")
+        status = result.get("publish_status")
+        if status:
+            tw = status["twitter"]
+            lines.append(f"   Twitter: {tw['status']} ({tw['published']}/{tw['expected']} 条), "
+                         f"小红书: {status['xiaohongshu']['status']}, 微信公众号: {status['wechat']['status']}")
+        for issue in result.get("issues") or []:
+            lines.append(f"   ⚠️ {issue['message']}")
+    if summary["issues_by_platform"]:
+        lines.append("\n🔎 未解决问题: " + ", ".join(f"{platform} {count} 个"
+                                                 for platform, count in summary["issues_by_platform"].items()))
+    lines.append("\n" + "=" * 60)
+    return "\n".join(lines)
+
+
+# ========== 批量核查 ==========
+
+PLATFORMS = ("twitter", "xiaohongshu", "wechat")
+
+
+def _verify_chunk(args) -> List[Dict]:
+    """工作进程：逐个加载会话，只有发布状态或生成内容有变化时才重新核查"""
+    session_ids, store_name, force = args
+    from content_tracker import ContentTracker
+    set_default_store(store_name)
+    results = []
+    for session_id in session_ids:
+        result = {"session_id": session_id, "topic": None, "skipped": False, "error": None, "issues": []}
+        try:
+            tracker = ContentTracker.load(session_id)
+            result["topic"] = tracker.topic
+            if force or tracker.needs_verify():
+                tracker.messages = []
+                result["issues"] = tracker.verify()["issues"]
+            else:
+                result["skipped"] = True
+                result["issues"] = tracker.data["verification"]["issues"]
+        except Exception as e:  # 单个会话损坏不影响其他会话
+            result["error"] = f"{type(e).__name__}: {e}"
+        results.append(result)
+    return results
+
+
+def verify_sessions(session_ids: List[str], store_name: str, workers: Optional[int] = None,
+                    force: bool = False) -> Dict:
+    """并行核查多个会话，返回按平台汇总的未解决问题（可直接输出为 JSON）"""
+    start = time.perf_counter()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(session_ids) or 1))
+    # 每个进程分到若干小块，避免个别大会话拖住整批
+    size = max(1, len(session_ids) // (workers * 4))
+    chunks = [(session_ids[i:i + size], store_name, force) for i in range(0, len(session_ids), size)]
+    if workers == 1:
+        parts = map(_verify_chunk, chunks)
+        pool = None
+    else:
+        pool = multiprocessing.get_context("spawn").Pool(workers)
+        parts = pool.imap(_verify_chunk, chunks)
+    try:
+        results = [result for part in parts for result in part]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    platforms = {platform: {"sessions": 0, "issues": []} for platform in PLATFORMS}
+    for result in results:
+        seen = set()
+        for issue in result["issues"]:
+            platform = platforms.setdefault(issue["platform"], {"sessions": 0, "issues": []})
+            platform["issues"].append(dict(issue, session_id=result["session_id"], topic=result["topic"]))
+            seen.add(issue["platform"])
+        for name in seen:
+            platforms[name]["sessions"] += 1
+    return {
+        "checked": len(results),
+        "verified": sum(1 for r in results if not r["skipped"] and not r["error"]),
+        "skipped": sum(1 for r in results if r["skipped"]),
+        "errors": [{"session_id": r["session_id"], "error": r["error"]} for r in results if r["error"]],
+        "sessions_with_issues": sum(1 for r in results if r["issues"]),
+        "platforms": platforms,
+        "workers": workers,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
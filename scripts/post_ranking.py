@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+帖子排序
+按点赞、转发、回复、发布时间和作者影响力给搜索结果打分，选出最值得互动的前 K 条。
+先把帖子拆成按列存放的数组，打分时对整列做 map 运算（循环在 C 层执行），
+最后用堆取前 K 条，时间和内存都与帖子数成线性关系。
+"""
+
+import heapq
+import math
+import operator
+import re
+import time
+from array import array
+from datetime import datetime
+from functools import reduce
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from session_store import post_key
+
+# 默认权重；计数类指标取 log1p，避免头部大号把分数拉开几个数量级
+DEFAULT_WEIGHTS = {
+    "likes": 1.0,
+    "reposts": 2.0,
+    "replies": 1.5,
+    "recency": 3.0,
+    "reach": 0.5,
+}
+RECENCY_HALF_LIFE_HOURS = 24.0  # 发布时间每过一个半衰期，时效分减半
+
+# 各指标在帖子里可能使用的字段名（依次尝试）
+FIELD_ALIASES = {
+    "likes": ("likes", "like_count", "favorite_count", "favorites"),
+    "reposts": ("reposts", "retweets", "retweet_count", "repost_count"),
+    "replies": ("replies", "reply_count", "comments"),
+    "reach": ("followers", "author_followers", "followers_count"),
+    "time": ("created_at", "timestamp", "time", "date"),
+}
+
+_SUFFIXES = {"k": 1e3, "m": 1e6, "b": 1e9, "千": 1e3, "万": 1e4, "亿": 1e8}
+_COUNT_RE = re.compile(r"^([\d.]+)\s*([kmb千万亿]?)$")
+
+
+def parse_count(value) -> float:
+    """解析计数：数字、"1,234"、"1.2K"、"3万" 等，无法解析时为 0"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return 0.0
+    match = _COUNT_RE.match(str(value).strip().lower().replace(",", ""))
+    if not match:
+        return 0.0
+    try:
+        return float(match.group(1)) * _SUFFIXES.get(match.group(2), 1.0)
+    except ValueError:
+        return 0.0
+
+
+def parse_timestamp(value) -> float:
+    """解析发布时间（Unix 秒 / 毫秒、ISO 8601、Twitter API 格式）
+
+    无法解析时返回 -inf，时效分自然为 0。
+    """
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e12 else float(value)
+    if not value:
+        return -math.inf
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, "%a %b %d %H:%M:%S %z %Y").timestamp()
+    except ValueError:
+        return -math.inf
+
+
+def _field(post: Dict, aliases: Tuple[str, ...]):
+    for name in aliases:
+        if name in post:
+            return post[name]
+    return None
+
+
+def _reach(post: Dict):
+    reach = _field(post, FIELD_ALIASES["reach"])
+    if reach is None and isinstance(post.get("author"), dict):
+        reach = _field(post["author"], FIELD_ALIASES["reach"])
+    return reach
+
+
+class PostColumns:
+    """按列存放的帖子指标（每列一个 array('d')），没有 ID 的帖子会被跳过"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.likes = array("d")
+        self.reposts = array("d")
+        self.replies = array("d")
+        self.reach = array("d")
+        self.times = array("d")
+        self._time_cache: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, post: Dict):
+        post_id = post_key(post)
+        if post_id is None:
+            return
+        self.ids.append(post_id)
+        self.likes.append(parse_count(_field(post, FIELD_ALIASES["likes"])))
+        self.reposts.append(parse_count(_field(post, FIELD_ALIASES["reposts"])))
+        self.replies.append(parse_count(_field(post, FIELD_ALIASES["replies"])))
+        self.reach.append(parse_count(_reach(post)))
+        raw_time = _field(post, FIELD_ALIASES["time"])
+        if isinstance(raw_time, str):
+            # 抓取结果里的时间串重复很多，缓存解析结果
+            timestamp = self._time_cache.get(raw_time)
+            if timestamp is None:
+                timestamp = self._time_cache[raw_time] = parse_timestamp(raw_time)
+        else:
+            timestamp = parse_timestamp(raw_time)
+        self.times.append(timestamp)
+
+    @classmethod
+    def from_posts(cls, posts: Iterable[Dict]) -> "PostColumns":
+        """逐条读入帖子（可以是流），只保留打分需要的列"""
+        columns = cls()
+        add = columns.add
+        for post in posts:
+            add(post)
+        return columns
+
+
+def _scaled_log(column, weight: float):
+    return map(operator.mul, repeat(weight), map(math.log1p, column))
+
+
+def _recency(times, now: float, weight: float, half_life_hours: float):
+    # weight * 0.5 ** (age / half_life)，未来时间按 0 小时计
+    decay = -math.log(2) / (half_life_hours * 3600.0)
+    ages = map(max, repeat(0.0), map(operator.sub, repeat(now), times))
+    return map(operator.mul, repeat(weight), map(math.exp, map(operator.mul, repeat(decay), ages)))
+
+
+def score_columns(columns: PostColumns, weights: Optional[Dict[str, float]] = None,
+                  now: Optional[float] = None,
+                  half_life_hours: float = RECENCY_HALF_LIFE_HOURS) -> array:
+    """对整列计算互动分数，返回与 columns.ids 对齐的 array('d')"""
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    unknown = set(weights) - set(DEFAULT_WEIGHTS)
+    if unknown:
+        raise ValueError(f"未知的权重: {', '.join(sorted(unknown))}")
+    now = time.time() if now is None else now
+
+    parts = [_scaled_log(getattr(columns, name), weights[name])
+             for name in ("likes", "reposts", "replies", "reach") if weights[name]]
+    if weights["recency"]:
+        parts.append(_recency(columns.times, now, weights["recency"], half_life_hours))
+    if not parts:
+        return array("d", bytes(8 * len(columns)))
+    return array("d", reduce(lambda acc, part: map(operator.add, acc, part), parts))
+
+
+def top_k(columns: PostColumns, scores: array, k: int) -> List[Tuple[str, float]]:
+    """用堆选出分数最高的 K 条，返回 [(post_id, score)]，按分数降序"""
+    best = heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+    return [(columns.ids[i], scores[i]) for i in best]
+
+
+def rank_posts(posts: Iterable[Dict], k: int, weights: Optional[Dict[str, float]] = None,
+               now: Optional[float] = None, exclude: Optional[set] = None) -> List[Tuple[str, float]]:
+    """帖子流 -> 前 K 条 [(post_id, score)]；exclude 中的帖子不参与排序"""
+    columns = PostColumns.from_posts(posts)
+    scores = score_columns(columns, weights, now)
+    if exclude:
+        for i in (i for i, post_id in enumerate(columns.ids) if post_id in exclude):
+            scores[i] = -math.inf
+        return [item for item in top_k(columns, scores, k) if item[1] != -math.inf]
+    return top_k(columns, scores, k)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+发布调度器
+读取一个或多个会话的 generated_content，按平台排队发布：
+每个平台一个队列，令牌桶限速、限制并发会话数、失败按指数退避重试；
+每条内容确认发布后立即写回该会话的 publish_status（推文逐条记录），中断后重新运行只会发布剩余部分。
+
+平台适配器需实现 PlatformAdapter.publish；本模块自带 MockAdapter，用于离线测试吞吐和续传。
+"""
+
+import asyncio
+import math
+import random
+import time
+from typing import Dict, List, Optional
+
+PLATFORMS = ("twitter", "xiaohongshu", "wechat")
+
+# 各平台默认限速：rate 为每秒发布条数，burst 为令牌桶容量，concurrency 为同时发布的会话数
+DEFAULT_LIMITS = {
+    "twitter": {"rate": 1.0, "burst": 1, "concurrency": 2},
+    "xiaohongshu": {"rate": 0.2, "burst": 1, "concurrency": 1},
+    "wechat": {"rate": 0.2, "burst": 1, "concurrency": 1},
+}
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0   # 第 n 次重试前等待 BACKOFF_BASE * 2**(n-1) 秒（带随机抖动）
+
+
+class PublishError(Exception):
+    """发布失败；retryable=False 时不再重试（如内容被拒）"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class PublishItem:
+    """一条待发布的内容（一条推文、一篇小红书笔记或一篇公众号文章）"""
+
+    def __init__(self, session_id: str, platform: str, index: int, payload,
+                 parent: Optional[str] = None, uncertain: bool = False):
+        self.session_id = session_id
+        self.platform = platform
+        self.index = index
+        self.payload = payload
+        self.parent = parent  # Thread 中上一条推文的 URL，回复到它下面
+        self.uncertain = uncertain  # 之前发送过但没有确认，可能已经发出
+        self.attempts = 0
+
+    def __repr__(self):
+        return f"PublishItem({self.session_id}, {self.platform}#{self.index})"
+
+
+class PlatformAdapter:
+    """平台适配器接口：发布一条内容，成功返回 {"id", "url"}（可带 "status"），失败抛出 PublishError
+
+    find_published 用于重发前确认内容是否其实已经发出（如请求超时但平台已收到），
+    找到时返回与 publish 相同格式的结果；不支持查询的平台返回 None。
+    """
+
+    name = "base"
+
+    async def publish(self, item: PublishItem) -> Dict:
+        raise NotImplementedError
+
+    async def find_published(self, item: PublishItem) -> Optional[Dict]:
+        return None
+
+
+class MockAdapter(PlatformAdapter):
+    """本地模拟平台：固定延迟 + 按概率失败，记录所有发布结果，可用于检查重复发布和回复链"""
+
+    name = "mock"
+
+    def __init__(self, latency: float = 0.01, failure_rate: float = 0.0, seed: int = 0,
+                 lost_response_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.lost_response_rate = lost_response_rate  # 已发出但返回失败的概率
+        self.rng = random.Random(seed)
+        self.published: List[Dict] = []
+        self.calls = 0
+
+    async def publish(self, item: PublishItem) -> Dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.failure_rate:
+            raise PublishError(f"mock: {item.platform} 发布失败（模拟）")
+        post_id = f"{item.platform}-{item.session_id}-{item.index}-{len(self.published)}"
+        result = {"id": post_id, "url": f"https://mock.local/{item.platform}/{post_id}"}
+        self.published.append({"session_id": item.session_id, "platform": item.platform,
+                               "index": item.index, "url": result["url"], "parent": item.parent})
+        if item.platform == "wechat":
+            result["status"] = "draft"
+        if self.rng.random() < self.lost_response_rate:
+            raise PublishError(f"mock: {item.platform} 响应丢失（模拟，内容已发出）")
+        return result
+
+    async def find_published(self, item: PublishItem) -> Optional[Dict]:
+        for entry in reversed(self.published):
+            if (entry["session_id"], entry["platform"], entry["index"]) == \
+                    (item.session_id, item.platform, item.index):
+                result = {"id": entry["url"].rsplit("/", 1)[-1], "url": entry["url"]}
+                if item.platform == "wechat":
+                    result["status"] = "draft"
+                return result
+        return None
+
+
+ADAPTERS = {"mock": MockAdapter}
+
+
+def _error_text(error: Exception) -> str:
+    """PublishError 只取消息，其他异常带上类型名（多为适配器或写回会话的程序错误）"""
+    return str(error) if isinstance(error, PublishError) else f"{type(error).__name__}: {error}"
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个令牌，最多累积 capacity 个"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PlatformQueue:
+    """单个平台的发布队列：令牌桶限速 + 并发会话数上限 + 重试"""
+
+    def __init__(self, platform: str, adapter: PlatformAdapter, rate: float, burst: float = 1,
+                 concurrency: int = 1, retries: int = MAX_RETRIES, backoff: float = BACKOFF_BASE):
+        if concurrency < 1:
+            raise ValueError(f"{platform} 的并发会话数必须大于 0")
+        if retries < 0:
+            raise ValueError("重试次数不能为负数")
+        self.platform = platform
+        self.adapter = adapter
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self._slots = None
+        self.stats = {"published": 0, "retries": 0, "failed": 0, "recovered": 0}
+
+    def slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    async def publish(self, item: PublishItem, on_attempt=None) -> Dict:
+        """限速发布一条内容，可重试的错误按指数退避重试，最终失败时抛出 PublishError
+
+        on_attempt 在每次调用适配器之前执行（用于记录发送尝试）。
+        """
+        while True:
+            await self.bucket.acquire()
+            if item.uncertain or item.attempts:
+                # 之前的发送可能已经成功，先查询，避免重复发布
+                found = await self.adapter.find_published(item)
+                if found is not None:
+                    self.stats["recovered"] += 1
+                    return found
+            item.attempts += 1
+            if on_attempt is not None:
+                on_attempt()
+            try:
+                result = await self.adapter.publish(item)
+            except PublishError as e:
+                if not e.retryable or item.attempts > self.retries:
+                    self.stats["failed"] += 1
+                    raise
+                self.stats["retries"] += 1
+                delay = self.backoff * 2 ** (item.attempts - 1)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+            except Exception:
+                # 适配器自身的错误（非 PublishError）不重试，由调用方记录为这一条失败
+                self.stats["failed"] += 1
+                raise
+            self.stats["published"] += 1
+            return result
+
+
+class PublishScheduler:
+    """多会话、多平台发布调度
+
+    trackers 为 ContentTracker 实例；每条内容确认后立即调用 record_*_publish 写回会话。
+    同一会话的 Thread 按顺序逐条发布，不同会话、不同平台之间并行。
+    """
+
+    def __init__(self, adapter: PlatformAdapter, limits: Optional[Dict[str, Dict]] = None,
+                 platforms=PLATFORMS, retries: int = MAX_RETRIES, backoff: float = BACKOFF_BASE):
+        limits = limits or {}
+        self.platforms = list(platforms)
+        self.queues = {}
+        for platform in self.platforms:
+            limit = dict(DEFAULT_LIMITS[platform], **limits.get(platform, {}))
+            self.queues[platform] = PlatformQueue(platform, adapter, limit["rate"], limit["burst"],
+                                                  limit["concurrency"], retries, backoff)
+
+    # ========== 各平台任务 ==========
+
+    async def _publish_twitter(self, tracker, queue: PlatformQueue) -> Dict:
+        plan = tracker.twitter_resume()
+        if not plan["remaining"]:
+            return {"status": "skipped", "published": 0}
+
+        # 只发未确认的推文，第一条回复到最近一条已确认推文，之后依次回复刚发出的推文
+        parent = None
+        done = 0
+        for tweet in plan["remaining"]:
+            reply_to = tweet["reply_to"]
+            if reply_to is None:
+                parent = None
+            elif reply_to["confirmed"]:
+                parent = reply_to["url"] or reply_to["tweet_id"]
+            index = tweet["index"]
+            item = PublishItem(tracker.session_id, "twitter", index, tweet["text"], parent,
+                               tweet["unconfirmed_attempt"])
+            try:
+                result = await queue.publish(item, lambda: tracker.record_tweet_attempt(index))
+            except Exception as e:
+                # 后面的推文依赖这一条，停止本 Thread，保留已发布部分供续传
+                error = _error_text(e)
+                tracker.record_tweet_failed(index, error)
+                return {"status": tracker.data["publish_status"]["twitter"]["status"],
+                        "published": done, "error": error}
+            tracker.record_tweet_published(index, url=result.get("url", ""), tweet_id=result.get("id", ""))
+            parent = result.get("url") or result["id"]
+            done += 1
+        return {"status": tracker.data["publish_status"]["twitter"]["status"], "published": done}
+
+    async def _publish_single(self, tracker, queue: PlatformQueue, platform: str) -> Dict:
+        content = tracker.data["generated_content"][platform]
+        status = tracker.data["publish_status"][platform]["status"]
+        if not content.get("title") or status in ("published", "draft"):
+            return {"status": "skipped", "published": 0}
+        record = getattr(tracker, f"record_{platform}_publish")
+        # 逐键读取，公众号正文等懒加载字段在这里才加载
+        item = PublishItem(tracker.session_id, platform, 0, {key: content[key] for key in content},
+                           uncertain=status == "failed")
+        try:
+            result = await queue.publish(item)
+        except Exception as e:
+            error = _error_text(e)
+            record(status="failed", error=error)
+            return {"status": "failed", "published": 0, "error": error}
+        status = result.get("status", "published")
+        record(url=result.get("url", ""), status=status)
+        return {"status": status, "published": 1}
+
+    async def _run_job(self, tracker, platform: str) -> Dict:
+        """一个会话在一个平台上的发布任务；任何异常只让这个任务失败，不会取消其他会话和平台的任务"""
+        queue = self.queues[platform]
+        async with queue.slots():
+            try:
+                if platform == "twitter":
+                    return await self._publish_twitter(tracker, queue)
+                return await self._publish_single(tracker, queue, platform)
+            except Exception as e:
+                # 写回会话等出错：发布结果可能已记录一部分，续传时按会话里的状态继续
+                return {"status": "failed", "published": 0, "error": _error_text(e)}
+
+    # ========== 入口 ==========
+
+    async def run(self, trackers: List) -> Dict:
+        """发布所有会话的待发内容，返回 {"sessions": {session_id: {platform: 结果}}, "stats": ...}"""
+        start = time.perf_counter()
+        jobs = [(tracker, platform) for tracker in trackers for platform in self.platforms]
+        results = await asyncio.gather(*(self._run_job(tracker, platform) for tracker, platform in jobs))
+        sessions: Dict[str, Dict] = {}
+        for (tracker, platform), result in zip(jobs, results):
+            sessions.setdefault(tracker.session_id, {})[platform] = result
+        return {
+            "sessions": sessions,
+            "stats": {platform: dict(queue.stats) for platform, queue in self.queues.items()},
+            "elapsed_s": round(time.perf_counter() - start, 3),
+        }
+
+    def run_sync(self, trackers: List) -> Dict:
+        return asyncio.run(self.run(trackers))
+
+
+def parse_limits(specs: List[str]) -> Dict[str, Dict]:
+    """解析 CLI 限速参数，如 twitter=0.5、twitter=2:4（每秒 2 条，突发 4 条）"""
+    limits: Dict[str, Dict] = {}
+    for spec in specs or []:
+        platform, _, value = spec.partition("=")
+        if platform not in PLATFORMS or not value:
+            raise ValueError(f"无效的限速参数: {spec}")
+        rate, _, burst = value.partition(":")
+        try:
+            limits[platform] = {"rate": float(rate)}
+            if burst:
+                limits[platform]["burst"] = float(burst)
+        except ValueError:
+            raise ValueError(f"无效的限速参数: {spec}") from None
+        # 速率为 0 或负数时令牌桶永远等不到令牌（或算出负的等待时间），突发小于 1 条则一条也发不出
+        if not 0 < limits[platform]["rate"] < math.inf:
+            raise ValueError(f"无效的限速参数: {spec}（每秒条数必须大于 0）")
+        if not 1 <= limits[platform].get("burst", 1) < math.inf:
+            raise ValueError(f"无效的限速参数: {spec}（突发条数不能小于 1）")
+    return limits
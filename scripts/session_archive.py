@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+会话归档
+把较早的 JSON 会话打包进 .social_publisher/archive/ 下只追加的段文件（每个会话一条 zlib 压缩记录），
+index.db 记录每个会话所在的段、偏移和长度，读取归档会话只需一次 seek + 解压。
+归档后热目录（sessions/）中的文件被删除，热目录大小只取决于最近的会话数量。
+
+归档总大小超过预算时，按段从最早的开始整段淘汰。
+归档会话被加载后再次写入时会写回热目录（归档中的旧记录保留到所在段被淘汰）。
+"""
+
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import session_store
+from session_store import CONFIG_DIR, durable
+
+ARCHIVE_DIR = CONFIG_DIR / "archive"
+SEGMENT_MAX_BYTES = 32 * 1024 * 1024  # 段文件写满后换新段
+COMPRESS_LEVEL = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived (
+    session_id TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    archived_at TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_archived_segment ON archived(segment);
+"""
+
+
+class SessionArchive:
+    """段文件 + 偏移索引（SQLite）"""
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root or ARCHIVE_DIR)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.root / "index.db"), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def segment_file(self, segment: int) -> Path:
+        return self.root / f"segment_{segment:06d}.pack"
+
+    def segments(self) -> List[int]:
+        return sorted(int(p.stem.split("_")[1]) for p in self.root.glob("segment_*.pack"))
+
+    @contextmanager
+    def writing(self):
+        """写入/淘汰时持有的进程间排他锁（读取不需要锁：段文件只追加）"""
+        fd = os.open(str(self.root / "archive.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    # ========== 读取 ==========
+
+    def has(self, session_id: str) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM archived WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        """读取归档会话（完整数据，无懒加载字段），不存在时返回 None"""
+        with self._lock:
+            row = self.conn.execute("SELECT segment, offset, length FROM archived WHERE session_id = ?",
+                                    (session_id,)).fetchone()
+        if row is None:
+            return None
+        segment, offset, length = row
+        try:
+            with open(self.segment_file(segment), "rb") as f:
+                f.seek(offset)
+                blob = f.read(length)
+        except FileNotFoundError:
+            return None  # 所在段刚被淘汰
+        return json.loads(zlib.decompress(blob))
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT session_id FROM archived")]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM archived").fetchone()[0]
+
+    def size(self) -> int:
+        """段文件总字节数"""
+        return sum(self.segment_file(segment).stat().st_size for segment in self.segments())
+
+    # ========== 写入 ==========
+
+    def add(self, session_id: str, data: Dict) -> tuple:
+        """（持有 writing 锁时调用）把会话追加到当前段，刷盘后再写索引，返回 (原始字节数, 压缩后字节数)"""
+        raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        blob = zlib.compress(raw, COMPRESS_LEVEL)
+        segments = self.segments()
+        segment = segments[-1] if segments else 1
+        path = self.segment_file(segment)
+        if path.exists() and path.stat().st_size + len(blob) > SEGMENT_MAX_BYTES:
+            segment += 1
+            path = self.segment_file(segment)
+        with open(path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(blob)
+        durable(path)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO archived (session_id, segment, offset, length, raw_bytes, "
+                "topic, status, created_at, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, segment, offset, len(blob), len(raw), data.get("topic", ""),
+                 data.get("status", ""), data.get("created_at", ""), datetime.now().isoformat()))
+        return len(raw), len(blob)
+
+    def enforce_budget(self, budget: int) -> Dict:
+        """（持有 writing 锁时调用）总大小超过 budget 字节时从最早的段开始整段删除"""
+        evicted = {"segments": 0, "sessions": 0, "bytes": 0}
+        segments = self.segments()
+        total = sum(self.segment_file(segment).stat().st_size for segment in segments)
+        for segment in segments:
+            if total <= budget:
+                break
+            path = self.segment_file(segment)
+            size = path.stat().st_size
+            # 先删索引再删文件：读者要么读到完整记录，要么查不到
+            with self._lock, self.conn:
+                cursor = self.conn.execute("DELETE FROM archived WHERE segment = ?", (segment,))
+            path.unlink()
+            total -= size
+            evicted["segments"] += 1
+            evicted["sessions"] += cursor.rowcount
+            evicted["bytes"] += size
+        return evicted
+
+
+def archive_sessions(store, before: str, budget: Optional[int] = None,
+                     archive: Optional[SessionArchive] = None) -> Dict:
+    """归档 JSON 后端中会话ID早于 before（会话ID前缀）、且此后没有再修改过的会话
+
+    每个会话在会话锁内：读取 → 追加到段文件并刷盘 → 写索引 → 删除热目录中的文件（锁文件保留）。
+    budget（字节）不为 None 时，归档后按预算淘汰最早的段。
+    """
+    archive = archive or get_archive()
+    cutoff = time.mktime(datetime.strptime(before[:15], "%Y%m%d_%H%M%S").timetuple())
+    stats = {"archived": 0, "skipped": 0, "raw_bytes": 0, "packed_bytes": 0, "hot_bytes_freed": 0}
+    with archive.writing():
+        for session_id in sorted(store.session_ids()):
+            if session_id >= before:
+                continue
+            with store.locked(session_id):
+                try:
+                    if store.last_modified(session_id) >= cutoff:
+                        stats["skipped"] += 1  # 创建得早但最近还在写入
+                        continue
+                    data = store.export(session_id)
+                except FileNotFoundError:
+                    continue  # 其他进程刚归档过
+                raw_bytes, packed_bytes = archive.add(session_id, data)
+                stats["raw_bytes"] += raw_bytes
+                stats["packed_bytes"] += packed_bytes
+                stats["hot_bytes_freed"] += store.delete(session_id)
+            stats["archived"] += 1
+        if stats["archived"]:
+            durable(session_store.SESSIONS_DIR)
+        if budget is not None:
+            stats["evicted"] = archive.enforce_budget(budget)
+    stats["archive_sessions"] = archive.count()
+    stats["archive_bytes"] = archive.size()
+    return stats
+
+
+def parse_size(value: str) -> int:
+    """解析磁盘预算，如 500M、2G、1048576"""
+    text = value.strip().upper().rstrip("B")
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise ValueError(f"无法解析大小: {value}")
+
+
+_instance: Optional[SessionArchive] = None
+
+
+def get_archive() -> SessionArchive:
+    """获取归档实例（同一进程内复用）"""
+    global _instance
+    if _instance is None:
+        _instance = SessionArchive()
+    return _instance
@@ -0,0 +1,1063 @@
+#!/usr/bin/env python3
+"""
+会话存储后端
+ContentTracker 通过这里读写会话数据，支持 JSON 文件（默认）和 SQLite 两种后端
+"""
+
+import fcntl
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import tracker_metrics
+
+# 配置目录，可用环境变量 SOCIAL_PUBLISHER_DIR 指向其他目录（如测试用的临时目录）
+CONFIG_DIR = Path(os.environ.get("SOCIAL_PUBLISHER_DIR") or Path(__file__).parent.parent / ".social_publisher")
+SESSIONS_DIR = CONFIG_DIR / "sessions"
+SESSIONS_DB = CONFIG_DIR / "sessions.db"
+
+# 默认存储后端，可用环境变量或 CLI 的 --store 覆盖
+DEFAULT_STORE = os.environ.get("SOCIAL_PUBLISHER_STORE", "json")
+
+# 增量日志：小改动以 JSONL 追加到 session_<id>.journal.jsonl，
+# 日志体积超过快照（且不小于下限）时压缩回快照，单次改动的写入量与会话大小无关
+JOURNAL_ENABLED = os.environ.get("SOCIAL_PUBLISHER_JOURNAL", "1") != "0"
+JOURNAL_MIN_COMPACT_BYTES = 256 * 1024
+
+# 刷盘方式：off（默认）不主动 fsync，原子替换保证文件完整，但断电时可能丢失最近的改动；
+# always 每次写入都 fsync；group 同一进程内（常驻服务）并发的写入合并成一次 fsync（组提交），
+# 各自独立的 CLI 进程之间无法合并，等同 always。fsync 会让每次小改动慢一倍以上，按需开启
+FSYNC_MODE = os.environ.get("SOCIAL_PUBLISHER_FSYNC", "off")
+
+
+def ensure_dirs():
+    """确保目录存在"""
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+
+
+# 体积大、报告/核查用不到的字段单独分段存储，加载会话时不解析，首次访问时才读取
+# 段名 -> 在会话数据中的路径
+SEGMENTS = {
+    "posts": ("search", "posts"),
+    "replies": ("engagement", "replies_content"),
+    "wechat": ("generated_content", "wechat", "content"),
+}
+
+
+class LazyDict(dict):
+    """部分键按需加载的 dict
+
+    懒加载的键先以 None 占位（键本身可见），第一次读取值时调用 loader 加载；
+    加载前落在该键下层的增量操作先暂存，加载后再依次应用。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaders = {}
+        self._deferred = {}
+
+    def make_lazy(self, key, loader):
+        dict.__setitem__(self, key, None)
+        self._loaders[key] = loader
+        self._deferred.pop(key, None)
+
+    def is_lazy(self, key) -> bool:
+        return key in self._loaders
+
+    def is_dirty(self, key) -> bool:
+        """懒加载的键下是否有尚未应用的增量操作"""
+        return key in self._deferred
+
+    def defer(self, key, op):
+        self._deferred.setdefault(key, []).append(op)
+
+    def raw(self) -> Dict:
+        """不触发加载的浅拷贝（懒加载的键为 None）"""
+        return {k: dict.__getitem__(self, k) for k in dict.keys(self)}
+
+    def _load(self, key):
+        value = self._loaders.pop(key)()
+        dict.__setitem__(self, key, value)
+        for op in self._deferred.pop(key, []):
+            apply_op(value, op)
+        return value
+
+    def materialize(self):
+        for key in list(self._loaders):
+            self._load(key)
+
+    def __getitem__(self, key):
+        if key in self._loaders:
+            return self._load(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        self._loaders.pop(key, None)
+        self._deferred.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._loaders.pop(key, None)
+        self._deferred.pop(key, None)
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        if key in self._loaders:
+            self._load(key)
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def values(self):
+        self.materialize()
+        return dict.values(self)
+
+    def items(self):
+        self.materialize()
+        return dict.items(self)
+
+    def copy(self):
+        self.materialize()
+        return dict(dict.items(self))
+
+    def __eq__(self, other):
+        self.materialize()
+        return dict.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "LazyDict(%r)" % self.raw()
+
+    def __reduce__(self):
+        # 序列化（pickle/deepcopy）时转换成普通 dict
+        return (dict, (self.copy(),))
+
+
+def attach_segment(data: Dict, name: str, loader):
+    """把 SEGMENTS[name] 对应的字段设为懒加载"""
+    path = SEGMENTS[name]
+    grandparent = data
+    for key in path[:-2]:
+        grandparent = grandparent[key]
+    parent = grandparent[path[-2]]
+    if not isinstance(parent, LazyDict):
+        parent = LazyDict(parent)
+        grandparent[path[-2]] = parent
+    parent.make_lazy(path[-1], loader)
+
+
+def segment_state(data: Dict, name: str):
+    """返回 (父级 dict, 键名, 是否仍未加载且无待应用的改动)"""
+    path = SEGMENTS[name]
+    parent = data
+    for key in path[:-1]:
+        parent = parent[key]
+    untouched = (isinstance(parent, LazyDict) and parent.is_lazy(path[-1])
+                 and not parent.is_dirty(path[-1]))
+    return parent, path[-1], untouched
+
+
+def core_copy(data: Dict, placeholders: Dict) -> Dict:
+    """生成不含分段字段的会话副本（不触发懒加载），分段字段替换为占位值"""
+    core = dict(data)
+    for name, placeholder in placeholders.items():
+        path = SEGMENTS[name]
+        src, dst = data, core
+        for key in path[:-1]:
+            src = src[key]
+            child = src.raw() if isinstance(src, LazyDict) else dict(src)
+            dst[key] = child
+            dst = child
+        dst[path[-1]] = placeholder
+    return core
+
+
+def is_segment_placeholder(value, name: str) -> bool:
+    return isinstance(value, dict) and value.get("$segment") == name
+
+
+def apply_op(data: Dict, op) -> None:
+    """将一条增量操作 (kind, path, value) 应用到会话数据上"""
+    kind, path, value = op
+    target = data
+    for i, key in enumerate(path[:-1]):
+        if isinstance(target, LazyDict) and target.is_lazy(key):
+            # 落在未加载字段下层的改动先暂存，避免为了重放日志去读取整个分段
+            target.defer(key, (kind, path[i + 1:], value))
+            return
+        target = target[key]
+    if kind == "set":
+        target[path[-1]] = value
+    elif kind == "append":
+        target[path[-1]].append(value)
+    else:
+        raise ValueError(f"未知的日志操作: {kind}")
+
+
+def replay_journal(data: Dict, journal_file: Path) -> int:
+    """在快照上重放日志，返回日志字节数；末尾半行（写入中断）会被忽略"""
+    if not journal_file.exists():
+        return 0
+    applied = data.get("journal_seq", 0)
+    size = 0
+    with open(journal_file, "r", encoding="utf-8") as f:
+        for line in f:
+            size += len(line.encode("utf-8"))
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if entry["seq"] <= applied:
+                continue
+            for op in entry["ops"]:
+                apply_op(data, op)
+            applied = entry["seq"]
+    data["journal_seq"] = applied
+    return size
+
+
+class GroupCommit:
+    """组提交：并发到达的写入合并成一次 fsync 批次
+
+    每个调用都在覆盖自己那次写入的 fsync 完成后才返回；某个线程正在 fsync 时，
+    其他线程的文件先排队，由下一个领头线程一起刷盘。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queued = set()
+        self._batch = 0      # 正在收集的批次
+        self._synced = -1    # 已完成 fsync 的最新批次
+        self._leader = False
+
+    def sync(self, path: Path):
+        with self._cond:
+            self._queued.add(str(path))
+            batch = self._batch
+            while self._leader and self._synced < batch:
+                self._cond.wait()
+            if self._synced >= batch:
+                return
+            self._leader = True
+            paths, self._queued = self._queued, set()
+            self._batch += 1
+        try:
+            for queued in paths:
+                _fsync_path(queued)
+        finally:
+            with self._cond:
+                self._synced = batch
+                self._leader = False
+                self._cond.notify_all()
+
+
+def _fsync_path(path):
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_group_commit = GroupCommit()
+
+
+def durable(path: Path):
+    """按 FSYNC_MODE 把文件（或目录项）刷到磁盘"""
+    if FSYNC_MODE == "always":
+        _fsync_path(path)
+    elif FSYNC_MODE == "group":
+        _group_commit.sync(path)
+
+
+def atomic_write(path: Path, write):
+    """先写同目录下的临时文件再 os.replace，读者只会看到旧文件或完整的新文件
+
+    write(f) 负责写入内容，其返回值原样返回。
+    """
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            result = write(f)
+        durable(tmp_file)
+        os.replace(tmp_file, path)
+    except BaseException:
+        if tmp_file.exists():
+            tmp_file.unlink()
+        raise
+    durable(path.parent)
+    return result
+
+
+class JsonSessionStore:
+    """JSON 文件后端：每个会话一个快照文件 + 增量日志
+
+    写入时持有会话锁文件（session_<id>.lock）上的 flock 排他锁，读取时持有共享锁。
+    多个进程同时写同一会话时，写入前若发现文件已被其他进程改过，
+    先重新加载最新内容、再把本次操作应用上去，不会覆盖别人的改动。
+    """
+
+    name = "json"
+
+    def __init__(self):
+        # 每个会话的 (快照字节数, 日志字节数)，用于判断何时压缩
+        self._sizes: Dict[str, List[int]] = {}
+        # 每个会话上次读写后的文件版本（快照 inode/mtime/大小, 日志字节数），用于发现其他进程的写入
+        self._versions: Dict[str, tuple] = {}
+
+    def session_file(self, session_id: str) -> Path:
+        return SESSIONS_DIR / f"session_{session_id}.json"
+
+    def journal_file(self, session_id: str) -> Path:
+        return SESSIONS_DIR / f"session_{session_id}.journal.jsonl"
+
+    def posts_file(self, session_id: str) -> Path:
+        return SESSIONS_DIR / f"session_{session_id}.posts.jsonl"
+
+    def lock_file(self, session_id: str) -> Path:
+        return SESSIONS_DIR / f"session_{session_id}.lock"
+
+    def exists(self, session_id: str) -> bool:
+        if self.session_file(session_id).exists():
+            return True
+        archive = _archive()
+        return archive is not None and archive.has(session_id)
+
+    @contextmanager
+    def locked(self, session_id: str, shared: bool = False):
+        """会话级 flock 咨询锁（同一进程的不同线程之间同样互斥）"""
+        fd = os.open(str(self.lock_file(session_id)), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def create(self, data: Dict) -> str:
+        """创建新会话：以 data["session_id"] 为基础，同一秒内的并发创建依次加 _001、_002 后缀
+
+        以 O_EXCL 创建锁文件占用会话ID，返回最终使用的ID（同时写回 data）。
+        """
+        ensure_dirs()
+        base = data["session_id"]
+        for n in range(1000):
+            session_id = base if n == 0 else f"{base}_{n:03d}"
+            try:
+                os.close(os.open(str(self.lock_file(session_id)),
+                                 os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            except FileExistsError:
+                continue
+            if self.session_file(session_id).exists():
+                continue  # 没有锁文件的旧会话
+            data["session_id"] = session_id
+            with self.locked(session_id):
+                self._save(session_id, data)
+            return session_id
+        raise RuntimeError(f"无法为 {base} 分配会话ID")
+
+    def write_posts(self, session_id: str, posts: Iterable[Dict]) -> int:
+        """把帖子流逐条写入旁路文件（session_<id>.posts.jsonl），返回写入条数"""
+        def write(f):
+            count = 0
+            for post in posts:
+                f.write(json.dumps(post, ensure_ascii=False) + "\n")
+                count += 1
+            return count
+        return atomic_write(self.posts_file(session_id), write)
+
+    def iter_posts(self, session_id: str) -> Iterator[Dict]:
+        """逐条读取旁路文件中的帖子"""
+        posts_file = self.posts_file(session_id)
+        if not posts_file.exists():
+            return
+        with open(posts_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def segment_file(self, session_id: str, name: str) -> Path:
+        if name == "posts":
+            return self.posts_file(session_id)
+        return SESSIONS_DIR / f"session_{session_id}.{name}.seg"
+
+    def _read_segment(self, session_id: str, name: str):
+        with open(self.segment_file(session_id, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_segment(self, session_id: str, name: str, value):
+        atomic_write(self.segment_file(session_id, name),
+                     lambda f: json.dump(value, f, ensure_ascii=False))
+
+    def _attach_posts(self, session_id: str, data: Dict):
+        attach_segment(data, "posts", lambda: list(self.iter_posts(session_id)))
+
+    def _file_version(self, session_id: str) -> tuple:
+        try:
+            st = self.session_file(session_id).stat()
+            snapshot = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            snapshot = None
+        try:
+            journal = self.journal_file(session_id).stat().st_size
+        except FileNotFoundError:
+            journal = 0
+        return snapshot, journal
+
+    def _refresh(self, session_id: str, data: Dict, ops: List) -> bool:
+        """（持有排他锁时调用）文件已被其他进程改过时，重新加载并应用 ops，原地替换 data
+
+        返回是否重新加载过。
+        """
+        if self._versions.get(session_id) == self._file_version(session_id):
+            return False
+        fresh = self._load(session_id)
+        for op in ops:
+            apply_op(fresh, op)
+        data.clear()
+        data.update(fresh)
+        return True
+
+    def load(self, session_id: str) -> Dict:
+        """读取快照并重放日志；分段字段（帖子、回复内容、公众号正文）首次访问时才读取
+
+        热目录中没有的会话从归档读取（见 session_archive），之后的写入会写回热目录。
+        """
+        if not self.session_file(session_id).exists():
+            return self._load_archived(session_id)
+        with self.locked(session_id, shared=True):
+            return self._load(session_id)
+
+    def _load_archived(self, session_id: str) -> Dict:
+        archive = _archive()
+        data = archive.load(session_id) if archive is not None else None
+        if data is None:
+            raise FileNotFoundError(f"Session {session_id} not found")
+        self._sizes[session_id] = [0, 0]
+        self._versions[session_id] = self._file_version(session_id)
+        return data
+
+    @tracker_metrics.instrument("store.load", store="json")
+    def _load(self, session_id: str) -> Dict:
+        session_file = self.session_file(session_id)
+        if not session_file.exists():
+            # 加载后被其他进程归档了：从归档重新读取，写入时回到热目录
+            return self._load_archived(session_id)
+
+        with open(session_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data["search"].get("posts_external"):
+            self._attach_posts(session_id, data)
+        for name in ("replies", "wechat"):
+            parent, key, _ = segment_state(data, name)
+            if is_segment_placeholder(parent[key], name):
+                attach_segment(data, name, functools.partial(self._read_segment, session_id, name))
+
+        journal_bytes = replay_journal(data, self.journal_file(session_id))
+        search = data["search"]
+        if search.get("posts_external") and not (isinstance(search, LazyDict) and search.is_lazy("posts")):
+            self._attach_posts(session_id, data)
+        self._sizes[session_id] = [session_file.stat().st_size, journal_bytes]
+        self._versions[session_id] = self._file_version(session_id)
+        return data
+
+    def save(self, session_id: str, data: Dict, ops: List = ()) -> bool:
+        """写完整快照，并清空已并入快照的日志
+
+        ops 是 data 上尚未持久化的操作：文件已被其他进程改过时，会在最新内容上重新应用它们。
+        返回 data 是否被重新加载过。
+        """
+        with self.locked(session_id):
+            reloaded = self._refresh(session_id, data, ops)
+            self._save(session_id, data)
+        return reloaded
+
+    @tracker_metrics.instrument("store.save", store="json")
+    def _save(self, session_id: str, data: Dict):
+        # 分段字段只在被加载或修改过时重写；非空的分段写到单独的文件，快照里只留占位
+        placeholders = {}
+        rewritten = []
+        for name in SEGMENTS:
+            parent, key, untouched = segment_state(data, name)
+            external = data["search"].get("posts_external") if name == "posts" else False
+            if not untouched:
+                value = parent[key]
+                if not value and not external:
+                    continue
+                if name == "posts":
+                    self.write_posts(session_id, value)
+                else:
+                    self._write_segment(session_id, name, value)
+                rewritten.append(name)
+            if name == "posts":
+                data["search"]["posts_external"] = True
+                placeholders[name] = []
+            else:
+                placeholders[name] = {"$segment": name}
+
+        payload = json.dumps(core_copy(data, placeholders), ensure_ascii=False, indent=2)
+        atomic_write(self.session_file(session_id), lambda f: f.write(payload))
+        journal_file = self.journal_file(session_id)
+        if journal_file.exists():
+            journal_file.unlink()
+        self._sizes[session_id] = [len(payload.encode("utf-8")), 0]
+        self._versions[session_id] = self._file_version(session_id)
+        if tracker_metrics.enabled:
+            segment_bytes = sum(self.segment_file(session_id, name).stat().st_size for name in rewritten)
+            tracker_metrics.add_io("store.save", self._sizes[session_id][0] + segment_bytes,
+                                   1 + len(rewritten), store="json")
+
+    @tracker_metrics.instrument("store.append", store="json")
+    def append(self, session_id: str, data: Dict, ops: List) -> bool:
+        """追加增量日志（ops 已应用到 data 上），返回 data 是否被重新加载过"""
+        if not JOURNAL_ENABLED:
+            return self.save(session_id, data, ops)
+
+        with self.locked(session_id):
+            reloaded = self._refresh(session_id, data, ops)
+            if not self.session_file(session_id).exists():
+                # 从归档加载的会话：先写完整快照回到热目录，日志才有基准
+                self._save(session_id, data)
+                return reloaded
+            seq = data.get("journal_seq", 0) + 1
+            data["journal_seq"] = seq
+            line = json.dumps({"seq": seq, "ops": ops}, ensure_ascii=False) + "\n"
+            journal_file = self.journal_file(session_id)
+            with open(journal_file, "a", encoding="utf-8") as f:
+                f.write(line)
+            durable(journal_file)
+
+            sizes = self._sizes.setdefault(session_id, [0, 0])
+            sizes[1] += len(line.encode("utf-8"))
+            tracker_metrics.add_io("store.append", len(line.encode("utf-8")), store="json")
+            if sizes[1] >= max(JOURNAL_MIN_COMPACT_BYTES, sizes[0]):
+                self._save(session_id, data)
+            else:
+                self._versions[session_id] = self._file_version(session_id)
+        return reloaded
+
+    def compact(self, session_id: str, data: Dict):
+        """把日志合并进快照"""
+        self.save(session_id, data)
+
+    def last_modified(self, session_id: str) -> float:
+        """热目录中会话的最后修改时间；不在热目录（未创建或已归档）时抛出 FileNotFoundError"""
+        return self._last_modified(self.session_file(session_id))
+
+    def export(self, session_id: str) -> Dict:
+        """（持有会话锁时调用）读取热目录中的完整会话用于导出，不从归档回退；不存在时抛出 FileNotFoundError"""
+        if not self.session_file(session_id).exists():
+            raise FileNotFoundError(f"Session {session_id} not found")
+        data = self._load(session_id)
+        for name in SEGMENTS:
+            # 在锁内读出所有分段，之后删除热目录中的文件不影响返回的数据
+            parent, key, _ = segment_state(data, name)
+            parent[key]
+        return data
+
+    def delete(self, session_id: str) -> int:
+        """（持有会话锁时调用）删除热目录中的会话文件（快照、日志、帖子和分段文件），返回释放的字节数
+
+        锁文件保留：其他进程可能正等在这把锁上，持锁时删掉它会让后来者锁到一个新文件上，
+        两边同时进入临界区；保留的锁文件同时占住会话ID，不会被新会话复用。
+        """
+        freed = 0
+        for path in SESSIONS_DIR.glob(f"session_{session_id}.*"):
+            if path == self.lock_file(session_id):
+                continue
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._sizes.pop(session_id, None)
+        self._versions.pop(session_id, None)
+        return freed
+
+    def _last_modified(self, session_file: Path) -> float:
+        """会话最后修改时间（快照与日志取较新者）"""
+        mtime = session_file.stat().st_mtime
+        journal_file = session_file.with_name(f"{session_file.stem}.journal.jsonl")
+        try:
+            return max(mtime, journal_file.stat().st_mtime)
+        except FileNotFoundError:
+            return mtime
+
+    def session_ids(self, archived: bool = False) -> List[str]:
+        """热目录中的会话ID；archived=True 时包括已归档的会话"""
+        ensure_dirs()
+        ids = [p.stem.replace("session_", "") for p in SESSIONS_DIR.glob("session_*.json")]
+        archive = _archive() if archived else None
+        if archive is not None:
+            ids = sorted(set(ids) | set(archive.session_ids()))
+        return ids
+
+    def latest_id(self) -> Optional[str]:
+        """最近修改的会话ID"""
+        ensure_dirs()
+        sessions = list(SESSIONS_DIR.glob("session_*.json"))
+        if not sessions:
+            return None
+        latest = max(sessions, key=self._last_modified)
+        return latest.stem.replace("session_", "")
+
+    def list_sessions(self, limit: int = 10) -> List[Dict]:
+        """按会话ID倒序列出会话摘要"""
+        summaries = []
+        for session_id in sorted(self.session_ids(), reverse=True)[:limit]:
+            data = self.load(session_id)
+            summaries.append({
+                "session_id": data["session_id"],
+                "topic": data["topic"],
+                "status": data["status"],
+                "created_at": data["created_at"],
+            })
+        return summaries
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions(status);
+CREATE INDEX IF NOT EXISTS idx_sessions_topic ON sessions(topic);
+
+CREATE TABLE IF NOT EXISTS posts (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    post_id TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS engagements (
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    reply_text TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (session_id, kind, post_id)
+);
+CREATE INDEX IF NOT EXISTS idx_engagements_post ON engagements(post_id);
+
+CREATE TABLE IF NOT EXISTS publish_attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    status TEXT NOT NULL,
+    url TEXT,
+    published_count INTEGER,
+    error TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_publish_attempts_session ON publish_attempts(session_id, platform);
+
+CREATE TABLE IF NOT EXISTS segments (
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, name)
+) WITHOUT ROWID;
+"""
+
+# engagement 中单独建表的列表字段 -> engagements.kind
+ENGAGEMENT_KINDS = {"selected_posts": "selected", "liked": "like", "replied": "reply"}
+
+
+def _archive():
+    """会话归档实例；从未归档过（没有归档索引）时返回 None，不创建归档目录"""
+    from session_archive import ARCHIVE_DIR, get_archive
+    if not (ARCHIVE_DIR / "index.db").exists():
+        return None
+    return get_archive()
+
+
+def post_key(post) -> Optional[str]:
+    """帖子的唯一标识（id / post_id / url）"""
+    if not isinstance(post, dict):
+        return None
+    for key in ("id", "post_id", "url"):
+        if post.get(key):
+            return str(post[key])
+    return None
+
+
+def parse_since(value: str) -> str:
+    """把时间参数（--since、--older-than）转为会话ID前缀（会话ID形如 20260119_143052）
+
+    支持相对时间（30m、24h、7d）和日期（2026-01-19、2026-01-19T08:00、20260119）。
+    """
+    match = re.fullmatch(r"(\d+)([mhd])", value.strip())
+    if match:
+        unit = {"m": "minutes", "h": "hours", "d": "days"}[match.group(2)]
+        moment = datetime.now() - timedelta(**{unit: int(match.group(1))})
+    else:
+        text = value.strip()
+        try:
+            moment = datetime.strptime(text, "%Y%m%d") if text.isdigit() else datetime.fromisoformat(text)
+        except ValueError:
+            raise ValueError(f"无法解析时间: {value}")
+    return moment.strftime("%Y%m%d_%H%M%S")
+
+
+def _locked(method):
+    """SQLite 连接可能被常驻服务的多个线程共享，公共方法串行执行"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class SqliteSessionStore:
+    """SQLite 后端（WAL 模式）：帖子、互动、发布记录分表存储，查询走索引
+
+    会话主体每次写入时 version 加一。写事务以 BEGIN IMMEDIATE 开始，事务内若发现 version
+    与本进程上次读写时不同（其他进程写过），先重新加载最新内容、再把本次操作应用上去，
+    与 JSON 后端一样不会覆盖别人的改动。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: Path = None):
+        self.db_path = Path(db_path or SESSIONS_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sessions)")}
+        if "version" not in columns:
+            # 早期版本建的库没有 version 列
+            self.conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # 每个会话上次读写后的 version，用于发现其他进程的写入
+        self._versions: Dict[str, int] = {}
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：一开始就拿写锁，事务内读到的就是最新提交的内容"""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            yield
+
+    @staticmethod
+    def _core(data: Dict) -> str:
+        """会话主体 JSON（帖子、互动明细、公众号正文存到各自的表里）"""
+        core = core_copy(data, {"posts": [], "replies": {}, "wechat": {"$segment": "wechat"}})
+        core["search"]["posts_external"] = True
+        core["engagement"].update(selected_posts=[], liked=[], replied=[])
+        return json.dumps(core, ensure_ascii=False)
+
+    def _read_replies(self, session_id: str) -> Dict:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT post_id, reply_text FROM engagements WHERE session_id = ? "
+                "AND kind = 'reply' AND reply_text IS NOT NULL ORDER BY rowid",
+                (session_id,)).fetchall()
+        return dict(rows)
+
+    def _read_segment(self, session_id: str, name: str):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM segments WHERE session_id = ? AND name = ?",
+                (session_id, name)).fetchone()
+        return json.loads(row[0]) if row else ""
+
+    def _write_segment(self, session_id: str, name: str, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO segments (session_id, name, data) VALUES (?, ?, ?)",
+            (session_id, name, json.dumps(value, ensure_ascii=False)))
+
+    @_locked
+    def exists(self, session_id: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    @tracker_metrics.instrument("store.load", store="sqlite")
+    @_locked
+    def load(self, session_id: str) -> Dict:
+        row = self.conn.execute(
+            "SELECT data, version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Session {session_id} not found")
+
+        data = json.loads(row[0])
+        self._versions[session_id] = row[1]
+        engagement = data["engagement"]
+        kinds = {kind: field for field, kind in ENGAGEMENT_KINDS.items()}
+        for kind, post_id in self.conn.execute(
+                "SELECT kind, post_id FROM engagements "
+                "WHERE session_id = ? ORDER BY rowid", (session_id,)):
+            engagement[kinds[kind]].append(post_id)
+
+        # 帖子、回复内容、公众号正文首次访问时才查询
+        attach_segment(data, "posts", lambda: list(self.iter_posts(session_id)))
+        attach_segment(data, "replies", functools.partial(self._read_replies, session_id))
+        if is_segment_placeholder(data["generated_content"]["wechat"]["content"], "wechat"):
+            attach_segment(data, "wechat", functools.partial(self._read_segment, session_id, "wechat"))
+        return data
+
+    def _refresh(self, session_id: str, data: Dict, ops: List) -> bool:
+        """（在写事务内调用）会话已被其他进程改过时，重新加载并应用 ops，原地替换 data
+
+        返回是否重新加载过。
+        """
+        row = self.conn.execute(
+            "SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or row[0] == self._versions.get(session_id):
+            return False
+        fresh = self.load(session_id)
+        for op in ops:
+            apply_op(fresh, op)
+        data.clear()
+        data.update(fresh)
+        return True
+
+    def _write_core(self, session_id: str, data: Dict):
+        core = self._core(data)
+        tracker_metrics.add_io("store.write_core", len(core), 0, store="sqlite")
+        self.conn.execute(
+            "INSERT INTO sessions (session_id, topic, status, created_at, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(session_id) DO UPDATE SET "
+            "topic = excluded.topic, status = excluded.status, "
+            "updated_at = excluded.updated_at, data = excluded.data, version = sessions.version + 1",
+            (session_id, data["topic"], data["status"], data["created_at"],
+             datetime.now().isoformat(), core))
+        self._versions[session_id] = self.conn.execute(
+            "SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def _write_posts(self, session_id: str, posts: Iterable[Dict]) -> int:
+        self.conn.execute("DELETE FROM posts WHERE session_id = ?", (session_id,))
+        count = 0
+        rows = []
+        for post in posts:
+            rows.append((session_id, count, post_key(post), json.dumps(post, ensure_ascii=False)))
+            count += 1
+            if len(rows) >= 1000:
+                self.conn.executemany(
+                    "INSERT INTO posts (session_id, seq, post_id, data) VALUES (?, ?, ?, ?)", rows)
+                rows = []
+        self.conn.executemany(
+            "INSERT INTO posts (session_id, seq, post_id, data) VALUES (?, ?, ?, ?)", rows)
+        return count
+
+    @_locked
+    def write_posts(self, session_id: str, posts: Iterable[Dict]) -> int:
+        """分批写入帖子流，返回写入条数"""
+        with self.conn:
+            return self._write_posts(session_id, posts)
+
+    def iter_posts(self, session_id: str, page_size: int = 1000) -> Iterator[Dict]:
+        """按顺序分页读取帖子，内存占用与帖子总数无关"""
+        seq = -1
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT seq, data FROM posts WHERE session_id = ? AND seq > ? "
+                    "ORDER BY seq LIMIT ?", (session_id, seq, page_size)).fetchall()
+            if not rows:
+                return
+            for seq, data in rows:
+                yield json.loads(data)
+
+    def _add_engagement(self, session_id: str, kind: str, post_id: str, reply_text=None):
+        self.conn.execute(
+            "INSERT INTO engagements (session_id, kind, post_id, reply_text, created_at) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(session_id, kind, post_id) DO UPDATE SET "
+            "reply_text = COALESCE(excluded.reply_text, engagements.reply_text)",
+            (session_id, kind, post_id, reply_text, datetime.now().isoformat()))
+
+    def _write_engagement(self, session_id: str, engagement: Dict):
+        self.conn.execute("DELETE FROM engagements WHERE session_id = ?", (session_id,))
+        for field, kind in ENGAGEMENT_KINDS.items():
+            for post_id in engagement[field]:
+                reply_text = engagement["replies_content"].get(post_id) if kind == "reply" else None
+                self._add_engagement(session_id, kind, post_id, reply_text)
+
+    @_locked
+    def create(self, data: Dict) -> str:
+        """创建新会话：会话ID已存在时依次加 _001、_002 后缀（主键冲突即重试），返回最终ID"""
+        base = data["session_id"]
+        for n in range(1000):
+            session_id = base if n == 0 else f"{base}_{n:03d}"
+            data["session_id"] = session_id
+            try:
+                with self._transaction():
+                    self.conn.execute(
+                        "INSERT INTO sessions (session_id, topic, status, created_at, updated_at, data) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (session_id, data["topic"], data["status"], data["created_at"],
+                         datetime.now().isoformat(), self._core(data)))
+                    self._save(session_id, data)
+            except sqlite3.IntegrityError:
+                continue
+            return session_id
+        raise RuntimeError(f"无法为 {base} 分配会话ID")
+
+    @tracker_metrics.instrument("store.save", store="sqlite")
+    @_locked
+    def save(self, session_id: str, data: Dict, ops: List = ()) -> bool:
+        """写完整会话；未加载过的分段保持不变
+
+        ops 是 data 上尚未持久化的操作：会话已被其他进程改过时，会在最新内容上重新应用它们。
+        返回 data 是否被重新加载过。
+        """
+        with self._transaction():
+            reloaded = self._refresh(session_id, data, ops)
+            self._save(session_id, data)
+        return reloaded
+
+    def _save(self, session_id: str, data: Dict):
+        self._write_core(session_id, data)
+        parent, key, untouched = segment_state(data, "posts")
+        if not untouched:
+            self._write_posts(session_id, parent[key])
+        self._write_engagement(session_id, data["engagement"])
+        parent, key, untouched = segment_state(data, "wechat")
+        if not untouched:
+            self._write_segment(session_id, "wechat", parent[key])
+
+    @tracker_metrics.instrument("store.append", store="sqlite")
+    @_locked
+    def append(self, session_id: str, data: Dict, ops: List) -> bool:
+        """按操作路径只写受影响的表，返回 data 是否被重新加载过"""
+        with self._transaction():
+            reloaded = self._refresh(session_id, data, ops)
+            for kind, path, value in ops:
+                if path == ["search", "posts"]:
+                    self._write_posts(session_id, value)
+                elif path[:2] == ["generated_content", "wechat"]:
+                    self._write_segment(session_id, "wechat",
+                                        data["generated_content"]["wechat"]["content"])
+                elif path == ["engagement", "selected_posts"]:
+                    self.conn.execute(
+                        "DELETE FROM engagements WHERE session_id = ? AND kind = 'selected'",
+                        (session_id,))
+                    for post_id in value:
+                        self._add_engagement(session_id, "selected", post_id)
+                elif path[0] == "engagement" and path[1] in ENGAGEMENT_KINDS:
+                    self._add_engagement(session_id, ENGAGEMENT_KINDS[path[1]], value)
+                elif path[:2] == ["engagement", "replies_content"]:
+                    self._add_engagement(session_id, "reply", path[2], value)
+                elif path[0] == "publish_status" and path[-1] == "status":
+                    error = next((v for _, p, v in ops if p[-1] == "errors"), None)
+                    self._add_publish_attempt(session_id, path[1],
+                                              data["publish_status"][path[1]], error)
+            self._write_core(session_id, data)
+        return reloaded
+
+    def _add_publish_attempt(self, session_id: str, platform: str, status: Dict, error=None):
+        self.conn.execute(
+            "INSERT INTO publish_attempts (session_id, platform, status, url, "
+            "published_count, error, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session_id, platform, status["status"],
+             status.get("url") or ",".join(status.get("urls", [])),
+             status.get("published_count"), error, datetime.now().isoformat()))
+
+    @_locked
+    def import_session(self, session_id: str, data: Dict):
+        """导入完整会话，并把已有发布状态记为一条发布记录（帖子由调用方另行写入）"""
+        for name in ("replies", "wechat"):
+            parent, key, _ = segment_state(data, name)
+            parent[key]  # 从来源后端加载，保证 save 时写入
+        with self._transaction():
+            self.conn.execute("DELETE FROM publish_attempts WHERE session_id = ?", (session_id,))
+            for platform, status in data["publish_status"].items():
+                if status["status"] != "pending":
+                    errors = status.get("errors") or [None]
+                    self._add_publish_attempt(session_id, platform, status, errors[-1])
+            self._save(session_id, data)
+
+    @_locked
+    def compact(self, session_id: str, data: Dict):
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    @_locked
+    def session_ids(self, archived: bool = False) -> List[str]:
+        # SQLite 后端没有归档，archived 只为与 JSON 后端保持同一接口
+        return [r[0] for r in self.conn.execute("SELECT session_id FROM sessions")]
+
+    @_locked
+    def latest_id(self) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    @_locked
+    def list_sessions(self, limit: int = 10) -> List[Dict]:
+        rows = self.conn.execute(
+            "SELECT session_id, topic, status, created_at FROM sessions "
+            "ORDER BY session_id DESC LIMIT ?", (limit,))
+        return [{"session_id": r[0], "topic": r[1], "status": r[2], "created_at": r[3]}
+                for r in rows]
+
+
+STORES = {"json": JsonSessionStore, "sqlite": SqliteSessionStore}
+_instances: Dict[str, object] = {}
+
+
+def set_default_store(name: str):
+    """设置本进程默认使用的存储后端"""
+    global DEFAULT_STORE
+    if name not in STORES:
+        raise ValueError(f"未知的存储后端: {name}")
+    DEFAULT_STORE = name
+
+
+def get_store(name: str = None):
+    """获取存储后端实例（同一进程内复用）"""
+    name = name or DEFAULT_STORE
+    if name not in STORES:
+        raise ValueError(f"未知的存储后端: {name}")
+    if name not in _instances:
+        _instances[name] = STORES[name]()
+    return _instances[name]
+
+
+def migrate_json_to_sqlite(force: bool = False) -> Dict:
+    """一次性把 JSON 会话迁移到 SQLite，返回迁移统计"""
+    source = get_store("json")
+    target = get_store("sqlite")
+    stats = {"migrated": 0, "skipped": 0, "failed": 0}
+    for session_id in sorted(source.session_ids()):
+        if not force and target.exists(session_id):
+            stats["skipped"] += 1
+            continue
+        try:
+            data = source.load(session_id)
+            target.import_session(session_id, data)
+            if isinstance(data["search"], LazyDict) and data["search"].is_lazy("posts"):
+                target.write_posts(session_id, source.iter_posts(session_id))
+            stats["migrated"] += 1
+        except (json.JSONDecodeError, KeyError, OSError) as e:
+            print(f"⚠️ 迁移失败 {session_id}: {e}")
+            stats["failed"] += 1
+    return stats
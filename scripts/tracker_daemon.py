@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+内容追踪常驻服务
+在本地 Unix socket 上提供 record_*/verify/report 等操作，缓存最近使用的会话，
+同一会话的写入串行执行并由后台线程延迟落盘（write-behind）
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+# 配置目录
+CONFIG_DIR = Path(os.environ.get("SOCIAL_PUBLISHER_DIR") or Path(__file__).parent.parent / ".social_publisher")
+SOCKET_PATH = Path(os.environ.get("SOCIAL_PUBLISHER_SOCKET", str(CONFIG_DIR / "tracker.sock")))
+
+CACHE_SIZE = 32         # 缓存的会话数
+FLUSH_INTERVAL = 0.5    # 延迟落盘间隔（秒）
+
+
+class Client:
+    """到常驻服务的一条连接，可连续发送多个请求"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.stream = sock.makefile("rwb")
+
+    def call(self, payload: Dict) -> Dict:
+        self.stream.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("追踪服务连接已断开")
+        return json.loads(line)
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+def connect(store: str = None, timeout: float = 30.0) -> Optional[Client]:
+    """连接常驻服务；服务未运行、无法连接（超时、无权限等）或存储后端不一致时返回 None"""
+    if not SOCKET_PATH.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(SOCKET_PATH))
+    except OSError:
+        sock.close()
+        return None
+    client = Client(sock)
+    if store:
+        try:
+            same_store = client.call({"op": "ping"}).get("store") == store
+        except (OSError, ValueError):
+            same_store = False
+        if not same_store:
+            client.close()
+            return None
+    return client
+
+
+def request(payload: Dict, timeout: float = 30.0) -> Optional[Dict]:
+    """向常驻服务发送一个请求；服务未运行或通信失败（断开、超时、应答损坏）时返回 None，由调用方在本地执行"""
+    client = connect(timeout=timeout)
+    if client is None:
+        return None
+    try:
+        return client.call(payload)
+    except (OSError, ValueError):
+        return None
+    finally:
+        client.close()
+
+
+class TrackerDaemon:
+    """会话缓存 + 操作执行"""
+
+    def __init__(self, tracker_cls, run_operation, store,
+                 capacity: int = CACHE_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.tracker_cls = tracker_cls
+        self.run_operation = run_operation
+        self.store = store
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.cache: "OrderedDict[str, object]" = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.session_locks: Dict[str, threading.Lock] = {}
+        self.latest: Optional[str] = None
+        self.stopped = threading.Event()
+
+    def _session_lock(self, session_id: str) -> threading.Lock:
+        return self.session_locks.setdefault(session_id, threading.Lock())
+
+    def _cache_put(self, tracker):
+        """放入缓存（调用方持有 cache_lock），超出容量时先落盘再淘汰最久未用的会话"""
+        tracker.begin_batch()
+        self.cache[tracker.session_id] = tracker
+        while len(self.cache) > self.capacity:
+            session_id, evicted = self.cache.popitem(last=False)
+            with self._session_lock(session_id):
+                evicted.end_batch()
+
+    def _get(self, session_id: Optional[str]):
+        """从缓存取会话，未命中时加载；session_id 为空时取最新会话"""
+        with self.cache_lock:
+            if not session_id:
+                latest = self.cache.get(self.latest)
+                if latest is not None and latest._pending:
+                    session_id = self.latest
+                else:
+                    session_id = self.store.latest_id()
+                if not session_id:
+                    return None
+            tracker = self.cache.get(session_id)
+            if tracker is not None:
+                self.cache.move_to_end(session_id)
+                return tracker
+            tracker = self.tracker_cls.load(session_id, self.store)
+            self._cache_put(tracker)
+            return tracker
+
+    def handle(self, req: Dict) -> Dict:
+        """执行一个请求"""
+        name = req.get("op")
+        if req.get("store") and req["store"] != self.store.name:
+            return {"ok": False, "unavailable": True,
+                    "error": f"服务使用的存储后端是 {self.store.name}"}
+
+        if name == "ping":
+            return {"ok": True, "op": name, "store": self.store.name,
+                    "cached": list(self.cache.keys()), "pid": os.getpid()}
+        if name == "init":
+            tracker = self.tracker_cls(req["topic"], self.store)
+            with self.cache_lock:
+                self._cache_put(tracker)
+                self.latest = tracker.session_id
+            return {"ok": True, "op": name, "session_id": tracker.session_id}
+        if name == "check":
+            # 跨会话的已互动查询要看到所有缓存会话还没落盘的互动
+            self.flush_all()
+        if name == "list":
+            self.flush_all()
+            return {"ok": True, "op": name, "sessions": self.store.list_sessions(req.get("limit", 10))}
+        if name == "flush":
+            return {"ok": True, "op": name, "flushed": self.flush_all()}
+        if name == "release":
+            # 落盘并移出缓存，之后由其他进程直接读写该会话
+            session_id = req.get("session") or self.latest or self.store.latest_id()
+            with self.cache_lock:
+                tracker = self.cache.pop(session_id, None)
+                if tracker is not None:
+                    with self._session_lock(session_id):
+                        tracker.end_batch()
+            return {"ok": True, "op": name, "session_id": session_id}
+        if name == "shutdown":
+            self.stopped.set()
+            return {"ok": True, "op": name}
+
+        while True:
+            tracker = self._get(req.get("session"))
+            if tracker is None:
+                return {"ok": False, "op": name, "error": "未找到会话"}
+            with self._session_lock(tracker.session_id):
+                # 拿到锁之前会话可能已被淘汰落盘，此时重新加载
+                if self.cache.get(tracker.session_id) is not tracker:
+                    continue
+                if name == "session-id":
+                    return {"ok": True, "op": name, "session_id": tracker.session_id}
+                tracker.messages = []
+                try:
+                    result = self.run_operation(tracker, req)
+                finally:
+                    messages, tracker.messages = tracker.messages, None
+                result["messages"] = messages
+                if tracker._pending:
+                    self.latest = tracker.session_id
+                return result
+
+    def flush_all(self) -> int:
+        """把所有缓存会话的待写改动落盘"""
+        with self.cache_lock:
+            trackers = list(self.cache.values())
+        flushed = 0
+        for tracker in trackers:
+            with self._session_lock(tracker.session_id):
+                flushed += tracker.flush()
+        return flushed
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush_all()
+
+    def serve(self, socket_path: Path = None):
+        """在 Unix socket 上监听，直到收到 shutdown 请求或 SIGTERM/SIGINT"""
+        socket_path = Path(socket_path or SOCKET_PATH)
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if socket_path.exists():
+            if request({"op": "ping"}, timeout=1.0) is not None:
+                raise RuntimeError(f"服务已在运行: {socket_path}")
+            socket_path.unlink()
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = daemon.handle(json.loads(line))
+                    except Exception as e:  # 单个请求失败不影响服务
+                        response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                        if getattr(e, "issues", None):
+                            response["issues"] = e.issues
+                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+        server = socketserver.ThreadingUnixStreamServer(str(socket_path), Handler)
+        server.daemon_threads = True
+        os.chmod(str(socket_path), 0o600)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: self.stopped.set())
+        print(f"✅ 追踪服务已启动: {socket_path} (存储: {self.store.name})")
+        try:
+            while not self.stopped.wait(1.0):
+                pass
+        finally:
+            server.shutdown()
+            server.server_close()
+            self.flush_all()
+            if socket_path.exists():
+                socket_path.unlink()
+            print("👋 追踪服务已停止，所有改动已落盘")
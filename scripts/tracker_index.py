@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+跨会话索引
+保存在 .social_publisher/index.db，记录所有会话中已经互动过的帖子、
+帖子和生成内容的 SimHash 指纹、全文倒排索引，以及每个会话一行的统计汇总，
+查询时不需要逐个加载会话文件
+"""
+
+import contextlib
+import hashlib
+import re
+import sqlite3
+import struct
+import threading
+from functools import lru_cache
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from session_store import CONFIG_DIR, post_key
+
+INDEX_DB = CONFIG_DIR / "index.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS engaged (
+    platform TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    engaged_at TEXT NOT NULL,
+    PRIMARY KEY (platform, post_id, kind)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    simhash INTEGER NOT NULL,
+    band0 INTEGER NOT NULL,
+    band1 INTEGER NOT NULL,
+    band2 INTEGER NOT NULL,
+    band3 INTEGER NOT NULL,
+    band4 INTEGER NOT NULL,
+    band5 INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (kind, session_id, ref)
+);
+-- 段索引带上 session_id，查候选时排除本会话也只读索引（旧版的段索引不含 session_id，删除重建）
+DROP INDEX IF EXISTS idx_fingerprints_band0;
+DROP INDEX IF EXISTS idx_fingerprints_band1;
+DROP INDEX IF EXISTS idx_fingerprints_band2;
+DROP INDEX IF EXISTS idx_fingerprints_band3;
+DROP INDEX IF EXISTS idx_fingerprints_band4;
+DROP INDEX IF EXISTS idx_fingerprints_band5;
+CREATE INDEX IF NOT EXISTS idx_fingerprints_bands0 ON fingerprints(kind, band0, simhash, session_id);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_bands1 ON fingerprints(kind, band1, simhash, session_id);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_bands2 ON fingerprints(kind, band2, simhash, session_id);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_bands3 ON fingerprints(kind, band3, simhash, session_id);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_bands4 ON fingerprints(kind, band4, simhash, session_id);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_bands5 ON fingerprints(kind, band5, simhash, session_id);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_simhash ON fingerprints(kind, simhash);
+
+CREATE TABLE IF NOT EXISTS text_docs (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    snippet TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_text_docs_session ON text_docs(session_id, field);
+CREATE VIRTUAL TABLE IF NOT EXISTS text_fts USING fts5(tokens, tokenize = 'unicode61');
+
+CREATE TABLE IF NOT EXISTS session_stats (
+    session_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    day TEXT NOT NULL,
+    status TEXT NOT NULL,
+    posts_found INTEGER NOT NULL,
+    selected INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    replies INTEGER NOT NULL,
+    twitter_status TEXT NOT NULL,
+    twitter_published INTEGER NOT NULL,
+    twitter_expected INTEGER NOT NULL,
+    xiaohongshu_status TEXT NOT NULL,
+    xiaohongshu_generated INTEGER NOT NULL,
+    wechat_status TEXT NOT NULL,
+    wechat_generated INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- 按天 / 按主题的汇总，随 session_stats 的每次变化增量调整（先减去旧行的贡献再加上新行）
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day TEXT PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    selected INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    replies INTEGER NOT NULL,
+    threads INTEGER NOT NULL,
+    threads_complete INTEGER NOT NULL,
+    thread_ratio REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS daily_publish (
+    day TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    status TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    PRIMARY KEY (day, platform, status)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS topic_stats (
+    topic TEXT PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    selected INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    replies INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS publish_errors (
+    session_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (session_id, platform, reason)
+) WITHOUT ROWID;
+"""
+
+# 搜索结果目前都来自 Twitter/X
+DEFAULT_PLATFORM = "twitter"
+
+# SimHash 指纹：64 位，切成 6 段（11/11/11/11/10/10 位）分别建索引。
+# 汉明距离 <= 5 的两个指纹至少有一段完全相同（抽屉原理），
+# 所以只需按段精确查找候选，再逐个计算距离，不必扫描全部历史
+SIMHASH_BITS = 64
+SIMHASH_BAND_WIDTHS = (11, 11, 11, 11, 10, 10)
+MAX_DISTANCE = len(SIMHASH_BAND_WIDTHS) - 1
+# 每段最多比较的候选指纹数：历史再多、模板化内容的段值再集中，单次查找也不会退化成扫描全部历史
+BAND_CANDIDATES = 64
+
+# 指纹类型：搜索到的帖子、各平台生成的内容
+FINGERPRINT_KINDS = ("post", "twitter", "xiaohongshu", "wechat")
+
+# 全文索引的字段：会话主题、搜索词、帖子正文、提炼内容、各平台生成内容
+TEXT_FIELDS = ("topic", "query", "post", "trends", "key_points", "quotes", "summary",
+               "twitter", "xiaohongshu", "wechat")
+SNIPPET_CHARS = 80
+
+# 发布统计：各平台视为发布成功的状态
+PUBLISH_SUCCESS = {"twitter": ("published",), "xiaohongshu": ("published",), "wechat": ("published", "draft")}
+REASON_CHARS = 120
+
+_TOKEN_RE = re.compile(r"[a-z0-9_#@']+|[\u3400-\u9fff\uf900-\ufaff]+")
+
+
+def _word_tokens(word: str) -> List[str]:
+    if word[0] < "\u3400" or len(word) == 1:
+        return [word]
+    return [word[i:i + 2] for i in range(len(word) - 1)]
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：英文按单词，中文按相邻两字（单字成词时保留单字）"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        tokens.extend(_word_tokens(match.group()))
+    return tokens
+
+
+def index_tokens(text: str) -> List[str]:
+    """全文索引用的分词：在 tokenize 的基础上，每段中文末尾再补一个单字
+
+    单字查询按前缀匹配两字词，段末的字没有以它开头的两字词，靠补上的单字命中；
+    补在段末不会打断段内两字词的相邻关系，短语查询不受影响。
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        tokens.extend(_word_tokens(word))
+        if word[0] >= "\u3400" and len(word) > 1:
+            tokens.append(word[-1])
+    return tokens
+
+
+def match_query(text: str) -> str:
+    """把查询文本转换为 FTS5 查询：每个词（中文为连续的一段）作为一个短语，短语之间为 AND
+
+    单个汉字按前缀匹配（命中以它开头的两字词，或段末补的单字）。
+    """
+    phrases = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if word[0] >= "\u3400" and len(word) == 1:
+            phrases.append(f'"{word}"*')
+        else:
+            phrases.append('"' + " ".join(_word_tokens(word)) + '"')
+    return " ".join(phrases)
+
+
+# 计算 SimHash 时把 64 位哈希的每一位展开成一个 32 位计数字段（拼成一个大整数），
+# 所有词的展开值直接相加即得到每一位上 1 的个数，逐位累加的循环由大整数加法完成
+_BYTE_FIELDS = [b"".join((1).to_bytes(4, "big") if byte >> (7 - i) & 1 else bytes(4) for i in range(8))
+                for byte in range(256)]
+_COUNTS = struct.Struct(f">{SIMHASH_BITS}I")
+
+
+@lru_cache(maxsize=65536)
+def _spread_hash(token: str) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(b"".join(map(_BYTE_FIELDS.__getitem__, digest)), "big")
+
+
+def simhash(text: str) -> Optional[int]:
+    """文本的 64 位 SimHash（无可用词时返回 None）
+
+    每个词权重相同：某一位上 1 的词多于一半，指纹的这一位为 1。
+    """
+    tokens = tokenize(text or "")
+    if not tokens:
+        return None
+    counts = _COUNTS.unpack(sum(map(_spread_hash, tokens)).to_bytes(_COUNTS.size, "big"))
+    half = len(tokens) / 2
+    h = 0
+    for count in counts:
+        h = h << 1 | (count > half)
+    return h
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(h: int) -> List[int]:
+    bands = []
+    for width in SIMHASH_BAND_WIDTHS:
+        bands.append(h & ((1 << width) - 1))
+        h >>= width
+    return bands
+
+
+def _to_signed(h: int) -> int:
+    # SQLite INTEGER 是有符号 64 位
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def post_text(post: Dict) -> str:
+    """帖子正文（text / content / full_text）"""
+    if not isinstance(post, dict):
+        return ""
+    return post.get("text") or post.get("content") or post.get("full_text") or ""
+
+
+class TrackerIndex:
+    """跨会话索引（SQLite，WAL 模式）"""
+
+    def __init__(self, db_path: Path = None):
+        self.db_path = Path(db_path or INDEX_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # 指纹表有 7 个索引，一次写入上万条时脏页分散；缓存放大到 64MB，避免事务中途反复溢出到 WAL
+        self.conn.execute("PRAGMA cache_size=-65536")
+        self.conn.executescript(SCHEMA)
+        self._in_transaction = False
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """写事务（BEGIN IMMEDIATE）；其中调用的写方法都并入这一个事务，结束时只提交一次
+
+        嵌套调用时直接并入外层事务。
+        """
+        with self._lock:
+            if self._in_transaction:
+                yield
+                return
+            self._in_transaction = True
+            try:
+                with self.conn:
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    yield
+            finally:
+                self._in_transaction = False
+
+    # ========== 已互动帖子 ==========
+
+    def mark_engaged(self, post_ids: Iterable[str], kind: str, session_id: str,
+                     platform: str = DEFAULT_PLATFORM):
+        """记录已互动的帖子（kind: like / reply），重复记录保留最早的会话"""
+        now = datetime.now().isoformat()
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO engaged (platform, post_id, kind, session_id, engaged_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((platform, post_id, kind, session_id, now) for post_id in post_ids))
+
+    def engaged(self, post_id: str, platform: str = DEFAULT_PLATFORM) -> Dict[str, str]:
+        """查询单个帖子的互动记录 {kind: session_id}，主键查找"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT kind, session_id FROM engaged WHERE platform = ? AND post_id = ?",
+                (platform, post_id)).fetchall()
+        return dict(rows)
+
+    def filter_engaged(self, post_ids: Iterable[str], kind: Optional[str] = None,
+                       platform: str = DEFAULT_PLATFORM) -> Set[str]:
+        """返回 post_ids 中已经互动过的帖子（可限定 like / reply），每 500 个ID一次 IN 查询"""
+        ids = list(dict.fromkeys(post_ids))
+        found = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                sql = (f"SELECT DISTINCT post_id FROM engaged WHERE platform = ? "
+                       f"AND post_id IN ({', '.join('?' * len(chunk))})")
+                params = [platform, *chunk]
+                if kind is not None:
+                    sql += " AND kind = ?"
+                    params.append(kind)
+                found.update(post_id for (post_id,) in self.conn.execute(sql, params))
+        return found
+
+    def rebuild_engaged(self, sessions: Iterable[Dict], platform: str = DEFAULT_PLATFORM) -> int:
+        """从会话数据流重建互动索引，返回处理的会话数"""
+        count = 0
+        with self._lock:
+            with self.transaction():
+                self.conn.execute("DELETE FROM engaged WHERE platform = ?", (platform,))
+            # 按创建时间顺序写入，保证同一帖子记到最早互动的会话上
+            for data in sessions:
+                engagement = data["engagement"]
+                self.mark_engaged(engagement["liked"], "like", data["session_id"], platform)
+                self.mark_engaged(engagement["replied"], "reply", data["session_id"], platform)
+                count += 1
+        return count
+
+
+    # ========== 相似内容（SimHash） ==========
+
+    def add_fingerprints(self, kind: str, session_id: str, items: Iterable[Tuple[str, int]]):
+        """写入指纹 [(ref, simhash)]；同一会话同一 ref 的旧指纹会被替换"""
+        now = datetime.now().isoformat()
+        rows = ((kind, ref, session_id, _to_signed(h), *_bands(h), now) for ref, h in items)
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO fingerprints (kind, ref, session_id, simhash, "
+                "band0, band1, band2, band3, band4, band5, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def clear_fingerprints(self, kind: str, session_id: str):
+        """删除某个会话某类指纹（重新记录搜索结果前调用）"""
+        with self.transaction():
+            self.conn.execute("DELETE FROM fingerprints WHERE kind = ? AND session_id = ?",
+                              (kind, session_id))
+
+    def find_similar(self, h: int, kind: str, exclude_session: Optional[str] = None,
+                     max_distance: int = MAX_DISTANCE, limit: int = 20) -> List[Dict]:
+        """查找与指纹 h 相近的历史内容（排除 exclude_session），按距离升序，最多 limit 条
+
+        先按段取出候选指纹（只读索引，每段最多 BAND_CANDIDATES 个），算出距离后
+        一次查询取出最近的命中指纹对应的内容。单次查找的开销有上限，不随历史增长；
+        代价是模板化内容挤满某一段时可能漏掉个别近似项。
+        """
+        exclude = exclude_session or ""
+        query = " UNION ALL ".join(
+            f"SELECT simhash FROM (SELECT simhash FROM fingerprints WHERE kind = ? AND band{i} = ? "
+            f"AND session_id != ? LIMIT ?)" for i in range(len(SIMHASH_BAND_WIDTHS)))
+        params = [v for band in _bands(h) for v in (kind, band, exclude, BAND_CANDIDATES)]
+        mask = (1 << 64) - 1
+        hits = []
+        with self._lock:
+            for (other,) in self.conn.execute(query, params):
+                # 内联的汉明距离：每次查找要比较上百个候选
+                distance = bin((h ^ other) & mask).count("1")
+                if distance <= max_distance:
+                    hits.append((distance, other))
+            if not hits:
+                return []
+            # 每个候选指纹至少对应一条其他会话的内容，最近的 limit 个指纹足以凑满 limit 条
+            hits = sorted(set(hits))[:limit]
+            rows = self.conn.execute("SELECT * FROM (" + " UNION ALL ".join(
+                "SELECT * FROM (SELECT ? AS distance, ref, session_id FROM fingerprints "
+                "WHERE kind = ? AND simhash = ? AND session_id != ? LIMIT ?)" for _ in hits) + ") LIMIT ?",
+                [v for distance, other in hits for v in (distance, kind, other, exclude, limit)] + [limit]).fetchall()
+        rows.sort(key=lambda row: row[0])
+        return [{"kind": kind, "ref": ref, "session_id": session_id, "distance": distance}
+                for distance, ref, session_id in rows[:limit]]
+
+    # ========== 全文索引 ==========
+
+    def replace_text(self, session_id: str, field: str, items: Iterable[Tuple[str, str]]) -> int:
+        """用 [(ref, text)] 替换某个会话某个字段的索引内容，返回写入的文档数"""
+        count = 0
+        with self.transaction():
+            self.conn.execute(
+                "DELETE FROM text_fts WHERE rowid IN "
+                "(SELECT id FROM text_docs WHERE session_id = ? AND field = ?)", (session_id, field))
+            self.conn.execute("DELETE FROM text_docs WHERE session_id = ? AND field = ?",
+                              (session_id, field))
+            for ref, text in items:
+                tokens = " ".join(index_tokens(text or ""))
+                if not tokens:
+                    continue
+                snippet = " ".join(text.split())[:SNIPPET_CHARS]
+                doc_id = self.conn.execute(
+                    "INSERT INTO text_docs (session_id, field, ref, snippet) VALUES (?, ?, ?, ?)",
+                    (session_id, field, ref, snippet)).lastrowid
+                self.conn.execute("INSERT INTO text_fts (rowid, tokens) VALUES (?, ?)", (doc_id, tokens))
+                count += 1
+        return count
+
+    def find(self, query: str, limit: int = 20, fields: Optional[List[str]] = None) -> List[Dict]:
+        """全文检索，按 BM25 相关度降序返回 [{session_id, field, ref, snippet, score}]"""
+        expression = match_query(query)
+        if not expression:
+            return []
+        sql = ("SELECT d.session_id, d.field, d.ref, d.snippet, bm25(text_fts) AS rank "
+               "FROM text_fts JOIN text_docs d ON d.id = text_fts.rowid WHERE text_fts MATCH ?")
+        params: List = [expression]
+        if fields:
+            sql += f" AND d.field IN ({', '.join('?' * len(fields))})"
+            params.extend(fields)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{"session_id": session_id, "field": field, "ref": ref, "snippet": snippet,
+                 "score": round(-rank, 3)} for session_id, field, ref, snippet, rank in rows]
+
+    def clear_text(self):
+        with self.transaction():
+            self.conn.execute("DELETE FROM text_fts")
+            self.conn.execute("DELETE FROM text_docs")
+
+    # ========== 统计汇总 ==========
+
+    def update_session_stats(self, data: Dict, errors: bool = True):
+        """用会话当前数据覆盖它在汇总表中的一行，并增量调整按天 / 按主题的汇总；
+        errors=True 时同时替换失败原因"""
+        engagement, publish = data["engagement"], data["publish_status"]
+        generated = data["generated_content"]
+        row = (data["session_id"], data["topic"], data["created_at"][:10], data["status"],
+               data["search"]["total_found"], len(engagement["selected_posts"]),
+               len(engagement["liked"]), len(engagement["replied"]),
+               publish["twitter"]["status"], publish["twitter"]["published_count"],
+               publish["twitter"]["expected_count"],
+               publish["xiaohongshu"]["status"], int(bool(generated["xiaohongshu"]["title"])),
+               publish["wechat"]["status"], int(bool(generated["wechat"]["title"])),
+               datetime.now().isoformat())
+        with self.transaction():
+            # 读旧行和写汇总放在同一个写事务里，避免多个进程同时更新时重复扣减
+            old = self.conn.execute("SELECT * FROM session_stats WHERE session_id = ?",
+                                    (data["session_id"],)).fetchone()
+            if old is None or old[:-1] != row[:-1]:
+                if old is not None:
+                    self._add_rollup(old, -1)
+                self._add_rollup(row, 1)
+                self.conn.execute(f"INSERT OR REPLACE INTO session_stats VALUES ({', '.join('?' * len(row))})", row)
+            if errors:
+                self.conn.execute("DELETE FROM publish_errors WHERE session_id = ?", (data["session_id"],))
+                counts: Dict[Tuple[str, str], int] = {}
+                for platform, status in publish.items():
+                    for error in status.get("errors") or []:
+                        key = (platform, _error_reason(error))
+                        counts[key] = counts.get(key, 0) + 1
+                self.conn.executemany(
+                    "INSERT INTO publish_errors (session_id, platform, reason, count) VALUES (?, ?, ?, ?)",
+                    ((data["session_id"], platform, reason, count) for (platform, reason), count in counts.items()))
+
+    def _add_rollup(self, row: tuple, sign: int):
+        """把 session_stats 的一行计入（sign=1）或移出（sign=-1）按天 / 按主题的汇总"""
+        (_, topic, day, _, _, selected, likes, replies, tw_status, tw_published, tw_expected,
+         xhs_status, xhs_generated, wc_status, wc_generated, _) = row
+        thread = tw_expected > 0
+        self.conn.execute(
+            "INSERT INTO daily_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (day) DO UPDATE SET "
+            "sessions = sessions + excluded.sessions, selected = selected + excluded.selected, "
+            "likes = likes + excluded.likes, replies = replies + excluded.replies, "
+            "threads = threads + excluded.threads, threads_complete = threads_complete + excluded.threads_complete, "
+            "thread_ratio = thread_ratio + excluded.thread_ratio",
+            (day, sign, sign * selected, sign * likes, sign * replies, sign * thread,
+             sign * (thread and tw_published >= tw_expected),
+             sign * (min(1.0, tw_published / tw_expected) if thread else 0.0)))
+        self.conn.executemany(
+            "INSERT INTO daily_publish VALUES (?, ?, ?, ?) ON CONFLICT (day, platform, status) "
+            "DO UPDATE SET sessions = sessions + excluded.sessions",
+            [(day, platform, status, sign) for platform, status, included in (
+                ("twitter", tw_status, thread), ("xiaohongshu", xhs_status, xhs_generated),
+                ("wechat", wc_status, wc_generated)) if included])
+        self.conn.execute(
+            "INSERT INTO topic_stats VALUES (?, ?, ?, ?, ?) ON CONFLICT (topic) DO UPDATE SET "
+            "sessions = sessions + excluded.sessions, selected = selected + excluded.selected, "
+            "likes = likes + excluded.likes, replies = replies + excluded.replies",
+            (topic, sign, sign * selected, sign * likes, sign * replies))
+
+    def clear_stats(self):
+        with self.transaction():
+            for table in ("session_stats", "publish_errors", "daily_stats", "daily_publish", "topic_stats"):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    def stats(self, since: Optional[str] = None, top: int = 20) -> Dict:
+        """跨会话统计：各平台发布成功率、Thread 完成度、失败原因、按天和按主题的互动数
+
+        since 为会话ID前缀（如 20260101），只统计此后创建的会话；按天汇总精确到天。
+        读取的是预先汇总好的表，耗时取决于天数和主题数，而不是会话数。
+        """
+        day = f"{since[:4]}-{since[4:6]}-{since[6:8]}" if since else ""
+        with self._lock:
+            query = self.conn.execute
+            by_day = [{"day": d, "sessions": n, "selected": selected, "likes": likes, "replies": replies}
+                      for d, n, selected, likes, replies in query(
+                          "SELECT day, sessions, selected, likes, replies FROM daily_stats "
+                          "WHERE day >= ? AND sessions > 0 ORDER BY day", (day,)).fetchall()]
+            threads, complete, ratio = query(
+                "SELECT COALESCE(SUM(threads), 0), COALESCE(SUM(threads_complete), 0), "
+                "COALESCE(SUM(thread_ratio), 0) FROM daily_stats WHERE day >= ?", (day,)).fetchone()
+
+            publish = {}
+            for platform, success in PUBLISH_SUCCESS.items():
+                counts = dict(query(
+                    "SELECT status, SUM(sessions) FROM daily_publish WHERE platform = ? AND day >= ? "
+                    "GROUP BY status HAVING SUM(sessions) > 0", (platform, day)).fetchall())
+                total = sum(counts.values())
+                succeeded = sum(counts.get(status, 0) for status in success)
+                publish[platform] = {"sessions": total, "succeeded": succeeded,
+                                     "success_rate": round(succeeded / total, 4) if total else None,
+                                     "statuses": counts}
+
+            reasons = [{"platform": platform, "reason": reason, "count": count}
+                       for platform, reason, count in query(
+                           "SELECT platform, reason, SUM(count) AS n FROM publish_errors WHERE session_id >= ? "
+                           "GROUP BY platform, reason ORDER BY n DESC LIMIT ?", (since or "", top)).fetchall()]
+
+            if since:
+                # 限定时间时按主题的数字从该时间段的会话行现算（只扫描这段时间的会话）
+                topics = query(
+                    "SELECT topic, COUNT(*), SUM(selected), SUM(likes), SUM(replies) FROM session_stats "
+                    "WHERE session_id >= ? GROUP BY topic ORDER BY SUM(likes) + SUM(replies) DESC, topic "
+                    "LIMIT ?", (since, top)).fetchall()
+            else:
+                topics = query(
+                    "SELECT topic, sessions, selected, likes, replies FROM topic_stats WHERE sessions > 0 "
+                    "ORDER BY likes + replies DESC, topic LIMIT ?", (top,)).fetchall()
+            by_topic = [{"topic": topic, "sessions": n, "selected": selected, "likes": likes, "replies": replies}
+                        for topic, n, selected, likes, replies in topics]
+
+        return {
+            "sessions": sum(item["sessions"] for item in by_day),
+            "since": since,
+            "publish": publish,
+            "thread_completion": {"threads": threads, "complete": complete,
+                                  "average": round(ratio / threads, 4) if threads else None},
+            "failure_reasons": reasons,
+            "engagement_by_day": by_day,
+            "engagement_by_topic": by_topic,
+        }
+
+    def rebuild_fingerprints(self, sessions: Iterable[Tuple[Dict, Iterable[Dict]]]) -> int:
+        """从 (会话数据, 帖子流) 重建指纹索引，返回处理的会话数"""
+        count = 0
+        with self._lock:
+            with self.transaction():
+                self.conn.execute("DELETE FROM fingerprints")
+            for data, posts in sessions:
+                session_id = data["session_id"]
+                self.add_fingerprints("post", session_id, post_fingerprints(posts))
+                generated = data["generated_content"]
+                for platform in ("twitter", "xiaohongshu", "wechat"):
+                    h = simhash(content_text(platform, generated[platform]))
+                    if h is not None:
+                        self.add_fingerprints(platform, session_id, [("", h)])
+                count += 1
+        return count
+
+
+_ERROR_PREFIX_RE = re.compile(r"^#\d+:\s*")
+
+
+def _error_reason(error) -> str:
+    """失败原因归类：去掉逐条推文记录的 "#序号: " 前缀，截断过长的信息"""
+    return _ERROR_PREFIX_RE.sub("", str(error)).strip()[:REASON_CHARS]
+
+
+def post_fingerprints(posts: Iterable[Dict]) -> Iterator[Tuple[str, int]]:
+    """帖子流 -> [(post_id, simhash)]，跳过没有 ID 或正文的帖子"""
+    for post in posts:
+        key = post_key(post)
+        h = simhash(post_text(post)) if key is not None else None
+        if h is not None:
+            yield key, h
+
+
+def content_text(platform: str, content: Dict) -> str:
+    """生成内容中用于比对的文本"""
+    if platform == "twitter":
+        return "\n".join(content.get("thread") or [])
+    return f"{content.get('title') or ''}\n{content.get('content') or ''}"
+
+
+_instance: Optional[TrackerIndex] = None
+
+
+def get_index() -> TrackerIndex:
+    """获取索引实例（同一进程内复用）"""
+    global _instance
+    if _instance is None:
+        _instance = TrackerIndex()
+    return _instance
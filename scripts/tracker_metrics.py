@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+耗时与 I/O 统计
+默认关闭：被 @instrument 包装的函数只多一次标志判断。CLI 的 --profile 或环境变量
+SOCIAL_PUBLISHER_METRICS_DIR 打开后，按操作（及平台等标签）记录耗时直方图、写入字节数、文件数和计数器。
+
+--profile 结束时打印本次命令的分项耗时；设置了 metrics 目录时，把本次数据累加进
+tracker_metrics.json，并按 Prometheus textfile 格式写出 tracker_metrics.prom（供 node_exporter 采集）。
+"""
+
+import fcntl
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# 直方图桶上限（毫秒），与 Prometheus 的 le 标签对应，最后一个桶为 +Inf
+BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+METRICS_DIR_ENV = "SOCIAL_PUBLISHER_METRICS_DIR"
+PREFIX = "social_publisher"
+
+enabled = False
+_lock = threading.Lock()
+# (操作名, 标签元组) -> {"count", "sum_ms", "max_ms", "buckets": [...], "bytes", "files"}
+_timings: Dict[Tuple, Dict] = {}
+# (计数器名, 标签元组) -> 值
+_counters: Dict[Tuple, float] = {}
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def _labels(labels: Dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _entry(name: str, labels: Tuple) -> Dict:
+    entry = _timings.get((name, labels))
+    if entry is None:
+        entry = {"count": 0, "sum_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1),
+                 "bytes": 0, "files": 0}
+        _timings[(name, labels)] = entry
+    return entry
+
+
+def observe(name: str, elapsed_ms: float, **labels):
+    """记录一次耗时"""
+    if not enabled:
+        return
+    with _lock:
+        entry = _entry(name, _labels(labels))
+        entry["count"] += 1
+        entry["sum_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                entry["buckets"][i] += 1
+                break
+        else:
+            entry["buckets"][-1] += 1
+
+
+def add_io(name: str, nbytes: int, files: int = 1, **labels):
+    """记录某个操作写出的序列化字节数和文件数"""
+    if not enabled:
+        return
+    with _lock:
+        entry = _entry(name, _labels(labels))
+        entry["bytes"] += nbytes
+        entry["files"] += files
+
+
+def count(name: str, value: float = 1, **labels):
+    """计数器加 value（如各平台的发布结果）"""
+    if not enabled:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """计时一段代码（关闭时也有一次生成器开销，热路径请用 instrument）"""
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000, **labels)
+
+
+def instrument(name: Optional[str] = None, **labels):
+    """函数计时装饰器；关闭时直接调用原函数"""
+    def decorator(fn):
+        op = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(op, (time.perf_counter() - start) * 1000, **labels)
+        return wrapper
+    return decorator
+
+
+# ========== 输出 ==========
+
+def snapshot() -> Dict:
+    """当前数据（JSON 可序列化）"""
+    with _lock:
+        return {
+            "timings": [dict(entry, name=name, labels=dict(labels)) for (name, labels), entry in _timings.items()],
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in _counters.items()],
+        }
+
+
+def format_profile(data: Dict = None) -> str:
+    """--profile 的分项耗时表（按总耗时倒序）"""
+    data = data or snapshot()
+    rows = sorted(data["timings"], key=lambda t: -t["sum_ms"])
+    lines = [f"{'操作':<44} {'次数':>6} {'总计(ms)':>10} {'平均(ms)':>9} {'最大(ms)':>9} {'写入(KB)':>9} {'文件':>5}"]
+    for t in rows:
+        label = ",".join(f"{k}={v}" for k, v in sorted(t["labels"].items()))
+        name = f"{t['name']}{{{label}}}" if label else t["name"]
+        mean = t["sum_ms"] / t["count"] if t["count"] else 0.0
+        lines.append(f"{name:<44} {t['count']:>6} {t['sum_ms']:>10.2f} {mean:>9.3f} {t['max_ms']:>9.2f} "
+                     f"{t['bytes'] / 1024:>9.1f} {t['files']:>5}")
+    for c in sorted(data["counters"], key=lambda c: (c["name"], sorted(c["labels"].items()))):
+        label = ",".join(f"{k}={v}" for k, v in sorted(c["labels"].items()))
+        lines.append(f"{c['name']}{{{label}}} = {c['value']:g}")
+    return "\n".join(lines)
+
+
+def _merge(total: Dict, data: Dict) -> Dict:
+    timings = {(t["name"], _labels(t["labels"])): t for t in total.get("timings", [])}
+    for t in data["timings"]:
+        key = (t["name"], _labels(t["labels"]))
+        old = timings.get(key)
+        if old is None or len(old.get("buckets", [])) != len(t["buckets"]):
+            timings[key] = dict(t)
+            continue
+        old["count"] += t["count"]
+        old["sum_ms"] += t["sum_ms"]
+        old["max_ms"] = max(old["max_ms"], t["max_ms"])
+        old["buckets"] = [a + b for a, b in zip(old["buckets"], t["buckets"])]
+        old["bytes"] += t["bytes"]
+        old["files"] += t["files"]
+    counters = {(c["name"], _labels(c["labels"])): c for c in total.get("counters", [])}
+    for c in data["counters"]:
+        key = (c["name"], _labels(c["labels"]))
+        if key in counters:
+            counters[key]["value"] += c["value"]
+        else:
+            counters[key] = dict(c)
+    return {"timings": list(timings.values()), "counters": list(counters.values()),
+            "updated_at": time.time()}
+
+
+def _prom_labels(labels: Dict, extra: Dict = None) -> str:
+    items = dict(labels, **(extra or {}))
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                    for k, v in sorted(items.items()))
+    return "{" + body + "}"
+
+
+def format_prometheus(data: Dict) -> str:
+    """Prometheus 文本格式：每个操作一个耗时直方图（秒），另有写入字节数、文件数和计数器"""
+    lines = [f"# HELP {PREFIX}_operation_seconds Latency of tracker operations",
+             f"# TYPE {PREFIX}_operation_seconds histogram"]
+    for t in sorted(data["timings"], key=lambda t: (t["name"], sorted(t["labels"].items()))):
+        labels = dict(t["labels"], op=t["name"])
+        cumulative = 0
+        for bound, n in zip(BUCKETS_MS + ("+Inf",), t["buckets"]):
+            cumulative += n
+            le = "+Inf" if bound == "+Inf" else f"{bound / 1000:g}"
+            lines.append(f"{PREFIX}_operation_seconds_bucket{_prom_labels(labels, {'le': le})} {cumulative}")
+        lines.append(f"{PREFIX}_operation_seconds_sum{_prom_labels(labels)} {t['sum_ms'] / 1000:.6f}")
+        lines.append(f"{PREFIX}_operation_seconds_count{_prom_labels(labels)} {t['count']}")
+    for metric, field, help_text in (("written_bytes_total", "bytes", "Serialized bytes written"),
+                                     ("written_files_total", "files", "Files written")):
+        lines += [f"# HELP {PREFIX}_{metric} {help_text}", f"# TYPE {PREFIX}_{metric} counter"]
+        for t in data["timings"]:
+            if t[field]:
+                lines.append(f"{PREFIX}_{metric}{_prom_labels(dict(t['labels'], op=t['name']))} {t[field]}")
+    names = sorted({c["name"] for c in data["counters"]})
+    for name in names:
+        lines += [f"# TYPE {PREFIX}_{name}_total counter"]
+        for c in data["counters"]:
+            if c["name"] == name:
+                lines.append(f"{PREFIX}_{name}_total{_prom_labels(c['labels'])} {c['value']:g}")
+    return "\n".join(lines) + "\n"
+
+
+def export(directory) -> Path:
+    """把本进程的数据累加进 directory/tracker_metrics.json，并重写 tracker_metrics.prom"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    json_file = directory / "tracker_metrics.json"
+    fd = os.open(str(directory / "tracker_metrics.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            with open(json_file, "r", encoding="utf-8") as f:
+                total = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            total = {}
+        total = _merge(total, snapshot())
+        for path, text in ((json_file, json.dumps(total, ensure_ascii=False)),
+                           (directory / "tracker_metrics.prom", format_prometheus(total))):
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, path)
+    finally:
+        os.close(fd)
+    return json_file
+
+
+def metrics_dir() -> Optional[str]:
+    return os.environ.get(METRICS_DIR_ENV) or None
+
+
+if metrics_dir():
+    enable()
@@ -0,0 +1,56 @@
+"""并发写入、发布调度续传、多主题并行运行的正确性测试（小规模运行 bench_tracker 的同名场景，使用临时目录）"""
+
+import sys
+import unittest
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+
+import bench_tracker  # noqa: E402
+import session_store  # noqa: E402
+
+
+def _real_sessions():
+    return sorted(path.name for path in session_store.SESSIONS_DIR.glob("session_*"))
+
+
+class ConcurrencyTest(unittest.TestCase):
+    def setUp(self):
+        self.before = _real_sessions()
+
+    def tearDown(self):
+        self.assertEqual(_real_sessions(), self.before, "测试写入了真实的会话目录")
+
+    def _assert_checks(self, result, checks):
+        self.assertEqual({key: result[key] for key in checks if result[key]}, {}, result)
+
+    def test_stress_json(self):
+        result = bench_tracker.stress("json", workers=4, ops=40, readers=1)
+        self._assert_checks(result, bench_tracker.STRESS_CHECKS)
+        self.assertEqual(result["ops"], 160)
+
+    def test_stress_sqlite(self):
+        result = bench_tracker.stress("sqlite", workers=4, ops=40, readers=1)
+        self._assert_checks(result, bench_tracker.STRESS_CHECKS)
+
+    def test_schedule_resumes_without_duplicates(self):
+        result = bench_tracker.bench_schedule(sessions=4, tweets=5, rate=200.0, latency=0.005,
+                                              failure_rate=0.1, interrupt_after=0.1, lost_response_rate=0.1)
+        self._assert_checks(result, bench_tracker.SCHEDULE_CHECKS)
+        self.assertEqual(result["items"], 4 * (5 + 2))
+
+    def test_pipeline(self):
+        results = bench_tracker.bench_pipeline(topics=3, posts=50, workers=[1, 2])
+        self.assertEqual([r["failed"] for r in results], [0, 0])
+        self.assertEqual([r["topics"] for r in results], [3, 3])
+
+    def test_config_dir_restored(self):
+        with bench_tracker._temp_config_dir() as root:
+            self.assertEqual(session_store.SESSIONS_DIR, root / "sessions")
+        self.assertNotEqual(session_store.SESSIONS_DIR, root / "sessions")
+        self.assertFalse(root.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""codex/login.py 的登录判断与本地桩服务测试（浏览器部分需要 Playwright Chromium，未安装时跳过）"""
+
+import json
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+sys.path.insert(0, str(ROOT_DIR / "codex"))
+
+import check_login  # noqa: E402
+import login_stub  # noqa: E402
+
+
+def _cookie(name, expires=-1):
+    return {"name": name, "value": "v", "domain": "127.0.0.1", "expires": expires}
+
+
+class HasKeyCookiesTest(unittest.TestCase):
+    def test_any_key_cookie_counts_as_logged_in(self):
+        self.assertTrue(check_login.has_key_cookies("twitter", [_cookie("ct0")]))
+        self.assertTrue(check_login.has_key_cookies("wechat", [_cookie("slave_sid", time.time() + 60)]))
+
+    def test_expired_or_unrelated_cookies_do_not(self):
+        self.assertFalse(check_login.has_key_cookies("twitter", []))
+        self.assertFalse(check_login.has_key_cookies("twitter", [_cookie("guest_id")]))
+        self.assertFalse(check_login.has_key_cookies("twitter", [_cookie("auth_token", time.time() - 60)]))
+
+
+class CookieHeaderTest(unittest.TestCase):
+    def test_skips_malformed_entries(self):
+        cookies = [_cookie("auth_token"), {"value": "no-name"}, "junk", None,
+                   {"name": "ct0", "value": "x", "domain": None, "expires": "never"},
+                   _cookie("old", time.time() - 60), dict(_cookie("other"), domain="example.com")]
+        with tempfile.TemporaryDirectory() as tmp:
+            cookie_file = Path(tmp) / "cookies.json"
+            cookie_file.write_text(json.dumps(cookies), encoding="utf-8")
+            self.assertEqual(check_login._cookie_header(cookie_file, "127.0.0.1"), "auth_token=v; ct0=x")
+
+
+class LoginStubTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            from playwright.sync_api import sync_playwright
+            with sync_playwright() as p:
+                p.chromium.launch(headless=True).close()
+        except Exception as e:  # 未安装 playwright 或浏览器
+            self.skipTest(f"Playwright Chromium 不可用: {e}")
+        import login
+        self.login = login
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_dir = login.COOKIES_DIR
+        login.COOKIES_DIR = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.login.COOKIES_DIR = self.saved_dir
+        self.tmp.cleanup()
+
+    def _login(self, cookies, timeout=15.0):
+        server, url = login_stub.serve_stub(cookies)
+        try:
+            return self.login.login_platforms(["twitter"], headless=True, urls={"twitter": url},
+                                              timeout=timeout, poll=0.2)
+        finally:
+            server.shutdown()
+
+    def test_saves_when_only_one_key_cookie_is_set(self):
+        start = time.monotonic()
+        self.assertEqual(self._login(["ct0"]), {"twitter": "saved"})
+        self.assertLess(time.monotonic() - start, 15.0)
+        with open(Path(self.tmp.name) / "twitter_cookies.json", encoding="utf-8") as f:
+            self.assertIn("ct0", {c["name"] for c in json.load(f)})
+
+    def test_times_out_without_key_cookies(self):
+        self.assertEqual(self._login(["guest_id"], timeout=2.0), {"twitter": "timeout"})
+        self.assertFalse((Path(self.tmp.name) / "twitter_cookies.json").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""媒体库的图片校验测试：非图片、损坏的图片和像素数过大的图片抛出 MediaError 且不入库"""
+
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+
+import media_store  # noqa: E402
+from media_store import MediaError, MediaStore  # noqa: E402
+
+
+def _png(width: int, height: int) -> bytes:
+    """最小的灰度 PNG（不依赖 Pillow）"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + b"\x80" * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+
+class MediaStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.store = MediaStore(self.dir / "media")
+
+    def tearDown(self):
+        self.store.conn.close()
+        self.tmp.cleanup()
+
+    def _file(self, name: str, data: bytes) -> Path:
+        path = self.dir / name
+        path.write_bytes(data)
+        return path
+
+    def _objects(self):
+        return self.store.conn.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+    def test_adds_valid_image(self):
+        info = self.store.add(self._file("ok.png", _png(4, 3)))
+        self.assertEqual((info["format"], info["width"], info["height"]), ("png", 4, 3))
+        self.assertTrue(info["path"].endswith(".png"))
+
+    def test_rejects_non_image(self):
+        with self.assertRaises(MediaError) as ctx:
+            self.store.add(self._file("notes.png", b"just some text, not an image"))
+        self.assertIn("notes.png", str(ctx.exception))
+        self.assertEqual(self._objects(), 0)
+
+    def test_rejects_corrupt_image(self):
+        if media_store._pillow() is None:
+            self.skipTest("需要 Pillow")
+        with self.assertRaises(MediaError):
+            self.store.add(self._file("broken.png", _png(4, 3)[:40]))
+        self.assertEqual(self._objects(), 0)
+
+    def test_decompression_bomb(self):
+        pillow = media_store._pillow()
+        if pillow is None:
+            self.skipTest("需要 Pillow")
+        Image = pillow[0]
+        saved = Image.MAX_IMAGE_PIXELS
+        try:
+            info = self.store.add(self._file("big.png", _png(3000, 2000)))
+            Image.MAX_IMAGE_PIXELS = 1000  # 超过两倍时 Pillow 抛出 DecompressionBombError
+            with self.assertRaises(MediaError):
+                self.store.prepare(info["hash"], "wechat")
+            with self.assertRaises(MediaError):
+                self.store.add(self._file("big2.png", _png(100, 100)))
+        finally:
+            Image.MAX_IMAGE_PIXELS = saved
+
+
+if __name__ == "__main__":
+    unittest.main()
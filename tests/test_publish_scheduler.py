@@ -0,0 +1,65 @@
+"""发布调度器的失败隔离和参数校验测试"""
+
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+
+import bench_tracker  # noqa: E402
+import publish_scheduler  # noqa: E402
+
+
+class BrokenAdapter(publish_scheduler.MockAdapter):
+    """第一个会话的推文发布时抛出程序错误（非 PublishError）"""
+
+    def __init__(self, broken_session: str):
+        super().__init__(latency=0.001)
+        self.broken_session = broken_session
+
+    async def publish(self, item):
+        if item.session_id == self.broken_session and item.platform == "twitter":
+            raise RuntimeError("adapter bug")
+        return await super().publish(item)
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_unexpected_error_fails_only_its_job(self):
+        from content_tracker import ContentTracker
+        with bench_tracker._temp_config_dir():
+            trackers = []
+            for s in range(2):
+                tracker = ContentTracker(f"scheduler-test-{s}")
+                tracker.messages = []
+                tracker.record_twitter_content([f"tweet {s}-{i}" for i in range(3)])
+                tracker.record_xiaohongshu_content(f"title {s}", "content")
+                trackers.append(tracker)
+            broken, healthy = trackers[0].session_id, trackers[1].session_id
+            limits = {platform: {"rate": 1000, "burst": 10} for platform in publish_scheduler.PLATFORMS}
+            scheduler = publish_scheduler.PublishScheduler(BrokenAdapter(broken), limits, backoff=0.001)
+            result = scheduler.run_sync(trackers)
+            self.assertEqual(result["sessions"][broken]["twitter"]["status"], "failed")
+            self.assertIn("RuntimeError", result["sessions"][broken]["twitter"]["error"])
+            self.assertEqual(result["sessions"][broken]["xiaohongshu"]["status"], "published")
+            self.assertEqual(result["sessions"][healthy]["twitter"]["published"], 3)
+            errors = ContentTracker.load(broken).data["publish_status"]["twitter"]["errors"]
+            self.assertTrue(any("adapter bug" in str(error) for error in errors))
+
+    def test_invalid_queue_settings(self):
+        with self.assertRaises(ValueError):
+            publish_scheduler.PlatformQueue("twitter", publish_scheduler.MockAdapter(), 1.0, concurrency=0)
+        with self.assertRaises(ValueError):
+            publish_scheduler.PlatformQueue("twitter", publish_scheduler.MockAdapter(), 1.0, retries=-1)
+
+    def test_cli_rejects_bad_concurrency_and_retries(self):
+        for flag, value in (("--concurrency", "-1"), ("--concurrency", "0"), ("--retries", "-1")):
+            proc = subprocess.run([sys.executable, str(ROOT_DIR / "scripts" / "content_tracker.py"),
+                                   "schedule", flag, value], capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 2, proc.stderr)
+            self.assertIn(flag, proc.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""会话归档测试：归档后热目录只留锁文件，会话仍可按ID完整加载"""
+
+import sys
+import unittest
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+
+import bench_tracker  # noqa: E402
+import session_archive  # noqa: E402
+import session_store  # noqa: E402
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.config_dir = bench_tracker._temp_config_dir()
+        self.config_dir.__enter__()
+
+    def tearDown(self):
+        self.config_dir.__exit__(None, None, None)
+
+    def test_archive_keeps_lock_file_and_full_data(self):
+        from content_tracker import ContentTracker
+        tracker = ContentTracker("归档", store=session_store.get_store("json"))
+        tracker.messages = []
+        tracker.record_search("q", "1d", [{"id": str(i), "text": f"post {i}"} for i in range(3)])
+        tracker.record_reply("1", "回复")
+        tracker.compact()  # 帖子和回复内容写成分段文件
+        session_id, store = tracker.session_id, tracker.store
+
+        result = session_archive.archive_sessions(store, "99991231_000000")
+        self.assertEqual(result["archived"], 1)
+        self.assertGreater(result["hot_bytes_freed"], 0)
+        left = [p.name for p in session_store.SESSIONS_DIR.glob(f"session_{session_id}.*")]
+        self.assertEqual(left, [store.lock_file(session_id).name])
+        self.assertNotIn(session_id, store.session_ids())
+        with self.assertRaises(FileNotFoundError):
+            store.last_modified(session_id)
+
+        data = ContentTracker.load(session_id, store).data
+        self.assertEqual([post["id"] for post in data["search"]["posts"]], ["0", "1", "2"])
+        self.assertEqual(data["engagement"]["replies_content"], {"1": "回复"})
+        self.assertEqual(session_archive.archive_sessions(store, "99991231_000000")["archived"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
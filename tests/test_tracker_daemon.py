@@ -0,0 +1,65 @@
+"""常驻服务客户端的降级测试：服务无响应或应答损坏时返回 None，由调用方在本地执行"""
+
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+
+import tracker_daemon  # noqa: E402
+
+
+class ClientFallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_path = tracker_daemon.SOCKET_PATH
+        tracker_daemon.SOCKET_PATH = Path(self.tmp.name) / "tracker.sock"
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(str(tracker_daemon.SOCKET_PATH))
+        self.server.listen(4)
+        self.conns = []
+
+    def tearDown(self):
+        for conn in self.conns:
+            conn.close()
+        self.server.close()
+        tracker_daemon.SOCKET_PATH = self.saved_path
+        self.tmp.cleanup()
+
+    def _reply(self, data: bytes):
+        """接受一个连接，读到请求后回复 data"""
+        def serve():
+            conn, _ = self.server.accept()
+            self.conns.append(conn)
+            conn.recv(4096)
+            conn.sendall(data)
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        return thread
+
+    def test_timeout_falls_back(self):
+        # 服务接受连接但不应答（卡死）
+        self.assertIsNone(tracker_daemon.request({"op": "list"}, timeout=0.2))
+        self.assertIsNone(tracker_daemon.connect("json", timeout=0.2))
+
+    def test_garbled_response_falls_back(self):
+        thread = self._reply(b"not json\n")
+        self.assertIsNone(tracker_daemon.request({"op": "list"}, timeout=1.0))
+        thread.join(1.0)
+
+    def test_stale_socket_file_falls_back(self):
+        self.server.close()
+        self.assertIsNone(tracker_daemon.request({"op": "list"}, timeout=0.2))
+
+    def test_ok_response(self):
+        thread = self._reply(b'{"ok": true}\n')
+        self.assertEqual(tracker_daemon.request({"op": "list"}, timeout=1.0), {"ok": True})
+        thread.join(1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""跨会话索引的同步和查询测试"""
+
+import sys
+import unittest
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+
+import bench_tracker  # noqa: E402
+import tracker_index  # noqa: E402
+
+
+class TrackerIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.config_dir = bench_tracker._temp_config_dir()
+        self.config_dir.__enter__()
+        self.index = tracker_index.get_index()
+        self.commits = 0
+
+        def trace(statement):
+            if statement.strip().upper() == "COMMIT":
+                self.commits += 1
+        self.index.conn.set_trace_callback(trace)
+
+    def tearDown(self):
+        self.index.conn.set_trace_callback(None)
+        self.config_dir.__exit__(None, None, None)
+
+    def test_filter_engaged_in_chunks(self):
+        self.index.mark_engaged([f"p{i}" for i in range(0, 1200, 2)], "like", "s1")
+        self.index.mark_engaged(["p1", "p3"], "reply", "s1")
+        ids = [f"p{i}" for i in range(1200)]
+        found = self.index.filter_engaged(ids)
+        self.assertEqual(found, {f"p{i}" for i in range(0, 1200, 2)} | {"p1", "p3"})
+        self.assertEqual(self.index.filter_engaged(ids, "reply"), {"p1", "p3"})
+        self.assertEqual(self.index.filter_engaged([]), set())
+
+    def test_mutation_syncs_index_in_one_commit(self):
+        from content_tracker import ContentTracker
+        tracker = ContentTracker("索引同步")
+        tracker.messages = []
+        self.commits = 0
+        tracker.record_likes(["a", "b"])
+        self.assertEqual(self.commits, 1)
+        tracker.record_replies({"c": "hi"})
+        self.assertEqual(self.commits, 2)
+        self.assertEqual(ContentTracker.already_engaged(["a", "c", "z"]), ["a", "c"])
+        self.assertEqual(self.index.stats()["engagement_by_topic"][0]["likes"], 2)
+
+    def test_batch_defers_index_until_flush(self):
+        from content_tracker import ContentTracker
+        tracker = ContentTracker("批量")
+        tracker.messages = []
+        tracker.begin_batch()
+        self.commits = 0
+        for post_id in ("a", "b", "c"):
+            tracker.record_like(post_id)
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(self.index.filter_engaged(["a"]), set())
+        tracker.end_batch()
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.index.filter_engaged(["a", "b", "c"]), {"a", "b", "c"})
+
+
+if __name__ == "__main__":
+    unittest.main()